@@ -0,0 +1,103 @@
+"""
+Chunk pipeline benchmark - compressed file send throughput at 1, 2, 4 and 8 worker processes
+
+Run from the repository root:
+    python -m benchmarks.bench_chunk_pipeline [corpus MB, default 2048] [codec, default best available]
+
+The corpus mixes compressible logs, incompressible random data and a
+folder of small files, in roughly 2:2:1 proportions. The receiver
+follows the framing but discards the payload, so the numbers show how
+the sender scales with workers. Each worker count is warmed up with a
+small transfer first, so process start-up is not counted.
+"""
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from network import compression
+from network.file_transfer import send_files
+from network.stream_decoder import LineDecoder
+
+WORKER_COUNTS = (1, 2, 4, 8)
+SMALL_FILE_SIZE = 256 * 1024
+
+
+def log_block(seed):
+    lines = [f"2024-05-{seed % 28 + 1:02d} 12:{i % 60:02d}:{(i * 7) % 60:02d} INFO worker-{i % 16} "
+             f"processed request {seed * 100000 + i} in {(i * 37) % 900} ms status=ok\n" for i in range(12000)]
+    return "".join(lines).encode()
+
+
+def make_corpus(root, size_mb):
+    os.makedirs(os.path.join(root, "small"))
+    block_mb = 1
+    parts = {"logs.txt": size_mb * 2 // 5, "random.bin": size_mb * 2 // 5}
+    for name, mb in parts.items():
+        with open(os.path.join(root, name), "wb") as f:
+            for i in range(mb // block_mb):
+                f.write(log_block(i)[:1024 * 1024] if name.endswith(".txt") else os.urandom(1024 * 1024))
+    small_total = (size_mb - sum(parts.values())) * 1024 * 1024
+    for i in range(small_total // SMALL_FILE_SIZE):
+        with open(os.path.join(root, "small", f"f{i:05d}.{'txt' if i % 2 else 'bin'}"), "wb") as f:
+            f.write(log_block(i)[:SMALL_FILE_SIZE] if i % 2 else os.urandom(SMALL_FILE_SIZE))
+    return [os.path.join(root, name) for name in parts] + [os.path.join(root, "small")]
+
+
+def discard_receive(sock, wire):
+    decoder = LineDecoder()
+    while decoder.fill_from(sock):
+        for line in decoder.lines():
+            evt = json.loads(line)
+            if evt["type"] == "file_chunk":
+                wire[0] += evt["size"]
+                decoder.expect_raw(evt["size"], lambda data: None)
+            elif evt["type"] == "file_end":
+                return
+
+
+def run(paths, codec, workers):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    client = socket.create_connection(server.getsockname())
+    conn, _ = server.accept()
+    server.close()
+    wire = [0]
+    reader = threading.Thread(target=discard_receive, args=(conn, wire))
+    reader.start()
+    start = time.perf_counter()
+    send_files(client, paths, lambda msg: None, codec=codec, workers=workers)
+    reader.join()
+    elapsed = time.perf_counter() - start
+    client.close()
+    conn.close()
+    return elapsed, wire[0]
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    codec = sys.argv[2] if len(sys.argv) > 2 else compression.negotiate(compression.available())
+    work = tempfile.mkdtemp(prefix="portal_bench_")
+    try:
+        print(f"[Bench] Building a {size_mb} MB corpus...")
+        paths = make_corpus(os.path.join(work, "corpus"), size_mb)
+        warm = os.path.join(work, "warm.txt")
+        with open(warm, "wb") as f:
+            f.write(log_block(0) * 4)
+        print(f"[Bench] {size_mb} MB mixed corpus, codec {codec}, {os.cpu_count()} cores")
+        for workers in WORKER_COUNTS:
+            run([warm], codec, workers)
+            elapsed, wire = run(paths, codec, workers)
+            print(f"  {workers} workers  {elapsed:8.2f} s   {size_mb / elapsed:8.1f} MB/s   "
+                  f"wire {wire / (1024 * 1024):8.1f} MB")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Clipboard backend benchmark - get/set latency of the in-process X11 backend against xclip
+
+Run from the repository root:
+    python -m benchmarks.bench_clipboard_backends [iterations]
+
+Needs Xvfb (started on a free display number when DISPLAY is unset) and
+xclip for the subprocess backend. Each set is followed by a get of the
+same content, which is checked, so both directions are measured end to
+end through the X server.
+"""
+import base64
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+SIZES = (("1 KB text", 1024), ("1 MB text", 1024 * 1024))
+
+
+def start_xvfb():
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("[Bench] Needs Xvfb (or an X server in DISPLAY)")
+    for number in range(99, 120):
+        if not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+    proc = subprocess.Popen(["Xvfb", f":{number}", "-nolisten", "tcp"], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+        time.sleep(0.1)
+    os.environ["DISPLAY"] = f":{number}"
+    return proc
+
+
+def measure(controller, content, iterations):
+    sets, gets = [], []
+    for i in range(iterations):
+        # Vary the payload so no layer can answer from a cache
+        encoded = "text:" + base64.b64encode((f"{i:08d}" + content[8:]).encode()).decode()
+        start = time.perf_counter()
+        controller.set_clipboard(encoded)
+        sets.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        result = controller.get_clipboard()
+        gets.append(time.perf_counter() - start)
+        if result != encoded:
+            print("  (read back a different clipboard; is another clipboard manager running?)")
+    return statistics.median(sets) * 1000, statistics.median(gets) * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    xvfb = start_xvfb()
+    try:
+        from controllers.clipboard_controller import ClipboardController
+        backends = []
+        controller = ClipboardController()
+        if controller.linux_tool == "x11":
+            backends.append(("x11", controller))
+        if shutil.which("xclip"):
+            controller = ClipboardController()
+            controller.linux_tool = "xclip"
+            backends.append(("xclip", controller))
+        if not backends:
+            sys.exit("[Bench] Neither libX11 nor xclip is available")
+        for label, size in SIZES:
+            content = "x" * size
+            print(f"[Bench] {label}, median of {iterations}")
+            for name, controller in backends:
+                set_ms, get_ms = measure(controller, content, iterations)
+                print(f"  {name:<6} set {set_ms:8.2f} ms   get {get_ms:8.2f} ms")
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
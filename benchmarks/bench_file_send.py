@@ -0,0 +1,125 @@
+"""
+File send benchmark - loopback throughput of the legacy base64 line, buffered streaming and sendfile
+
+Run from the repository root:
+    python -m benchmarks.bench_file_send [sizes in MB, e.g. 100,1024]
+
+The receiver follows the framing but discards the payload, so the
+numbers measure the send path rather than the disk. The legacy path
+holds the whole file several times over in memory (raw, base64, JSON
+line, and again on the receiver); it is skipped for sizes that would
+not fit in RAM.
+"""
+import base64
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from network.file_transfer import send_files
+from network.stream_decoder import LineDecoder
+
+# Rough peak memory of the legacy path across both ends, as a multiple of the file size
+LEGACY_MEMORY_FACTOR = 8
+
+
+def physical_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 8192
+
+
+def make_file(directory, size_mb):
+    path = os.path.join(directory, f"payload_{size_mb}mb.bin")
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+        # Flush now so writeback does not land in the middle of a measurement
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+
+def legacy_send(sock, path):
+    """What clipboard_sender did before streaming"""
+    with open(path, "rb") as f:
+        content = f.read()
+    data = {"type": "file_transfer", "files": [{"name": os.path.basename(path),
+                                                 "data": base64.b64encode(content).decode('utf-8')}]}
+    sock.sendall((json.dumps(data) + "\n").encode())
+
+
+def legacy_receive(sock):
+    """Decode the line the way handle_file_transfer does, without writing it out"""
+    decoder = LineDecoder()
+    while decoder.fill_from(sock):
+        for line in decoder.lines():
+            for f in json.loads(line)["files"]:
+                base64.b64decode(f["data"])
+            return
+
+
+def stream_receive(sock):
+    """Follow the chunk framing like FileReceiver, but discard the payload"""
+    decoder = LineDecoder()
+    while decoder.fill_from(sock):
+        for line in decoder.lines():
+            evt = json.loads(line)
+            if evt["type"] == "file_chunk":
+                decoder.expect_raw(evt["size"], lambda data: None)
+            elif evt["type"] == "file_end":
+                return
+
+
+def run(send, receive):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    client = socket.create_connection(server.getsockname())
+    conn, _ = server.accept()
+    server.close()
+
+    start = time.perf_counter()
+    reader = threading.Thread(target=receive, args=(conn,))
+    reader.start()
+    cpu_start = time.thread_time()
+    send(client)
+    send_cpu = time.thread_time() - cpu_start
+    reader.join()
+    elapsed = time.perf_counter() - start
+    client.close()
+    conn.close()
+    return elapsed, send_cpu
+
+
+def main():
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "100,1024").split(",")]
+    work = tempfile.mkdtemp(prefix="portal_bench_")
+    try:
+        for size_mb in sizes:
+            path = make_file(work, size_mb)
+            print(f"[Bench] {size_mb} MB file over loopback")
+            cases = [
+                ("sendfile", lambda s: send_files(s, [path], print, use_sendfile=True), stream_receive),
+                ("buffered", lambda s: send_files(s, [path], print, use_sendfile=False), stream_receive),
+            ]
+            if size_mb * LEGACY_MEMORY_FACTOR <= physical_memory_mb():
+                cases.append(("base64", lambda s: legacy_send(s, path), legacy_receive))
+            else:
+                print(f"  base64    skipped (needs ~{size_mb * LEGACY_MEMORY_FACTOR} MB of RAM)")
+            for name, send, receive in cases:
+                elapsed, send_cpu = run(send, receive)
+                print(f"  {name:<9} {elapsed:8.2f} s   {size_mb / elapsed:8.1f} MB/s   sender CPU {send_cpu:6.2f} s")
+            os.remove(path)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
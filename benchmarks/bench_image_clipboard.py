@@ -0,0 +1,114 @@
+"""
+Image clipboard benchmark - CPU time and wire bytes per 4K screenshot, legacy PNG-everywhere vs typed images
+
+Run from the repository root (needs Pillow):
+    python -m benchmarks.bench_image_clipboard [iterations]
+
+Each case runs the copy side, the clipboard line as it goes over the
+wire, and the paste side. "legacy" is what the controller did before
+images were typed: every DIB became a PNG on copy and every PNG became
+a BMP again on a Windows paste. A pasting X11 application is assumed
+to ask for image/png, so that conversion is counted where it happens.
+"""
+import base64
+import io
+import json
+import random
+import sys
+import time
+
+from controllers import image_codec
+from controllers.image_codec import PNG, BMP, ImageTranscoder
+
+WIDTH, HEIGHT = 3840, 2160
+
+
+def screenshot():
+    """A desktop-like 4K frame: flat windows, title bars and lines of text-sized detail"""
+    from PIL import Image, ImageDraw
+    rng = random.Random(4)
+    img = Image.new("RGB", (WIDTH, HEIGHT), (32, 48, 64))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(0, WIDTH - 800), rng.randrange(0, HEIGHT - 600)
+        w, h = rng.randrange(600, 1800), rng.randrange(400, 1200)
+        draw.rectangle((x, y, x + w, y + h), fill=(240, 240, 240), outline=(90, 90, 90))
+        draw.rectangle((x, y, x + w, y + 32), fill=(rng.randrange(256), 80, 160))
+        for line in range(y + 48, y + h - 16, 18):
+            length = rng.randrange(w // 4, w - 32)
+            for cx in range(x + 16, x + 16 + length, 9):
+                shade = rng.randrange(0, 120)
+                draw.rectangle((cx, line, cx + 6, line + 10), fill=(shade, shade, shade))
+    return img
+
+
+def wire(encoded):
+    """Sender serializes the clipboard line; receiver parses it and decodes the payload"""
+    line = (json.dumps({"type": "clipboard", "content": encoded}) + "\n").encode()
+    content = json.loads(line)["content"]
+    fmt, payload = content.split(":", 1)
+    return len(line), fmt, base64.b64decode(payload)
+
+
+def legacy_copy_dib(dib):
+    from PIL import Image
+    bmp_file = b'BM' + (len(dib) + 54).to_bytes(4, 'little') + b'\x00\x00\x00\x00' + b'\x36\x00\x00\x00' + dib
+    output = io.BytesIO()
+    Image.open(io.BytesIO(bmp_file)).save(output, format='PNG')
+    return f"image:{base64.b64encode(output.getvalue()).decode('utf-8')}"
+
+
+def legacy_paste_windows(data):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(output, format='BMP')
+    return output.getvalue()[14:]
+
+
+def run_case(copy, paste, iterations):
+    cpu, size = [], 0
+    for _ in range(iterations):
+        start = time.process_time()
+        size, fmt, data = wire(copy())
+        paste(fmt, data)
+        cpu.append(time.process_time() - start)
+    return min(cpu), size
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    img = screenshot()
+    buffer = io.BytesIO()
+    img.save(buffer, format="BMP")
+    dib = buffer.getvalue()[14:]
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    png = buffer.getvalue()
+    transcoder = ImageTranscoder()
+
+    def typed_paste_windows(fmt, data):
+        image_codec.bmp_to_dib(transcoder.convert(data, image_codec.mime_of(fmt), BMP))
+
+    def typed_paste_x11(fmt, data):
+        transcoder.convert(data, image_codec.mime_of(fmt), PNG)
+
+    cases = [
+        ("DIB -> Windows", lambda: legacy_copy_dib(dib), lambda fmt, data: legacy_paste_windows(data),
+         lambda: image_codec.encode(image_codec.dib_to_bmp(dib), BMP), typed_paste_windows),
+        ("DIB -> X11", lambda: legacy_copy_dib(dib), lambda fmt, data: None,
+         lambda: image_codec.encode(image_codec.dib_to_bmp(dib), BMP), typed_paste_x11),
+        ("PNG -> Windows", lambda: image_codec.encode(png, PNG), lambda fmt, data: legacy_paste_windows(data),
+         lambda: image_codec.encode(png, PNG), typed_paste_windows),
+        ("PNG -> X11", lambda: image_codec.encode(png, PNG), lambda fmt, data: None,
+         lambda: image_codec.encode(png, PNG), typed_paste_x11),
+    ]
+    print(f"[Bench] {WIDTH}x{HEIGHT} screenshot, best of {iterations}")
+    for name, legacy_copy, legacy_paste, typed_copy, typed_paste in cases:
+        legacy_cpu, legacy_bytes = run_case(legacy_copy, legacy_paste, iterations)
+        typed_cpu, typed_bytes = run_case(typed_copy, typed_paste, iterations)
+        print(f"  {name:<15} legacy {legacy_cpu * 1000:8.1f} ms CPU {legacy_bytes / 1e6:7.1f} MB   "
+              f"typed {typed_cpu * 1000:8.1f} ms CPU {typed_bytes / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Keymap benchmark - key events translated per second, string keys with per-call tables vs numeric codes with import-time tables
+
+Run from the repository root:
+    python -m benchmarks.bench_keymap [events, default 200000]
+
+"before" receives {"key": "Key.shift_r"}-style lines, parses the string
+the way receive_secondary did and rebuilds the xdotool, shift and VK
+tables on every lookup, as KeyboardController's methods used to.
+"after" receives {"code": n} lines, decodes them with keymap.decode and
+looks the result up in the module-level tables. Both resolve the
+xdotool name, shift need, base key and VK code of every event. "lookup"
+excludes the JSON parsing both variants share.
+"""
+import json
+import sys
+import time
+
+from controllers import keymap
+from controllers.keymap import XDOTOOL_NAMES, SHIFT_BASE, VK_CODES
+
+TEXT = "The quick brown fox, said \"Hello!\" (twice) & typed 42 more_keys; "
+SPECIALS = ("shift_r", "ctrl_l", "backspace", "enter", "space", "left", "tab", "alt")
+
+
+def events():
+    for i, char in enumerate(TEXT * 4):
+        yield char, char
+        if i % 5 == 0:
+            name = SPECIALS[i % len(SPECIALS)]
+            yield f"Key.{name}", name
+
+
+def legacy_lookup(key_str):
+    if key_str.startswith("Key."):
+        key_str = key_str.split(".", 1)[1].lower()
+    xdotool_map = dict(XDOTOOL_NAMES)
+    name = xdotool_map.get(key_str if len(key_str) == 1 else key_str.lower(), key_str)
+    shifted = len(key_str) == 1 and key_str in "<>?\"{}_+|!@#$%^&*():~"
+    base = dict(SHIFT_BASE).get(key_str, key_str) if len(key_str) == 1 else key_str
+    vk = dict(VK_CODES).get(key_str, None)
+    return name, shifted, base, vk
+
+
+def table_lookup(code):
+    key_str = keymap.decode(code)
+    name = XDOTOOL_NAMES.get(key_str if len(key_str) == 1 else key_str.lower(), key_str)
+    return name, key_str in SHIFT_BASE, SHIFT_BASE.get(key_str, key_str), VK_CODES.get(key_str)
+
+
+def rate(fn, items, count):
+    start = time.perf_counter()
+    done = 0
+    while done < count:
+        for item in items:
+            fn(item)
+        done += len(items)
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sample = list(events())
+    legacy_keys = [wire for wire, _ in sample]
+    codes = [keymap.encode(name) for _, name in sample]
+    legacy_lines = [json.dumps({"type": "key_press", "key": key}) for key in legacy_keys]
+    code_lines = [json.dumps({"type": "key_press", "code": code}) for code in codes]
+    for key, code in zip(legacy_keys, codes):
+        assert legacy_lookup(key) == table_lookup(code), key
+
+    print(f"[Bench] {count} key events, a {len(sample)}-event typing sample on repeat")
+    before = rate(legacy_lookup, legacy_keys, count)
+    after = rate(table_lookup, codes, count)
+    print(f"  lookup            before {before:12,.0f}/s   after {after:12,.0f}/s   x{after / before:.1f}")
+    before = rate(lambda line: legacy_lookup(json.loads(line)["key"]), legacy_lines, count)
+    after = rate(lambda line: table_lookup(json.loads(line)["code"]), code_lines, count)
+    print(f"  parse + lookup    before {before:12,.0f}/s   after {after:12,.0f}/s   x{after / before:.1f}")
+    print(f"  wire bytes/event  before {sum(map(len, legacy_lines)) / len(sample):8.1f}   "
+          f"after {sum(map(len, code_lines)) / len(sample):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
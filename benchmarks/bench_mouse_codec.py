@@ -0,0 +1,100 @@
+"""
+Mouse codec benchmark - compares the JSON-lines and binary primary-channel codecs
+
+Run from the repository root:
+    python -m benchmarks.bench_mouse_codec [events]
+"""
+import json
+import random
+import sys
+import time
+
+from network.protocol import FrameDecoder, encode_move, encode_click, encode_scroll
+
+
+def make_events(count):
+    """Mostly moves with the occasional click and scroll, like a real session"""
+    rng = random.Random(1)
+    events = []
+    for _ in range(count):
+        r = rng.random()
+        if r < 0.96:
+            events.append(("move", rng.random(), rng.random()))
+        elif r < 0.98:
+            events.append(("click", "left", rng.random() < 0.5))
+        else:
+            events.append(("scroll", 0, rng.choice((-1, 1))))
+    return events
+
+
+def json_encode(events):
+    out = []
+    for kind, a, b in events:
+        if kind == "move":
+            data = {"type": "move", "x": a, "y": b}
+        elif kind == "click":
+            data = {"type": "click", "button": a, "pressed": b}
+        else:
+            data = {"type": "scroll", "dx": a, "dy": b}
+        out.append((json.dumps(data) + "\n").encode())
+    return out
+
+
+def json_decode(chunks):
+    count = 0
+    buffer = b""
+    for data in chunks:
+        buffer += data
+        while b"\n" in buffer:
+            line_bytes, buffer = buffer.split(b"\n", 1)
+            json.loads(line_bytes.decode('utf-8'))
+            count += 1
+    return count
+
+
+def binary_encode(events):
+    out = []
+    for kind, a, b in events:
+        if kind == "move":
+            out.append(encode_move(a, b))
+        elif kind == "click":
+            out.append(encode_click(a, b))
+        else:
+            out.append(encode_scroll(a, b))
+    return out
+
+
+def binary_decode(chunks):
+    count = 0
+    decoder = FrameDecoder()
+    for data in chunks:
+        count += len(decoder.feed(data))
+    return count
+
+
+def run(name, encode, decode, events):
+    start = time.perf_counter()
+    frames = encode(events)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = decode(frames)
+    decode_time = time.perf_counter() - start
+
+    assert decoded == len(events), f"{name}: decoded {decoded} of {len(events)} events"
+    total_bytes = sum(len(f) for f in frames)
+    print(f"{name:<8} encode {len(events) / encode_time:>12,.0f} ev/s   "
+          f"decode {len(events) / decode_time:>12,.0f} ev/s   "
+          f"{total_bytes / len(events):6.1f} B/event")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    events = make_events(count)
+    print(f"[Bench] {count:,} mouse events")
+    run("json", json_encode, json_decode, events)
+    run("binary", binary_encode, binary_decode, events)
+
+
+if __name__ == "__main__":
+    main()
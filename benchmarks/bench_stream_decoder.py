@@ -0,0 +1,77 @@
+"""
+Stream decoder benchmark - feeds large newline-terminated payloads through LineDecoder
+
+Run from the repository root:
+    python -m benchmarks.bench_stream_decoder [megabytes]
+"""
+import sys
+import time
+
+from network.stream_decoder import LineDecoder
+
+CHUNK = 16384  # matches the old tertiary recv size
+
+
+class ChunkSource:
+    """Socket stand-in that serves a payload in fixed-size pieces via recv_into"""
+
+    def __init__(self, payload, chunk=CHUNK):
+        self.view = memoryview(payload)
+        self.pos = 0
+        self.chunk = chunk
+
+    def recv_into(self, buffer, nbytes=0):
+        n = min(nbytes or len(buffer), self.chunk, len(self.view) - self.pos)
+        buffer[:n] = self.view[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def make_payload(size):
+    """One size-byte line followed by a few small ones, like a file_transfer burst"""
+    return b"x" * size + b"\n" + b'{"type": "key"}\n' * 8
+
+
+def decoder_read(payload):
+    decoder = LineDecoder()
+    source = ChunkSource(payload)
+    lines = 0
+    while decoder.fill_from(source):
+        for _ in decoder.lines():
+            lines += 1
+    return lines
+
+
+def legacy_read(payload):
+    """The split loop the receive functions used before LineDecoder"""
+    view = memoryview(payload)
+    buffer = b""
+    lines = 0
+    for start in range(0, len(view), CHUNK):
+        buffer += view[start:start + CHUNK]
+        while b"\n" in buffer:
+            line_bytes, buffer = buffer.split(b"\n", 1)
+            lines += 1
+    return lines
+
+
+def run(name, read, payload):
+    start = time.perf_counter()
+    lines = read(payload)
+    elapsed = time.perf_counter() - start
+    assert lines == 9, f"{name}: got {lines} lines"
+    mb = len(payload) / (1024 * 1024)
+    print(f"{name:<8} {mb:8.1f} MB   {elapsed:8.3f} s   {mb / elapsed:10.1f} MB/s")
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(f"[Bench] {size_mb} MB line in {CHUNK // 1024} KB chunks")
+    run("decoder", decoder_read, make_payload(size_mb * 1024 * 1024))
+    # The legacy loop is quadratic; keep its payload small enough to finish
+    legacy_mb = min(size_mb, 8)
+    run("legacy", legacy_read, make_payload(legacy_mb * 1024 * 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Xdotool benchmark - key injection latency and throughput: one xdotool process per key, a persistent session, and XTest
+
+Run from the repository root:
+    python -m benchmarks.bench_xdotool [keys, default 200]
+
+Needs xdotool and Xvfb (started on a free display number when DISPLAY
+is unset); the XTest row also needs libXtst. Latency is one tap
+followed by a wait until it has been executed; for the session that
+wait is a sync() round trip, so the figure includes one extra command,
+and for XTest an XSync. Throughput is a burst of taps with a single
+wait at the end. "session burst" sends the burst BURST keys per xdotool
+key command, as KeyboardController.batch() does for keys that arrive
+together.
+"""
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_clipboard_backends import start_xvfb
+from controllers import xtest
+from controllers.keyboard_controller import BURST_KEY_DELAY_MS
+from controllers.xdotool_session import XdotoolSession
+
+KEYS = ("a", "b", "comma", "shift_l+1", "space")
+BURST = 16
+
+
+def spawn_tap(key):
+    subprocess.run(["xdotool", "key", key], check=False)
+
+
+def measure(tap, wait, count):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        tap(KEYS[i % len(KEYS)])
+        wait()
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for i in range(count):
+        tap(KEYS[i % len(KEYS)])
+    wait()
+    burst = time.perf_counter() - start
+    return statistics.median(latencies) * 1000, count / burst
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if not shutil.which("xdotool"):
+        sys.exit("[Bench] Needs xdotool")
+    xvfb = start_xvfb()
+    session = XdotoolSession()
+    try:
+        if not session.sync():
+            sys.exit("[Bench] xdotool session did not answer (no X server?)")
+        print(f"[Bench] {count} key taps")
+        backends = [
+            ("spawn", spawn_tap, lambda: None),
+            ("session", lambda key: session.send(f"key {key}"), session.sync),
+        ]
+        injector = xtest.injector()
+        if injector:
+            backends.append(("xtest", lambda key: injector.tap(key.split("+")[-1]), injector.sync))
+        for name, tap, wait in backends:
+            latency, rate = measure(tap, wait, count)
+            print(f"  {name:<14} latency {latency:8.2f} ms   burst {rate:8.0f} keys/s")
+        keys = [KEYS[i % len(KEYS)] for i in range(count)]
+        start = time.perf_counter()
+        for i in range(0, count, BURST):
+            session.send(f"key --delay {BURST_KEY_DELAY_MS} " + " ".join(keys[i:i + BURST]))
+        session.sync()
+        print(f"  {'session burst':<14} {'':20}   burst {count / (time.perf_counter() - start):8.0f} keys/s")
+    finally:
+        session.close()
+        if xvfb:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
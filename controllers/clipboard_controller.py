@@ -3,19 +3,50 @@ Clipboard Controller - Handles clipboard operations across different operating s
 Supports text, images, and other formats using base64 encoding
 """
 import base64
-import io
 import os
 import platform
+import shutil
 import subprocess
 import threading
 import urllib.parse
 from typing import Optional, Tuple
 
+from controllers import x11_selection
+from controllers.x11_selection import TEXT_TARGETS, FILE_TARGETS
+from controllers import image_codec
+from controllers.clipboard_history import ClipboardHistory
+from controllers.image_codec import PNG, BMP, IMAGE_TYPES
+
+
+def _files_from_uris(uris):
+    """Local paths from a text/uri-list payload"""
+    return [urllib.parse.unquote(u.replace('file://', '')) for u in uris.splitlines() if u.startswith('file://')]
+
+
+def _uri_list(files):
+    """text/uri-list and x-special/gnome-copied-files payloads for local paths"""
+    uri_list = []
+    for f in files:
+        f = os.path.abspath(f)
+        # Proper URI escaping for Linux (important for spaces)
+        url_path = urllib.parse.quote(f)
+        if not url_path.startswith('/'):
+            url_path = '/' + url_path
+        uri_list.append(f"file://{url_path}")
+    # Standard URI list (CRLF separated); GNOME (Nautilus) specifically often wants x-special/gnome-copied-files
+    return "\r\n".join(uri_list) + "\r\n", "copy\n" + "\n".join(uri_list)
+
+
 class ClipboardController:
-    def __init__(self, save_to_folder=False):
+    def __init__(self, save_to_folder=False, history=None):
         self.lock = threading.Lock()
         self.os_type = platform.system().lower()
         self.save_to_folder = save_to_folder
+        # Clipboards exchanged with the peer; an empty history keeps nothing
+        self.history = history if history is not None else ClipboardHistory(0, 0)
+        self._x11_reader = None
+        self._x11_owner = None
+        self.image_transcoder = image_codec.ImageTranscoder()
         self._init_clipboard_functions()
     
     def _init_clipboard_functions(self):
@@ -26,6 +57,8 @@ class ClipboardController:
                 import win32con
                 self.win32clipboard = win32clipboard
                 self.win32con = win32con
+                # Registered by browsers and screenshot tools next to CF_DIB
+                self.cf_png = win32clipboard.RegisterClipboardFormat("PNG")
             except ImportError:
                 import pyperclip as pypc
                 self._fallback = pypc
@@ -34,22 +67,15 @@ class ClipboardController:
         elif self.os_type == "linux":
             self.win32clipboard = None
             self.win32con = None
-            try:
-                # Strictly require WAYLAND_DISPLAY and a successful wl-paste check
-                if os.environ.get('WAYLAND_DISPLAY'):
-                    res = subprocess.run(['wl-paste', '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    if res.returncode == 0:
-                        self.linux_tool = 'wl-clipboard'
-                    else:
-                        raise Exception("wl-clipboard missing or fails")
-                else:
-                    raise Exception("Not in Wayland")
-            except:
-                try:
-                    subprocess.run(['xclip', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                    self.linux_tool = 'xclip'
-                except:
-                    self.linux_tool = 'fallback'
+            # PATH lookups only; spawning the tools just to print a version cost a fork each
+            if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-paste'):
+                self.linux_tool = 'wl-clipboard'
+            elif x11_selection.available():
+                self.linux_tool = 'x11'  # In-process, see _x11_get/_x11_set
+            elif shutil.which('xclip'):
+                self.linux_tool = 'xclip'
+            else:
+                self.linux_tool = 'fallback'
         else:
             import pyperclip as pypc
             self._fallback = pypc
@@ -78,26 +104,20 @@ class ClipboardController:
                         except Exception as e:
                             print(f"[Clipboard] Error reading files: {e}")
                     
-                    # Try to get image (bitmap)
+                    # Try to get image, as the application stored it; the sender converts only for older peers
+                    if self.win32clipboard.IsClipboardFormatAvailable(self.cf_png):
+                        try:
+                            data = self.win32clipboard.GetClipboardData(self.cf_png)
+                            print("[Clipboard] Detected image (PNG)")
+                            return image_codec.encode(data, PNG)
+                        except Exception as e:
+                            print(f"[Clipboard] Error getting PNG data: {e}")
                     if self.win32clipboard.IsClipboardFormatAvailable(self.win32con.CF_DIB):
                         try:
                             data = self.win32clipboard.GetClipboardData(self.win32con.CF_DIB)
                             print("[Clipboard] Detected image (DIB)")
-                            try:
-                                from PIL import Image
-                                if len(data) >= 40:
-                                    bmp_header = b'BM'
-                                    file_size = (len(data) + 54).to_bytes(4, 'little')
-                                    data_offset = b'\x36\x00\x00\x00'
-                                    bmp_file = bmp_header + file_size + b'\x00\x00\x00\x00' + data_offset + data
-                                    img = Image.open(io.BytesIO(bmp_file))
-                                    output = io.BytesIO()
-                                    img.save(output, format='PNG')
-                                    encoded = base64.b64encode(output.getvalue()).decode('utf-8')
-                                    return f"image:{encoded}"
-                            except Exception:
-                                encoded = base64.b64encode(data).decode('utf-8')
-                                return f"image:{encoded}"
+                            if len(data) >= 40:
+                                return image_codec.encode(image_codec.dib_to_bmp(data), BMP)
                         except Exception as e:
                             print(f"[Clipboard] Error getting image data: {e}")
 
@@ -119,21 +139,31 @@ class ClipboardController:
                         pass
             
             elif self.os_type == "linux":
-                import urllib.parse
+                if self.linux_tool == 'x11':
+                    content = self._x11_get()
+                    if content is not None:
+                        return content
                 if self.linux_tool == 'wl-clipboard':
-                    # Try files
+                    # One --list-types call instead of probing every type in turn
                     try:
-                        uris = subprocess.check_output(['wl-paste', '-t', 'text/uri-list'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
-                        files = [urllib.parse.unquote(u.replace('file://', '')) for u in uris.splitlines() if u.startswith('file://')]
-                        if files:
-                            encoded = base64.b64encode("\n".join(files).encode('utf-8')).decode('utf-8')
-                            return f"files:{encoded}"
-                    except: pass
+                        types = subprocess.check_output(['wl-paste', '--list-types'], stderr=subprocess.DEVNULL).decode('utf-8').split()
+                    except: return ""
+                    # Try files
+                    if 'text/uri-list' in types:
+                        try:
+                            uris = subprocess.check_output(['wl-paste', '-t', 'text/uri-list'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
+                            files = _files_from_uris(uris)
+                            if files:
+                                encoded = base64.b64encode("\n".join(files).encode('utf-8')).decode('utf-8')
+                                return f"files:{encoded}"
+                        except: pass
                     # Try image
-                    try:
-                        img_data = subprocess.check_output(['wl-paste', '-t', 'image/png'], stderr=subprocess.DEVNULL)
-                        return f"image:{base64.b64encode(img_data).decode('utf-8')}"
-                    except: pass
+                    for mime in IMAGE_TYPES:
+                        if mime in types:
+                            try:
+                                img_data = subprocess.check_output(['wl-paste', '-t', mime], stderr=subprocess.DEVNULL)
+                                return image_codec.encode(img_data, mime)
+                            except: pass
                     # Text
                     try:
                         text = subprocess.check_output(['wl-paste'], stderr=subprocess.DEVNULL).decode('utf-8')
@@ -144,7 +174,7 @@ class ClipboardController:
                     try:
                         try:
                             uris = subprocess.check_output(['xclip', '-selection', 'clipboard', '-t', 'text/uri-list', '-o'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
-                            files = [urllib.parse.unquote(u.replace('file://', '')) for u in uris.splitlines() if u.startswith('file://')]
+                            files = _files_from_uris(uris)
                             if files:
                                 return f"files:{base64.b64encode(chr(10).join(files).encode('utf-8')).decode('utf-8')}"
                         except: pass
@@ -166,7 +196,7 @@ class ClipboardController:
         """Set clipboard content (decodes base64 and sets appropriate format)"""
         with self.lock:
             try:
-                # Parse format prefix (image: or text:)
+                # Parse format prefix (image:, image/<type>:, files: or text:)
                 if ":" not in encoded_data:
                     # Old format without prefix, treat as text
                     format_type = "text"
@@ -177,6 +207,9 @@ class ClipboardController:
                 # Decode base64
                 decoded_data = base64.b64decode(base64_data)
                 print(f"[Clipboard] Setting clipboard format: {format_type}")
+                mime = None
+                if image_codec.is_image(format_type):
+                    mime, format_type = image_codec.mime_of(format_type), "image"
                 
                 if self.os_type == "windows" and self.win32clipboard:
                     try:
@@ -184,33 +217,18 @@ class ClipboardController:
                         self.win32clipboard.EmptyClipboard()
                         
                         if format_type == "image":
-                            # Try to use PIL to convert image to proper format
+                            if mime == PNG:
+                                # PNG-aware applications get the original bytes
+                                self.win32clipboard.SetClipboardData(self.cf_png, decoded_data)
                             try:
-                                from PIL import Image
-                                
-                                # Try to open as image and convert
-                                img = Image.open(io.BytesIO(decoded_data))
-                                
-                                # Convert to RGB if needed
-                                if img.mode not in ('RGB', 'RGBA'):
-                                    img = img.convert('RGB')
-                                
-                                # Save as BMP to get proper DIB format
-                                output = io.BytesIO()
-                                img.save(output, format='BMP')
-                                bmp_data = output.getvalue()
-                                
-                                # Extract DIB from BMP (skip BMP file header, 14 bytes)
-                                if len(bmp_data) > 14:
-                                    dib_data = bmp_data[14:]  # Remove BMP header
-                                    self.win32clipboard.SetClipboardData(self.win32con.CF_DIB, dib_data)
-                                else:
-                                    # Invalid data, try as raw
-                                    self.win32clipboard.SetClipboardData(self.win32con.CF_DIB, decoded_data)
+                                # A BMP file is a DIB behind a 14-byte header; only PNG needs decoding
+                                bmp_data = self.image_transcoder.convert(decoded_data, mime, BMP)
+                                self.win32clipboard.SetClipboardData(self.win32con.CF_DIB, image_codec.bmp_to_dib(bmp_data))
                             except (ImportError, Exception) as e:
                                 print(f"[Clipboard] Image conversion failed: {e}")
-                                # Fallback: try to set raw data as DIB
-                                self.win32clipboard.SetClipboardData(self.win32con.CF_DIB, decoded_data)
+                                if mime != PNG:
+                                    # Fallback: try to set raw data as DIB
+                                    self.win32clipboard.SetClipboardData(self.win32con.CF_DIB, decoded_data)
                         elif format_type == "files":
                             try:
                                 files = decoded_data.decode('utf-8').splitlines()
@@ -243,30 +261,19 @@ class ClipboardController:
                         return False
                 
                 elif self.os_type == "linux":
+                    if self.linux_tool == 'x11' and self._x11_set(format_type, decoded_data, mime):
+                        return True
                     try:
                         if format_type == "image":
+                            # wl-copy and xclip offer a single type, and PNG is the one applications take
+                            decoded_data = self.image_transcoder.convert(decoded_data, mime, PNG)
                             tool = 'wl-copy' if self.linux_tool == 'wl-clipboard' else 'xclip'
                             cmd = [tool, '-t', 'image/png'] if tool == 'wl-copy' else ['xclip', '-selection', 'clipboard', '-t', 'image/png']
                             p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
                             p.communicate(input=decoded_data)
                         elif format_type == "files":
                             # Setting files on Linux is harder, we provide the paths as text/uri-list
-                            files = decoded_data.decode('utf-8').splitlines()
-                            
-                            uri_list = []
-                            for f in files:
-                                f = os.path.abspath(f)
-                                # Proper URI escaping for Linux (important for spaces)
-                                url_path = urllib.parse.quote(f)
-                                if not url_path.startswith('/'):
-                                    url_path = '/' + url_path
-                                uri_list.append(f"file://{url_path}")
-                            
-                            # Standard URI list (CRLF separated)
-                            uris = "\r\n".join(uri_list) + "\r\n"
-                            
-                            # GNOME (Nautilus) specifically often wants x-special/gnome-copied-files
-                            gnome_paths = "copy\n" + "\n".join(uri_list)
+                            uris, gnome_paths = _uri_list(decoded_data.decode('utf-8').splitlines())
                             
                             tool = 'wl-copy' if self.linux_tool == 'wl-clipboard' else 'xclip'
                             
@@ -309,3 +316,55 @@ class ClipboardController:
                 print(f"[Clipboard] Error parsing clipboard data: {e}")
                 return False
 
+
+    # In-process X11 backend
+    def _x11_get(self):
+        """Read CLIPBOARD without spawning xclip; None means fall back to xclip"""
+        try:
+            if self._x11_reader is None:
+                self._x11_reader = x11_selection.X11SelectionReader()
+            reader = self._x11_reader
+            targets = reader.targets()
+            if FILE_TARGETS[0] in targets:
+                files = _files_from_uris((reader.read(FILE_TARGETS[0]) or b"").decode('utf-8', errors='ignore'))
+                if files:
+                    return f"files:{base64.b64encode(chr(10).join(files).encode('utf-8')).decode('utf-8')}"
+            for mime in IMAGE_TYPES:
+                if mime in targets:
+                    img_data = reader.read(mime)
+                    if img_data:
+                        return image_codec.encode(img_data, mime)
+            for target in TEXT_TARGETS:
+                if target in targets:
+                    text = (reader.read(target) or b"").decode('utf-8', errors='ignore')
+                    return f"text:{base64.b64encode(text.encode('utf-8')).decode('utf-8')}"
+            return ""
+        except OSError as e:
+            self._x11_failed(e)
+            return None
+
+    def _x11_set(self, format_type, decoded_data, mime=None):
+        """Own CLIPBOARD with the data in-process; False means fall back to xclip"""
+        if format_type == "image":
+            # Types other than the original are converted only if an application asks for them
+            targets = image_codec.targets_for(mime)
+            fetch = lambda target: self.image_transcoder.convert(decoded_data, mime, target)
+        else:
+            if format_type == "files":
+                uris, gnome_paths = _uri_list(decoded_data.decode('utf-8').splitlines())
+                payload = {FILE_TARGETS[0]: uris.encode('utf-8'), FILE_TARGETS[1]: gnome_paths.encode('utf-8')}
+            else:
+                payload = {target: decoded_data for target in TEXT_TARGETS}
+            targets, fetch = tuple(payload), payload.get
+        try:
+            if self._x11_owner is None:
+                self._x11_owner = x11_selection.X11SelectionOwner()
+            self._x11_owner.offer(targets, fetch, wait=True)
+            return True
+        except OSError as e:
+            self._x11_failed(e)
+            return False
+
+    def _x11_failed(self, error):
+        print(f"[Clipboard] In-process X11 clipboard unavailable ({error}), using xclip")
+        self.linux_tool = 'xclip' if shutil.which('xclip') else 'fallback'
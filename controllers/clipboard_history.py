@@ -0,0 +1,125 @@
+"""
+Clipboard History - Recent clipboards shared with the peer, so copying one again can be sent by reference
+"""
+import collections
+import os
+import threading
+
+from controllers.clipboard_watcher import digest
+
+# Clipboards smaller than this are sent as they are; a reference would save little
+REF_MIN_SIZE = 4096
+
+
+def history_dir():
+    return os.path.join(os.path.expanduser("~"), "Portal", ".clipboard")
+
+
+class ClipboardHistory:
+    """Bounded LRU of encoded clipboards that crossed the link, keyed by digest.
+
+    Only clipboards sent to or received from the peer are added, so an
+    entry here is one the peer has seen too. Up to max_entries entries
+    and max_bytes of content stay in memory; with spill_bytes, entries
+    pushed out of memory go to spill_dir instead (oldest removed first
+    once that is full) and come back on use. File lists are not kept:
+    their paths only mean something on the machine that made them.
+    """
+
+    def __init__(self, max_entries, max_bytes, spill_dir=None, spill_bytes=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes if spill_dir else 0
+        self._entries = collections.OrderedDict()  # digest -> encoded clipboard, oldest first
+        self._size = 0
+        self._spilled = collections.OrderedDict()  # digest -> bytes on disk, oldest first
+        self._spilled_size = 0
+        self._lock = threading.Lock()
+        if self.spill_bytes:
+            self._load_spilled()
+
+    def _load_spilled(self):
+        entries = []
+        try:
+            for name in os.listdir(self.spill_dir):
+                if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+                    st = os.stat(os.path.join(self.spill_dir, name))
+                    entries.append((st.st_mtime, name, st.st_size))
+        except OSError:
+            pass
+        for _, name, size in sorted(entries):
+            self._spilled[name] = size
+            self._spilled_size += size
+
+    def add(self, data, data_digest=None):
+        """Remember data (or mark it as just used); the oldest entries make room"""
+        if not self.max_entries or not data or data.startswith("files:") or len(data) > self.max_bytes:
+            return
+        data_digest = data_digest or digest(data)
+        with self._lock:
+            if data_digest in self._entries:
+                self._entries.move_to_end(data_digest)
+                return
+            self._unspill(data_digest)
+            self._entries[data_digest] = data
+            self._size += len(data)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                old_digest, old = self._entries.popitem(last=False)
+                self._size -= len(old)
+                self._spill(old_digest, old)
+
+    def has(self, data_digest):
+        with self._lock:
+            return data_digest in self._entries or data_digest in self._spilled
+
+    def get(self, data_digest):
+        """The clipboard with this digest, or None"""
+        with self._lock:
+            data = self._entries.get(data_digest)
+            if data is not None:
+                self._entries.move_to_end(data_digest)
+                return data
+            if data_digest not in self._spilled:
+                return None
+            try:
+                with open(os.path.join(self.spill_dir, data_digest), encoding="utf-8", newline="") as f:
+                    data = f.read()
+            except (OSError, ValueError):
+                data = None
+        if data is None or digest(data) != data_digest:
+            with self._lock:
+                self._unspill(data_digest)
+            return None
+        self.add(data, data_digest)
+        return data
+
+    def recent(self, limit=10):
+        """Newest entries first, as (digest, format, encoded length) for listing"""
+        with self._lock:
+            items = list(self._entries.items())[::-1][:limit]
+        return [(d, data.split(":", 1)[0] if ":" in data else "text", len(data)) for d, data in items]
+
+    def _spill(self, data_digest, data):
+        if len(data) > self.spill_bytes:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(os.path.join(self.spill_dir, data_digest), "w", encoding="utf-8", newline="") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"[Clipboard] History spill failed: {e}")
+            return
+        self._spilled[data_digest] = len(data)
+        self._spilled_size += len(data)
+        while self._spilled_size > self.spill_bytes:
+            self._unspill(next(iter(self._spilled)))
+
+    def _unspill(self, data_digest):
+        if data_digest not in self._spilled:
+            return
+        self._spilled_size -= self._spilled.pop(data_digest)
+        try:
+            os.remove(os.path.join(self.spill_dir, data_digest))
+        except OSError:
+            pass
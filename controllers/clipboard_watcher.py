@@ -0,0 +1,277 @@
+"""
+Clipboard Watcher - Keeps a cached clipboard snapshot, refreshed when the OS reports a change
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import subprocess
+import threading
+import time
+
+from controllers import x11_selection
+
+POLL_INTERVAL = 0.25     # seconds between change checks on Windows
+SLOW_POLL_INTERVAL = 1.0 # seconds between full reads where no change signal exists
+
+
+def digest(data):
+    """Hash of an encoded clipboard string"""
+    return hashlib.sha256(data.encode('utf-8')).hexdigest() if data else None
+
+
+def _same(seen, data, data_digest):
+    """Compare a (length, digest) pair with data; only hashes when the lengths match"""
+    if seen is None or seen[0] != len(data):
+        return False
+    return seen[1] == (data_digest or digest(data))
+
+
+class ClipboardDedup:
+    """Decides whether a clipboard still has to cross the link.
+
+    Only (length, digest) pairs are kept, never the payload. Outgoing
+    clipboards are checked against what the peer holds, i.e. whichever
+    of the last sent and last received is newer; incoming ones against
+    the local clipboard. Lengths differ for nearly every real change, so
+    a hash is only computed when they match.
+    """
+
+    def __init__(self):
+        self.sent = None      # (length, digest) last sent to the peer
+        self.received = None  # (length, digest) last taken from the peer
+        self._peer = None
+        self._lock = threading.Lock()
+
+    def should_send(self, data, data_digest=None):
+        """True if the peer does not have data yet; it then counts as sent"""
+        if not data:
+            return False
+        with self._lock:
+            if _same(self._peer, data, data_digest):
+                return False
+            self.sent = self._peer = (len(data), data_digest or digest(data))
+            return True
+
+    def record_received(self, data, local=None, local_digest=None):
+        """Remember data as the peer's clipboard; True if it differs from local"""
+        data_digest = digest(data)
+        with self._lock:
+            self.received = self._peer = (len(data), data_digest)
+        if not local or len(local) != len(data):
+            return True
+        return (local_digest or digest(local)) != data_digest
+
+    def forget_sent(self):
+        """The last send failed; let the next transition try again"""
+        with self._lock:
+            if self._peer is self.sent:
+                self._peer = None
+            self.sent = None
+
+
+class ClipboardWatcher:
+    """Cache of ClipboardController.get_clipboard() kept current in the background.
+
+    Backends, best first: "wl-paste --watch" on Wayland, XFixes selection
+    owner events on X11, GetClipboardSequenceNumber polling on Windows,
+    and plain periodic reads elsewhere. Readers such as transition() only
+    look at the cache and never touch the clipboard themselves.
+    """
+
+    def __init__(self, clipboard_controller):
+        self.clipboard_controller = clipboard_controller
+        self.backend = None
+        self._data = ""
+        self._digest = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._process = None
+        self._held = False
+
+    def start(self):
+        self._running = True
+        self.refresh()
+        os_type = self.clipboard_controller.os_type
+        if os_type == "linux" and getattr(self.clipboard_controller, 'linux_tool', None) == 'wl-clipboard':
+            target, self.backend = self._watch_wayland, "wl-paste"
+        elif os_type == "linux" and os.environ.get('DISPLAY') and _XFixes.available():
+            target, self.backend = self._watch_xfixes, "xfixes"
+        elif os_type == "windows":
+            target, self.backend = self._poll_sequence, "sequence"
+        else:
+            target, self.backend = self._poll_contents, "polling"
+        print(f"[Clipboard] Watching for changes ({self.backend})")
+        threading.Thread(target=target, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        if self._process:
+            try:
+                self._process.terminate()
+            except Exception:
+                pass
+
+    def snapshot(self):
+        """Return the cached (encoded clipboard, digest)"""
+        with self._lock:
+            return self._data, self._digest
+
+    def current(self):
+        """Return the cached encoded clipboard string"""
+        with self._lock:
+            return self._data
+
+    def refresh(self):
+        """Read the clipboard now and update the cache"""
+        if self._held:
+            return
+        try:
+            data = self.clipboard_controller.get_clipboard() or ""
+        except Exception as e:
+            print(f"[Clipboard] Watcher read failed: {e}")
+            return
+        self.update(data)
+
+    def update(self, data):
+        """Replace the cache, e.g. right after we set the clipboard ourselves"""
+        with self._lock:
+            if data != self._data:
+                self._data = data
+                self._digest = digest(data)
+
+    def hold(self, placeholder_digest):
+        """Report an empty clipboard with the given digest until release().
+
+        Used while we own a lazily offered clipboard: reading it back would
+        pull the payload from the peer, and it must not be sent back anyway.
+        """
+        with self._lock:
+            self._held = True
+            self._data = ""
+            self._digest = placeholder_digest
+
+    def release(self):
+        """Another application took the clipboard; resume normal refreshes"""
+        self._held = False
+        self.refresh()
+
+    # Backends
+    def _watch_wayland(self):
+        """wl-paste runs the given command once per clipboard change"""
+        while self._running:
+            try:
+                self._process = subprocess.Popen(['wl-paste', '--watch', 'echo'], stdout=subprocess.PIPE,
+                                                 stderr=subprocess.DEVNULL)
+                for _ in self._process.stdout:
+                    if not self._running:
+                        break
+                    self.refresh()
+                self._process.wait()
+            except Exception as e:
+                print(f"[Clipboard] wl-paste --watch failed: {e}")
+            if self._running:
+                time.sleep(1.0) # Restart after the compositor or wl-paste went away
+
+    def _watch_xfixes(self):
+        try:
+            xfixes = _XFixes()
+        except Exception as e:
+            print(f"[Clipboard] XFixes unavailable ({e}), polling instead")
+            self.backend = "polling"
+            self._poll_contents()
+            return
+        try:
+            while self._running:
+                if xfixes.wait_for_change(timeout=1.0):
+                    self.refresh()
+        finally:
+            xfixes.close()
+
+    def _poll_sequence(self):
+        try:
+            get_sequence = ctypes.windll.user32.GetClipboardSequenceNumber
+        except Exception:
+            self.backend = "polling"
+            self._poll_contents()
+            return
+        last = get_sequence()
+        while self._running:
+            time.sleep(POLL_INTERVAL)
+            sequence = get_sequence()
+            if sequence != last:
+                last = sequence
+                self.refresh()
+
+    def _poll_contents(self):
+        while self._running:
+            time.sleep(SLOW_POLL_INTERVAL)
+            self.refresh()
+
+
+class _XFixes:
+    """Minimal ctypes binding for XFixes selection owner notifications"""
+
+    XFixesSetSelectionOwnerNotifyMask = 1
+    XFixesSelectionNotify = 0
+
+    _xfixes = None
+
+    @classmethod
+    def _load(cls):
+        """(libX11, libXfixes), prototyped once; empty when either is missing"""
+        if cls._xfixes is None:
+            path = ctypes.util.find_library("Xfixes")
+            if not path or x11_selection.load_xlib() is None:
+                cls._xfixes = False
+            else:
+                xfixes = ctypes.CDLL(path)
+                xfixes.XFixesQueryExtension.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                                        ctypes.POINTER(ctypes.c_int)]
+                xfixes.XFixesSelectSelectionInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong,
+                                                              ctypes.c_ulong]
+                cls._xfixes = xfixes
+        return (x11_selection.load_xlib(), cls._xfixes) if cls._xfixes else ()
+
+    @classmethod
+    def available(cls):
+        try:
+            return bool(cls._load())
+        except OSError:
+            return False
+
+    def __init__(self):
+        self.x11, self.xfixes = self._load()
+        x11 = self.x11
+        self.display = x11_selection.open_display()
+        if not self.display:
+            raise OSError("cannot open display")
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if not self.xfixes.XFixesQueryExtension(self.display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            x11_selection.close_display(self.display)
+            raise OSError("XFixes extension missing")
+        self.notify_type = event_base.value + self.XFixesSelectionNotify
+        root = x11.XDefaultRootWindow(self.display)
+        clipboard = x11.XInternAtom(self.display, b"CLIPBOARD", 0)
+        self.xfixes.XFixesSelectSelectionInput(self.display, root, clipboard, self.XFixesSetSelectionOwnerNotifyMask)
+        self.fd = x11.XConnectionNumber(self.display)
+        self._event = (ctypes.c_long * 24)()  # sizeof(XEvent)
+
+    def wait_for_change(self, timeout):
+        """Block up to timeout seconds; True if the clipboard owner changed"""
+        changed = False
+        if not self.x11.XPending(self.display):
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if not readable:
+                return False
+        while self.x11.XPending(self.display):
+            self.x11.XNextEvent(self.display, self._event)
+            if ctypes.cast(self._event, ctypes.POINTER(ctypes.c_int))[0] == self.notify_type:
+                changed = True
+        return changed
+
+    def close(self):
+        if self.display:
+            x11_selection.close_display(self.display)
+            self.display = None
@@ -0,0 +1,94 @@
+"""
+Image Codec - Typed clipboard images: MIME detection, pass-through and on-demand transcoding
+"""
+import base64
+import io
+import threading
+
+PNG = "image/png"
+BMP = "image/bmp"
+
+# Image types we can carry without transcoding, in order of preference
+IMAGE_TYPES = (PNG, BMP)
+# Hello value for "img=": the subtypes of IMAGE_TYPES
+HELLO_IMAGE_TYPES = "png,bmp"
+
+_PIL_FORMATS = {PNG: "PNG", BMP: "BMP"}
+
+
+def is_image(fmt):
+    """True for the "image" prefix (PNG) and typed "image/<subtype>" prefixes"""
+    return fmt == "image" or fmt.startswith("image/")
+
+
+def mime_of(fmt):
+    """MIME type of an encoded clipboard prefix; plain "image" is PNG for older peers"""
+    return PNG if fmt == "image" else fmt
+
+
+def encode(data, mime):
+    """Encoded clipboard string for raw image bytes"""
+    prefix = "image" if mime == PNG else mime
+    return f"{prefix}:{base64.b64encode(data).decode('utf-8')}"
+
+
+def hello_types(value):
+    """MIME types listed in a peer's "img=" hello value; PNG is always understood"""
+    types = {PNG}
+    for subtype in (value or "").split(","):
+        if f"image/{subtype}" in IMAGE_TYPES:
+            types.add(f"image/{subtype}")
+    return types
+
+
+def targets_for(mime):
+    """X11 targets to offer for an image: its own type, plus PNG converted on request"""
+    return (mime,) if mime == PNG else (mime, PNG)
+
+
+def dib_to_bmp(dib):
+    """Prefix a Windows CF_DIB with a BMP file header; the pixels are not touched"""
+    header_size = int.from_bytes(dib[0:4], 'little')
+    bit_count = int.from_bytes(dib[14:16], 'little')
+    compression = int.from_bytes(dib[16:20], 'little')
+    colors_used = int.from_bytes(dib[32:36], 'little')
+    offset = 14 + header_size
+    if header_size == 40 and compression == 3:    # BI_BITFIELDS masks follow the header
+        offset += 12
+    if bit_count <= 8:
+        offset += 4 * (colors_used or 1 << bit_count)
+    else:
+        offset += 4 * colors_used
+    file_header = b"BM" + (14 + len(dib)).to_bytes(4, 'little') + b"\0\0\0\0" + offset.to_bytes(4, 'little')
+    return file_header + dib
+
+
+def bmp_to_dib(bmp):
+    """CF_DIB is a BMP file without its 14-byte file header"""
+    return bmp[14:]
+
+
+class ImageTranscoder:
+    """Converts an image only when a different type is asked for.
+
+    Encodes go through one BytesIO that is rewound rather than recreated,
+    so repeated 4K conversions do not regrow a fresh buffer every time.
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._lock = threading.Lock()
+
+    def convert(self, data, source, target):
+        if source == target:
+            return data
+        from PIL import Image
+        img = Image.open(io.BytesIO(data))
+        if target == BMP and img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        with self._lock:
+            buffer = self._buffer
+            buffer.seek(0)
+            img.save(buffer, format=_PIL_FORMATS[target])
+            buffer.truncate()
+            return buffer.getvalue()
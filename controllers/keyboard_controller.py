@@ -1,7 +1,19 @@
+import contextlib
 import platform
 import time
 from pynput.keyboard import Controller as PynputController, Key
 
+from controllers import keymap, xtest
+from controllers.keymap import XDOTOOL_NAMES, SHIFT_BASE, VK_CODES, SPECIAL_KEYS
+from controllers.xdotool_session import XdotoolSession
+
+# Characters typed with shift on a US layout
+SHIFT_CHARS = frozenset(SHIFT_BASE)
+# Special key names -> pynput Key objects, for the pynput fallback
+PYNPUT_KEYS = {name: getattr(Key, name) for name in SPECIAL_KEYS if hasattr(Key, name)}
+# Delay between the taps of one burst "key" command (xdotool's default is 12 ms)
+BURST_KEY_DELAY_MS = 1
+
 class KeyboardController:
     def __init__(self):
         self._controller = PynputController()
@@ -9,6 +21,12 @@ class KeyboardController:
         self.use_win32 = False
         self.use_xdotool = False
         self.subprocess = None
+        self.xdotool_session = None
+        self.xtest = None
+        self._burst = None  # xdotool key names of the taps held back inside batch()
+        # Events one backend may not have delivered yet; the other waits for them before injecting
+        self._xtest_pending = False
+        self._xdotool_pending = False
 
         if self.os_type == "windows":
             try:
@@ -19,6 +37,8 @@ class KeyboardController:
             except ImportError:
                 pass
         elif self.os_type == "linux":
+            # In-process XTest first; xdotool stays for keysyms the layout has no key for
+            self.xtest = xtest.injector()
             try:
                 import subprocess
                 self.subprocess = subprocess
@@ -26,9 +46,14 @@ class KeyboardController:
                 self.use_xdotool = result.returncode == 0
             except:
                 pass
+            if self.use_xdotool:
+                self.xdotool_session = XdotoolSession()
 
     def _normalize_key(self, key):
         """Normalize key to a string representation"""
+        # Numeric wire codes map straight to a character or special key name
+        if isinstance(key, int):
+            return keymap.decode(key)
         # If it's already a pynput Key object, extract its name
         if isinstance(key, Key):
             return key.name  # Special keys like shift, ctrl, caps_lock
@@ -44,139 +69,81 @@ class KeyboardController:
     # ---------------- Linux ----------------
     def _key_to_xdotool(self, key_str):
         """Convert pynput key name or character to xdotool key name"""
-        # xdotool uses different key names than pynput
-        xdotool_map = {
-            # Special keys
-            "backspace": "BackSpace",
-            "tab": "Tab",
-            "caps_lock": "Caps_Lock",
-            "cmd": "Super_L",  # Windows/Meta key
-            "cmd_l": "Super_L",
-            "cmd_r": "Super_R",
-            "ctrl": "Control_L",
-            "ctrl_l": "Control_L",
-            "ctrl_r": "Control_R",
-            "shift": "Shift_L",
-            "shift_l": "Shift_L",
-            "shift_r": "Shift_R",
-            "alt": "Alt_L",
-            "alt_l": "Alt_L",
-            "alt_r": "Alt_R",
-            "enter": "Return",
-            "space": "space",
-            "esc": "Escape",
-            "delete": "Delete",
-            "up": "Up",
-            "down": "Down",
-            "left": "Left",
-            "right": "Right",
-            # Special characters
-            ",": "comma",
-            ".": "period",
-            "/": "slash",
-            "'": "apostrophe",
-            "[": "bracketleft",
-            "]": "bracketright",
-            "-": "minus",
-            "=": "equal",
-            "\\": "backslash",
-            # Shift variants (xdotool handles these with shift modifier)
-            "<": "comma",  # Will need shift
-            ">": "period",  # Will need shift
-            "?": "slash",  # Will need shift
-            '"': "apostrophe",  # Will need shift
-            "{": "bracketleft",  # Will need shift
-            "}": "bracketright",  # Will need shift
-            "_": "minus",  # Will need shift
-            "+": "equal",  # Will need shift
-            "|": "backslash",  # Will need shift
-            "!": "exclam",  # or "1" with shift
-            "@": "at",  # or "2" with shift
-            "#": "numbersign",  # or "3" with shift
-            "$": "dollar",  # or "4" with shift
-            "%": "percent",  # or "5" with shift
-            "^": "asciicircum",  # or "6" with shift
-            "&": "ampersand",  # or "7" with shift
-            "*": "asterisk",  # or "8" with shift
-            "(": "parenleft",  # or "9" with shift
-            ")": "parenright",  # or "0" with shift
-            ":": "colon",  # or "semicolon" with shift
-            ";": "semicolon",
-            "`": "grave",
-            "~": "asciitilde",
-        }
         # For single characters, check the map directly (case-sensitive for characters)
         if len(key_str) == 1:
-            return xdotool_map.get(key_str, key_str)
-        # Convert to lowercase for lookup of special key names
-        key_lower = key_str.lower() if isinstance(key_str, str) else str(key_str).lower()
+            return XDOTOOL_NAMES.get(key_str, key_str)
         # Return xdotool key name if mapped, otherwise return original
-        return xdotool_map.get(key_lower, key_str)
+        return XDOTOOL_NAMES.get(key_str.lower(), key_str)
 
     def _needs_shift(self, key_str):
         """Check if a character needs shift modifier"""
-        if len(key_str) != 1:
+        return key_str in SHIFT_CHARS
+
+    def _xtest_name(self, key_str):
+        """Keysym name for XTest; characters go through as they are and carry their own shift level"""
+        return key_str if len(key_str) == 1 else self._key_to_xdotool(key_str)
+
+    def _xdotool(self, *commands):
+        """Run xdotool commands in order, through the session unless it has failed"""
+        if self._xtest_pending:
+            self.xtest.sync()  # XTest events still in the Xlib buffer reach the server first
+            self._xtest_pending = False
+        if self.xdotool_session and self.xdotool_session.send(*commands):
+            self._xdotool_pending = True
+            return
+        for command in commands:
+            self.subprocess.run(["xdotool", *command.split()], check=False)
+
+    def _via_xtest(self, name, inject):
+        """Inject through XTest once xdotool has run everything sent before; False if XTest has no such key"""
+        if not self.xtest.supports(name):
             return False
-        shift_chars = "<>?\"{}_+|!@#$%^&*():~"
-        return key_str in shift_chars
+        self._flush_burst()
+        if self._xdotool_pending:
+            self.xdotool_session.sync()
+            self._xdotool_pending = False
+        inject(name)
+        self._xtest_pending = True
+        return True
+
+    def _flush_burst(self):
+        """Send the taps held back so far as one xdotool key command"""
+        if self._burst:
+            self._xdotool(f"key --delay {BURST_KEY_DELAY_MS} " + " ".join(self._burst))
+            self._burst.clear()
 
     def _xdotool_keydown(self, key_str):
         xdotool_key = self._key_to_xdotool(key_str)
         if self._needs_shift(key_str):
             # For shift characters, press shift first, then the base key
             base_key = self._key_to_xdotool(self._get_base_key(key_str))
-            self.subprocess.run(["xdotool", "keydown", "shift_l"], check=False)
-            self.subprocess.run(["xdotool", "keydown", base_key], check=False)
+            self._xdotool("keydown shift_l", f"keydown {base_key}")
         else:
-            self.subprocess.run(["xdotool", "keydown", xdotool_key], check=False)
+            self._xdotool(f"keydown {xdotool_key}")
 
     def _xdotool_keyup(self, key_str):
         xdotool_key = self._key_to_xdotool(key_str)
         if self._needs_shift(key_str):
             # For shift characters, release the base key first, then shift
             base_key = self._key_to_xdotool(self._get_base_key(key_str))
-            self.subprocess.run(["xdotool", "keyup", base_key], check=False)
-            self.subprocess.run(["xdotool", "keyup", "shift_l"], check=False)
+            self._xdotool(f"keyup {base_key}", "keyup shift_l")
         else:
-            self.subprocess.run(["xdotool", "keyup", xdotool_key], check=False)
+            self._xdotool(f"keyup {xdotool_key}")
 
     def _xdotool_tap(self, key_str):
         xdotool_key = self._key_to_xdotool(key_str)
         if self._needs_shift(key_str):
             # For shift characters, use shift+key combination
             base_key = self._key_to_xdotool(self._get_base_key(key_str))
-            self.subprocess.run(["xdotool", "key", f"shift_l+{base_key}"], check=False)
+            xdotool_key = f"shift_l+{base_key}"
+        if self._burst is not None:
+            self._burst.append(xdotool_key)
         else:
-            self.subprocess.run(["xdotool", "key", xdotool_key], check=False)
+            self._xdotool(f"key {xdotool_key}")
 
     def _get_base_key(self, key_str):
         """Get the base key for a shift character (e.g., '<' -> ',', '!' -> '1')"""
-        if len(key_str) != 1:
-            return key_str
-        shift_map = {
-            "<": ",",
-            ">": ".",
-            "?": "/",
-            '"': "'",
-            "{": "[",
-            "}": "]",
-            "_": "-",
-            "+": "=",
-            "|": "\\",
-            "!": "1",
-            "@": "2",
-            "#": "3",
-            "$": "4",
-            "%": "5",
-            "^": "6",
-            "&": "7",
-            "*": "8",
-            "(": "9",
-            ")": "0",
-            ":": ";",
-            "~": "`",
-        }
-        return shift_map.get(key_str, key_str)
+        return SHIFT_BASE.get(key_str, key_str)
 
     # ---------------- Windows ----------------
     def _win32_press(self, key_str):
@@ -216,77 +183,45 @@ class KeyboardController:
 
     def _key_to_vk(self, key_str):
         """Full VK mapping for Windows special keys and characters"""
-        vk_map = {
-            # Special keys
-            "enter": 0x0D,
-            "tab": 0x09,
-            "space": 0x20,
-            "esc": 0x1B,
-            "backspace": 0x08,
-            "delete": 0x2E,
-            "caps_lock": 0x14,
-            "ctrl": 0x11,
-            "ctrl_l": 0xA2,
-            "ctrl_r": 0xA3,
-            "alt": 0x12,
-            "alt_l": 0x12,
-            "alt_r": 0xA5,
-            "shift": 0x10,
-            "shift_l": 0xA0,
-            "shift_r": 0xA1,
-            "cmd": 0x5B,  # Left Windows key
-            "up": 0x26,
-            "down": 0x28,
-            "left": 0x25,
-            "right": 0x27,
-            # Special characters (OEM keys)
-            ",": 0xBC,  # VK_OEM_COMMA
-            ".": 0xBE,  # VK_OEM_PERIOD
-            "/": 0xBF,  # VK_OEM_2 (forward slash)
-            "'": 0xDE,  # VK_OEM_7 (apostrophe)
-            "[": 0xDB,  # VK_OEM_4 (left bracket)
-            "]": 0xDD,  # VK_OEM_6 (right bracket)
-            "-": 0xBD,  # VK_OEM_MINUS
-            "=": 0xBB,  # VK_OEM_PLUS
-            "\\": 0xDC,  # VK_OEM_5 (backslash)
-            # Shift variants (same physical keys, but we handle shift separately)
-            "<": 0xBC,  # Same as comma (shift+comma)
-            ">": 0xBE,  # Same as period (shift+period)
-            "?": 0xBF,  # Same as forward slash (shift+/)
-            '"': 0xDE,  # Same as apostrophe (shift+')
-            "{": 0xDB,  # Same as left bracket (shift+[)
-            "}": 0xDD,  # Same as right bracket (shift+])
-            "_": 0xBD,  # Same as minus (shift+-)
-            "+": 0xBB,  # Same as equals (shift+=)
-            "|": 0xDC,  # Same as backslash (shift+\)
-            # Additional shift characters
-            "!": 0x31,  # Same as 1 (shift+1)
-            "@": 0x32,  # Same as 2 (shift+2)
-            "#": 0x33,  # Same as 3 (shift+3)
-            "$": 0x34,  # Same as 4 (shift+4)
-            "%": 0x35,  # Same as 5 (shift+5)
-            "^": 0x36,  # Same as 6 (shift+6)
-            "&": 0x37,  # Same as 7 (shift+7)
-            "*": 0x38,  # Same as 8 (shift+8)
-            "(": 0x39,  # Same as 9 (shift+9)
-            ")": 0x30,  # Same as 0 (shift+0)
-            ":": 0xBA,  # VK_OEM_1 (semicolon, shift+;)
-            ";": 0xBA,  # VK_OEM_1 (semicolon)
-            "`": 0xC0,  # VK_OEM_3 (grave accent)
-            "~": 0xC0,  # VK_OEM_3 (grave accent, shift+`)
-        }
-        return vk_map.get(key_str, None)
+        return VK_CODES.get(key_str)
 
     # ---------------- Public API ----------------
+    @contextlib.contextmanager
+    def batch(self):
+        """Inject the key events made inside as one burst, in order.
+
+        XTest events are flushed to the X server once at the end. With
+        xdotool, consecutive taps become a single "key a b shift_l+1"
+        command; a press or release sends the taps before it first, so
+        modifiers stay where they were in the sequence. Where a burst
+        switches between XTest and xdotool (keysyms the layout has no
+        key for), the new backend waits until the other's events have
+        been delivered.
+        """
+        if self._burst is not None:
+            yield
+            return
+        self._burst = []
+        try:
+            with self.xtest.batch() if self.xtest else contextlib.nullcontext():
+                yield
+        finally:
+            self._flush_burst()
+            self._burst = None
+
     def press(self, key):
         key_str = self._normalize_key(key)
-        # vk = self._key_to_vk(key_str)
+        vk = self._key_to_vk(key_str)
+        self._flush_burst()
         
         # On Windows, always prefer win32api if we have a VK mapping (most reliable)
         if self.os_type == "windows" and self.use_win32 and vk:
             self._win32_press(key_str)
             return
         
+        if self.xtest and self._via_xtest(self._xtest_name(key_str), lambda name: self.xtest.key(name, True)):
+            return
+        
         # On Linux, prefer xdotool if available
         if self.use_xdotool:
             self._xdotool_keydown(key_str)
@@ -306,13 +241,17 @@ class KeyboardController:
 
     def release(self, key):
         key_str = self._normalize_key(key)
-        # vk = self._key_to_vk(key_str)
+        vk = self._key_to_vk(key_str)
+        self._flush_burst()
         
         # On Windows, always prefer win32api if we have a VK mapping (most reliable)
         if self.os_type == "windows" and self.use_win32 and vk:
             self._win32_release(key_str)
             return
         
+        if self.xtest and self._via_xtest(self._xtest_name(key_str), lambda name: self.xtest.key(name, False)):
+            return
+        
         # On Linux, prefer xdotool if available
         if self.use_xdotool:
             self._xdotool_keyup(key_str)
@@ -332,13 +271,16 @@ class KeyboardController:
 
     def tap(self, key):
         key_str = self._normalize_key(key)
-        # vk = self._key_to_vk(key_str)
+        vk = self._key_to_vk(key_str)
         
         # On Windows, always prefer win32api if we have a VK mapping (most reliable)
         if self.os_type == "windows" and self.use_win32 and vk:
             self._win32_tap(key_str)
             return
         
+        if self.xtest and self._via_xtest(self._xtest_name(key_str), self.xtest.tap):
+            return
+        
         # On Linux, prefer xdotool if available
         if self.use_xdotool:
             self._xdotool_tap(key_str)
@@ -372,36 +314,8 @@ class KeyboardController:
             key_str = str(key_str)
         key_lower = key_str.lower()
         
-        # Map of normalized key names to pynput Key objects
-        # This MUST include all special keys we want to support
-        special_keys = {
-            "ctrl": Key.ctrl,
-            "ctrl_l": Key.ctrl_l,
-            "ctrl_r": Key.ctrl_r,
-            "shift": Key.shift,
-            "shift_l": Key.shift_l,
-            "shift_r": Key.shift_r,
-            "alt": Key.alt,
-            "alt_l": Key.alt_l,
-            "alt_r": Key.alt_r,
-            "cmd": Key.cmd,
-            "cmd_l": Key.cmd_l,
-            "cmd_r": Key.cmd_r,
-            "tab": Key.tab,
-            "caps_lock": Key.caps_lock,
-            "backspace": Key.backspace,
-            "enter": Key.enter,
-            "space": Key.space,
-            "esc": Key.esc,
-            "up": Key.up,
-            "down": Key.down,
-            "left": Key.left,
-            "right": Key.right,
-            "delete": Key.delete,
-        }
-        
         # Try to get the Key object from the mapping first (most reliable)
-        pynput_key = special_keys.get(key_lower)
+        pynput_key = PYNPUT_KEYS.get(key_lower)
         if pynput_key is not None:
             return pynput_key
         
@@ -0,0 +1,194 @@
+"""
+Keymap - Numeric key codes for the wire and the per-backend key tables, built once at import
+"""
+
+# Hello value for "keys=" when key events may carry numeric codes
+KEYS_NUMERIC = "num"
+
+# Special keys by wire code: SPECIAL_KEYS[i] travels as -(i + 1). Append only, the order is protocol.
+SPECIAL_KEYS = (
+    "alt", "alt_l", "alt_r", "alt_gr", "backspace", "caps_lock", "cmd", "cmd_l", "cmd_r",
+    "ctrl", "ctrl_l", "ctrl_r", "delete", "down", "end", "enter", "esc",
+    "f1", "f2", "f3", "f4", "f5", "f6", "f7", "f8", "f9", "f10",
+    "f11", "f12", "f13", "f14", "f15", "f16", "f17", "f18", "f19", "f20",
+    "home", "left", "page_down", "page_up", "right", "shift", "shift_l", "shift_r",
+    "space", "tab", "up", "media_play_pause", "media_volume_mute", "media_volume_down",
+    "media_volume_up", "media_previous", "media_next", "insert", "menu", "num_lock",
+    "pause", "print_screen", "scroll_lock",
+)
+SPECIAL_CODES = {name: -(i + 1) for i, name in enumerate(SPECIAL_KEYS)}
+
+# pynput key names and characters -> xdotool key names
+XDOTOOL_NAMES = {
+    # Special keys
+    "backspace": "BackSpace",
+    "tab": "Tab",
+    "caps_lock": "Caps_Lock",
+    "cmd": "Super_L",  # Windows/Meta key
+    "cmd_l": "Super_L",
+    "cmd_r": "Super_R",
+    "ctrl": "Control_L",
+    "ctrl_l": "Control_L",
+    "ctrl_r": "Control_R",
+    "shift": "Shift_L",
+    "shift_l": "Shift_L",
+    "shift_r": "Shift_R",
+    "alt": "Alt_L",
+    "alt_l": "Alt_L",
+    "alt_r": "Alt_R",
+    "enter": "Return",
+    "space": "space",
+    "esc": "Escape",
+    "delete": "Delete",
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    # Special characters
+    ",": "comma",
+    ".": "period",
+    "/": "slash",
+    "'": "apostrophe",
+    "[": "bracketleft",
+    "]": "bracketright",
+    "-": "minus",
+    "=": "equal",
+    "\\": "backslash",
+    # Shift variants (xdotool handles these with shift modifier)
+    "<": "comma",  # Will need shift
+    ">": "period",  # Will need shift
+    "?": "slash",  # Will need shift
+    '"': "apostrophe",  # Will need shift
+    "{": "bracketleft",  # Will need shift
+    "}": "bracketright",  # Will need shift
+    "_": "minus",  # Will need shift
+    "+": "equal",  # Will need shift
+    "|": "backslash",  # Will need shift
+    "!": "exclam",  # or "1" with shift
+    "@": "at",  # or "2" with shift
+    "#": "numbersign",  # or "3" with shift
+    "$": "dollar",  # or "4" with shift
+    "%": "percent",  # or "5" with shift
+    "^": "asciicircum",  # or "6" with shift
+    "&": "ampersand",  # or "7" with shift
+    "*": "asterisk",  # or "8" with shift
+    "(": "parenleft",  # or "9" with shift
+    ")": "parenright",  # or "0" with shift
+    ":": "colon",  # or "semicolon" with shift
+    ";": "semicolon",
+    "`": "grave",
+    "~": "asciitilde",
+}
+
+# Shifted characters -> the unshifted key they are typed with (US layout)
+SHIFT_BASE = {
+    "<": ",",
+    ">": ".",
+    "?": "/",
+    '"': "'",
+    "{": "[",
+    "}": "]",
+    "_": "-",
+    "+": "=",
+    "|": "\\",
+    "!": "1",
+    "@": "2",
+    "#": "3",
+    "$": "4",
+    "%": "5",
+    "^": "6",
+    "&": "7",
+    "*": "8",
+    "(": "9",
+    ")": "0",
+    ":": ";",
+    "~": "`",
+}
+
+# pynput key names and characters -> Windows virtual-key codes
+VK_CODES = {
+    # Special keys
+    "enter": 0x0D,
+    "tab": 0x09,
+    "space": 0x20,
+    "esc": 0x1B,
+    "backspace": 0x08,
+    "delete": 0x2E,
+    "caps_lock": 0x14,
+    "ctrl": 0x11,
+    "ctrl_l": 0xA2,
+    "ctrl_r": 0xA3,
+    "alt": 0x12,
+    "alt_l": 0x12,
+    "alt_r": 0xA5,
+    "shift": 0x10,
+    "shift_l": 0xA0,
+    "shift_r": 0xA1,
+    "cmd": 0x5B,  # Left Windows key
+    "up": 0x26,
+    "down": 0x28,
+    "left": 0x25,
+    "right": 0x27,
+    # Special characters (OEM keys)
+    ",": 0xBC,  # VK_OEM_COMMA
+    ".": 0xBE,  # VK_OEM_PERIOD
+    "/": 0xBF,  # VK_OEM_2 (forward slash)
+    "'": 0xDE,  # VK_OEM_7 (apostrophe)
+    "[": 0xDB,  # VK_OEM_4 (left bracket)
+    "]": 0xDD,  # VK_OEM_6 (right bracket)
+    "-": 0xBD,  # VK_OEM_MINUS
+    "=": 0xBB,  # VK_OEM_PLUS
+    "\\": 0xDC,  # VK_OEM_5 (backslash)
+    # Shift variants (same physical keys, but we handle shift separately)
+    "<": 0xBC,  # Same as comma (shift+comma)
+    ">": 0xBE,  # Same as period (shift+period)
+    "?": 0xBF,  # Same as forward slash (shift+/)
+    '"': 0xDE,  # Same as apostrophe (shift+')
+    "{": 0xDB,  # Same as left bracket (shift+[)
+    "}": 0xDD,  # Same as right bracket (shift+])
+    "_": 0xBD,  # Same as minus (shift+-)
+    "+": 0xBB,  # Same as equals (shift+=)
+    "|": 0xDC,  # Same as backslash (shift+\)
+    # Additional shift characters
+    "!": 0x31,  # Same as 1 (shift+1)
+    "@": 0x32,  # Same as 2 (shift+2)
+    "#": 0x33,  # Same as 3 (shift+3)
+    "$": 0x34,  # Same as 4 (shift+4)
+    "%": 0x35,  # Same as 5 (shift+5)
+    "^": 0x36,  # Same as 6 (shift+6)
+    "&": 0x37,  # Same as 7 (shift+7)
+    "*": 0x38,  # Same as 8 (shift+8)
+    "(": 0x39,  # Same as 9 (shift+9)
+    ")": 0x30,  # Same as 0 (shift+0)
+    ":": 0xBA,  # VK_OEM_1 (semicolon, shift+;)
+    ";": 0xBA,  # VK_OEM_1 (semicolon)
+    "`": 0xC0,  # VK_OEM_3 (grave accent)
+    "~": 0xC0,  # VK_OEM_3 (grave accent, shift+`)
+}
+
+
+def encode(key):
+    """Wire code for a pynput key (or key name/character), or None if it has none"""
+    char = getattr(key, "char", None)
+    if char is not None:
+        key = char
+    elif hasattr(key, "name"):
+        key = key.name
+    if isinstance(key, str):
+        if len(key) == 1:
+            return ord(key)
+        return SPECIAL_CODES.get(key)
+    return None
+
+
+def decode(code):
+    """Character or special key name for a wire code; raises ValueError for unknown codes"""
+    if code >= 0:
+        return chr(code)
+    if -code > len(SPECIAL_KEYS):
+        raise ValueError(f"unknown key code {code}")
+    return SPECIAL_KEYS[-code - 1]
+
+
+def is_special(code):
+    return code < 0
@@ -1,8 +1,11 @@
 """
 Mouse Controller - Handles mouse input and position control
 """
+import contextlib
 import platform
 
+from controllers import xtest
+
 class MouseController:
     def __init__(self):
         self.os_type = platform.system().lower()
@@ -17,6 +20,8 @@ class MouseController:
                 self._win32api = win32api
             except ImportError:
                 pass
+        # In-process XTest injection on X11; pynput otherwise
+        self._xtest = xtest.injector() if self.os_type == "linux" else None
     
     @property
     def position(self):
@@ -31,22 +36,49 @@ class MouseController:
                 self._win32api.SetCursorPos(pos)
             except Exception:
                 self._controller.position = pos
+        elif self._xtest:
+            self._xtest.move(*pos)
         else:
             self._controller.position = pos
     
+    def _xtest_button(self, button):
+        """X button number of a pynput button (its value on X11), or None"""
+        number = getattr(button, "value", None)
+        return number if self._xtest and isinstance(number, int) else None
+    
     def press(self, button):
         """Press mouse button"""
-        self._controller.press(button)
+        number = self._xtest_button(button)
+        if number:
+            self._xtest.button(number, True)
+        else:
+            self._controller.press(button)
     
     def release(self, button):
         """Release mouse button"""
-        self._controller.release(button)
+        number = self._xtest_button(button)
+        if number:
+            self._xtest.button(number, False)
+        else:
+            self._controller.release(button)
     
     def click(self, button):
         """Click mouse button"""
-        self._controller.click(button)
+        if self._xtest_button(button):
+            with self.batch():
+                self.press(button)
+                self.release(button)
+        else:
+            self._controller.click(button)
     
     def scroll(self, dx, dy):
         """Scroll mouse"""
-        self._controller.scroll(dx, dy)
+        if self._xtest:
+            self._xtest.scroll(dx, dy)
+        else:
+            self._controller.scroll(dx, dy)
+    
+    def batch(self):
+        """Context in which injected events are flushed to the X server once, at the end"""
+        return self._xtest.batch() if self._xtest else contextlib.nullcontext()
 
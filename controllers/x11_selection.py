@@ -0,0 +1,511 @@
+"""
+X11 Selection - Owns and reads the CLIPBOARD selection in-process (ctypes, no xclip)
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import threading
+import time
+
+# Event types
+PropertyNotify = 28
+SelectionClear = 29
+SelectionRequest = 30
+SelectionNotify = 31
+
+PropertyNewValue = 0
+PropertyDelete = 1
+PropertyChangeMask = 1 << 22
+PropModeReplace = 0
+XA_ATOM = 4
+CurrentTime = 0
+AnyPropertyType = 0
+
+# How long a read waits for the selection owner to answer
+READ_TIMEOUT = 1.0
+
+# Payloads above this go out with the INCR protocol in pieces of this size
+INCR_CHUNK = 256 * 1024
+
+# X targets advertised for each clipboard format
+TEXT_TARGETS = ("UTF8_STRING", "text/plain;charset=utf-8", "text/plain", "STRING", "TEXT")
+FILE_TARGETS = ("text/uri-list", "x-special/gnome-copied-files")
+
+
+class _XSelectionRequestEvent(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_int), ("serial", ctypes.c_ulong), ("send_event", ctypes.c_int),
+                ("display", ctypes.c_void_p), ("owner", ctypes.c_ulong), ("requestor", ctypes.c_ulong),
+                ("selection", ctypes.c_ulong), ("target", ctypes.c_ulong), ("property", ctypes.c_ulong),
+                ("time", ctypes.c_ulong)]
+
+
+class _XSelectionEvent(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_int), ("serial", ctypes.c_ulong), ("send_event", ctypes.c_int),
+                ("display", ctypes.c_void_p), ("requestor", ctypes.c_ulong), ("selection", ctypes.c_ulong),
+                ("target", ctypes.c_ulong), ("property", ctypes.c_ulong), ("time", ctypes.c_ulong)]
+
+
+class _XPropertyEvent(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_int), ("serial", ctypes.c_ulong), ("send_event", ctypes.c_int),
+                ("display", ctypes.c_void_p), ("window", ctypes.c_ulong), ("atom", ctypes.c_ulong),
+                ("time", ctypes.c_ulong), ("state", ctypes.c_int)]
+
+
+class _XEvent(ctypes.Union):
+    _fields_ = [("type", ctypes.c_int), ("xselectionrequest", _XSelectionRequestEvent),
+                ("xselection", _XSelectionEvent), ("xproperty", _XPropertyEvent),
+                ("pad", ctypes.c_long * 24)]
+
+
+class _XErrorEvent(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_int), ("display", ctypes.c_void_p), ("resourceid", ctypes.c_ulong),
+                ("serial", ctypes.c_ulong), ("error_code", ctypes.c_ubyte), ("request_code", ctypes.c_ubyte),
+                ("minor_code", ctypes.c_ubyte)]
+
+
+_XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(_XErrorEvent))
+
+_x11 = None
+_displays = set()  # connections opened through open_display()
+_previous_handler = None
+
+
+@_XErrorHandler
+def _on_error(display, event):
+    """Log X errors on our connections instead of letting Xlib exit the process.
+
+    Requests on windows owned by other clients (a pasting application
+    that quits mid-transfer, say) fail with BadWindow at any time, and
+    Xlib's default handler calls exit(). Errors on other connections go
+    to the handler that was installed before ours.
+    """
+    if display in _displays or not _previous_handler:
+        ev = event.contents
+        print(f"[X11] Ignored X error {ev.error_code} (request {ev.request_code}) on resource {ev.resourceid:#x}")
+        return 0
+    return _previous_handler(display, event)
+
+
+def load_xlib():
+    """Load and prototype libX11 once; returns None when it is not installed"""
+    global _x11
+    if _x11 is None:
+        path = ctypes.util.find_library("X11")
+        if not path:
+            _x11 = False
+            return None
+        x11 = ctypes.CDLL(path)
+        vp, ul, i = ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int
+        x11.XOpenDisplay.restype = vp
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XCloseDisplay.argtypes = [vp]
+        x11.XDefaultRootWindow.restype = ul
+        x11.XDefaultRootWindow.argtypes = [vp]
+        x11.XCreateSimpleWindow.restype = ul
+        x11.XCreateSimpleWindow.argtypes = [vp, ul, i, i, ctypes.c_uint, ctypes.c_uint, ctypes.c_uint, ul, ul]
+        x11.XInternAtom.restype = ul
+        x11.XInternAtom.argtypes = [vp, ctypes.c_char_p, i]
+        x11.XGetAtomName.restype = ctypes.c_void_p
+        x11.XGetAtomName.argtypes = [vp, ul]
+        x11.XFree.argtypes = [vp]
+        x11.XSetSelectionOwner.argtypes = [vp, ul, ul, ul]
+        x11.XGetSelectionOwner.restype = ul
+        x11.XGetSelectionOwner.argtypes = [vp, ul]
+        x11.XConvertSelection.argtypes = [vp, ul, ul, ul, ul, ul]
+        x11.XChangeProperty.argtypes = [vp, ul, ul, ul, i, i, ctypes.c_void_p, i]
+        x11.XGetWindowProperty.argtypes = [vp, ul, ul, ctypes.c_long, ctypes.c_long, i, ul,
+                                           ctypes.POINTER(ul), ctypes.POINTER(i), ctypes.POINTER(ul),
+                                           ctypes.POINTER(ul), ctypes.POINTER(ctypes.c_void_p)]
+        x11.XDeleteProperty.argtypes = [vp, ul, ul]
+        x11.XSelectInput.argtypes = [vp, ul, ctypes.c_long]
+        x11.XSendEvent.argtypes = [vp, ul, i, ctypes.c_long, ctypes.c_void_p]
+        x11.XNextEvent.argtypes = [vp, ctypes.c_void_p]
+        x11.XPending.argtypes = [vp]
+        x11.XFlush.argtypes = [vp]
+        x11.XConnectionNumber.argtypes = [vp]
+        x11.XDestroyWindow.argtypes = [vp, ul]
+        x11.XSync.argtypes = [vp, i]
+        # Keysym lookups for XTest injection
+        x11.XStringToKeysym.restype = ul
+        x11.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        x11.XKeysymToKeycode.restype = ctypes.c_ubyte
+        x11.XKeysymToKeycode.argtypes = [vp, ul]
+        x11.XkbKeycodeToKeysym.restype = ul
+        x11.XkbKeycodeToKeysym.argtypes = [vp, ctypes.c_ubyte, i, i]
+        # Keyboard grab for KeyboardCapture
+        x11.XGrabKeyboard.argtypes = [vp, ul, i, i, i, ul]
+        x11.XUngrabKeyboard.argtypes = [vp, ul]
+        x11.XSetErrorHandler.restype = _XErrorHandler
+        x11.XSetErrorHandler.argtypes = [_XErrorHandler]
+        _x11 = x11
+    return _x11 or None
+
+
+def open_display():
+    """A new display connection whose X errors are logged rather than fatal; None if it cannot be opened"""
+    global _previous_handler
+    x11 = load_xlib()
+    if x11 is None:
+        return None
+    display = x11.XOpenDisplay(None)
+    if not display:
+        return None
+    if not _displays and _previous_handler is None:
+        _previous_handler = x11.XSetErrorHandler(_on_error)
+    _displays.add(display)
+    return display
+
+
+def close_display(display):
+    _displays.discard(display)
+    load_xlib().XCloseDisplay(display)
+
+
+def available():
+    return bool(os.environ.get('DISPLAY')) and load_xlib() is not None
+
+
+class X11SelectionOwner:
+    """Takes ownership of CLIPBOARD and answers paste requests from a callback.
+
+    offer(targets, fetch) makes us the owner without having the data yet;
+    fetch(target_name) is only called when an application actually
+    pastes, and its result is kept for later pastes of the same offer.
+    All Xlib calls happen on the owner's own thread. fetch() may pull
+    over the network for a while, so it runs on a thread of its own and
+    the SelectionNotify goes out when it returns; requests arriving in
+    the meantime for the same target wait for that one fetch.
+    """
+
+    def __init__(self, on_lost=None):
+        self.x11 = load_xlib()
+        if self.x11 is None:
+            raise OSError("libX11 not found")
+        self.display = open_display()
+        if not self.display:
+            raise OSError("cannot open display")
+        self.on_lost = on_lost
+        root = self.x11.XDefaultRootWindow(self.display)
+        self.window = self.x11.XCreateSimpleWindow(self.display, root, 0, 0, 1, 1, 0, 0, 0)
+        self.clipboard = self.atom("CLIPBOARD")
+        self.targets_atom = self.atom("TARGETS")
+        self.incr_atom = self.atom("INCR")
+        self._fd = self.x11.XConnectionNumber(self.display)
+        self._wake_r, self._wake_w = os.pipe()
+        self._commands = queue.Queue()
+        self._targets = {}   # atom -> target name
+        self._fetch = None
+        self._offer = 0      # bumped for every new offer, so late fetches are not cached for the wrong one
+        self._cache = {}     # target name -> bytes
+        self._waiting = {}   # (offer, target name) -> requests waiting on its fetch
+        self._incr = {}      # (requestor, property) -> [data, offset, type atom]
+        self.owned = False
+        self._running = True
+        self.x11.XFlush(self.display)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def atom(self, name):
+        return self.x11.XInternAtom(self.display, name.encode(), 0)
+
+    def atom_name(self, atom):
+        ptr = self.x11.XGetAtomName(self.display, atom)
+        if not ptr:
+            return None
+        try:
+            return ctypes.string_at(ptr).decode('latin-1')
+        finally:
+            self.x11.XFree(ptr)
+
+    # Called from any thread
+    def offer(self, targets, fetch, wait=False):
+        """Become the CLIPBOARD owner for the given target names"""
+        done = self._call(self._take_ownership, tuple(targets), fetch)
+        if wait:
+            done.wait(READ_TIMEOUT)
+
+    def disown(self):
+        self._call(self._release)
+
+    def close(self):
+        self._running = False
+        self._call(None)
+
+    def _call(self, func, *args):
+        done = threading.Event()
+        self._commands.put((func, args, done))
+        os.write(self._wake_w, b"x")
+        return done
+
+    # Owner thread
+    def _take_ownership(self, targets, fetch):
+        self._targets = {self.atom(name): name for name in targets}
+        self._fetch = fetch
+        self._offer += 1
+        self._cache = {}
+        self.x11.XSetSelectionOwner(self.display, self.clipboard, self.window, CurrentTime)
+        self.owned = self.x11.XGetSelectionOwner(self.display, self.clipboard) == self.window
+        self.x11.XFlush(self.display)
+
+    def _release(self):
+        if self.owned:
+            self.x11.XSetSelectionOwner(self.display, self.clipboard, 0, CurrentTime)
+            self.x11.XFlush(self.display)
+        self._lost()
+
+    def _lost(self):
+        self.owned = False
+        self._fetch = None
+        self._offer += 1
+        self._cache = {}
+
+    def _loop(self):
+        event = _XEvent()
+        try:
+            while self._running:
+                while self.x11.XPending(self.display):
+                    self.x11.XNextEvent(self.display, ctypes.byref(event))
+                    self._dispatch(event)
+                readable, _, _ = select.select([self._fd, self._wake_r], [], [], 1.0)
+                if self._wake_r in readable:
+                    os.read(self._wake_r, 4096)
+                    while not self._commands.empty():
+                        func, args, done = self._commands.get_nowait()
+                        if func:
+                            func(*args)
+                        done.set()
+        finally:
+            self.x11.XDestroyWindow(self.display, self.window)
+            close_display(self.display)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+    def _dispatch(self, event):
+        if event.type == SelectionRequest:
+            self._on_request(event.xselectionrequest)
+        elif event.type == SelectionClear:
+            was_owned = self.owned
+            self._lost()
+            if was_owned and self.on_lost:
+                self.on_lost()
+        elif event.type == PropertyNotify:
+            ev = event.xproperty
+            if ev.state == PropertyDelete and (ev.window, ev.atom) in self._incr:
+                self._send_incr_chunk(ev.window, ev.atom)
+
+    def _on_request(self, req):
+        # Copied out of the reused event, since the answer may have to wait for a fetch;
+        # obsolete clients pass no property and get the target as one
+        request = (req.requestor, req.selection, req.target, req.property or req.target, req.time)
+        if req.target == self.targets_atom and self.owned:
+            atoms = [self.targets_atom] + list(self._targets)
+            array = (ctypes.c_ulong * len(atoms))(*atoms)
+            self.x11.XChangeProperty(self.display, req.requestor, request[3], XA_ATOM, 32, PropModeReplace,
+                                     array, len(atoms))
+            self._notify(request, True)
+            return
+        name = self._targets.get(req.target) if self.owned else None
+        if name is not None and name not in self._cache and self._fetch is not None:
+            self._fetch_async(name, request)
+            return
+        self._answer(request, self._cache.get(name))
+
+    def _fetch_async(self, name, request):
+        key = (self._offer, name)
+        waiting = self._waiting.setdefault(key, [])
+        waiting.append(request)
+        if len(waiting) > 1:
+            return # Already being fetched
+        fetch = self._fetch
+
+        def run():
+            try:
+                data = fetch(name)
+            except Exception as e:
+                print(f"[Clipboard] Fetching {name} failed: {e}")
+                data = None
+            if self._running:
+                try:
+                    self._call(self._fetched, key, None if data is None else bytes(data))
+                except OSError:
+                    pass # Closed meanwhile
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fetched(self, key, data):
+        if data is not None and key[0] == self._offer:
+            self._cache[key[1]] = data
+        # Requests made for an earlier offer still get the data they asked for
+        for request in self._waiting.pop(key, ()):
+            self._answer(request, data)
+
+    def _answer(self, request, data):
+        requestor, _, target, prop, _ = request
+        if data is not None:
+            if len(data) > INCR_CHUNK:
+                self._incr[(requestor, prop)] = [data, 0, target]
+                self.x11.XSelectInput(self.display, requestor, PropertyChangeMask)
+                size = (ctypes.c_ulong * 1)(len(data))
+                self.x11.XChangeProperty(self.display, requestor, prop, self.incr_atom, 32,
+                                         PropModeReplace, size, 1)
+            else:
+                self.x11.XChangeProperty(self.display, requestor, prop, target, 8, PropModeReplace,
+                                         data, len(data))
+        self._notify(request, data is not None)
+
+    def _notify(self, request, ok):
+        requestor, selection, target, prop, when = request
+        reply = _XEvent()
+        reply.xselection.type = SelectionNotify
+        reply.xselection.requestor = requestor
+        reply.xselection.selection = selection
+        reply.xselection.target = target
+        reply.xselection.property = prop if ok else 0
+        reply.xselection.time = when
+        self.x11.XSendEvent(self.display, requestor, 0, 0, ctypes.byref(reply))
+        self.x11.XFlush(self.display)
+
+    def _send_incr_chunk(self, requestor, prop):
+        state = self._incr[(requestor, prop)]
+        data, offset, target = state
+        chunk = data[offset:offset + INCR_CHUNK]
+        # A zero-length write tells the requestor the transfer is complete
+        self.x11.XChangeProperty(self.display, requestor, prop, target, 8, PropModeReplace, chunk, len(chunk))
+        if chunk:
+            state[1] = offset + len(chunk)
+        else:
+            del self._incr[(requestor, prop)]
+            self.x11.XSelectInput(self.display, requestor, 0)
+        self.x11.XFlush(self.display)
+
+
+class X11SelectionReader:
+    """Reads CLIPBOARD over a private display connection.
+
+    targets() asks the owner for TARGETS once; read(target) converts the
+    selection to that single target, following INCR for large payloads.
+    Not thread safe; ClipboardController calls it under its own lock.
+    """
+
+    def __init__(self):
+        self.x11 = load_xlib()
+        if self.x11 is None:
+            raise OSError("libX11 not found")
+        self.display = open_display()
+        if not self.display:
+            raise OSError("cannot open display")
+        root = self.x11.XDefaultRootWindow(self.display)
+        self.window = self.x11.XCreateSimpleWindow(self.display, root, 0, 0, 1, 1, 0, 0, 0)
+        # PropertyNotify drives the INCR transfer
+        self.x11.XSelectInput(self.display, self.window, PropertyChangeMask)
+        self.clipboard = self.atom("CLIPBOARD")
+        self.targets_atom = self.atom("TARGETS")
+        self.incr_atom = self.atom("INCR")
+        self.property = self.atom("PORTAL_SELECTION")
+        self._fd = self.x11.XConnectionNumber(self.display)
+        self._event = _XEvent()
+        self._atoms = {}
+
+    def atom(self, name):
+        return self.x11.XInternAtom(self.display, name.encode(), 0)
+
+    def owned(self):
+        return self.x11.XGetSelectionOwner(self.display, self.clipboard) != 0
+
+    def targets(self):
+        """Target names the current owner offers; empty when nobody owns CLIPBOARD"""
+        if not self.owned():
+            return []
+        result = self._convert(self.targets_atom)
+        if result is None:
+            return []
+        _, data = result
+        names = []
+        for atom in data:
+            if atom not in self._atoms:
+                ptr = self.x11.XGetAtomName(self.display, atom)
+                if not ptr:
+                    continue
+                self._atoms[atom] = ctypes.string_at(ptr).decode('latin-1')
+                self.x11.XFree(ptr)
+            names.append(self._atoms[atom])
+        return names
+
+    def read(self, target):
+        """Selection contents as bytes, or None if the owner refused"""
+        result = self._convert(self.atom(target))
+        return None if result is None else result[1]
+
+    def close(self):
+        if self.display:
+            self.x11.XDestroyWindow(self.display, self.window)
+            close_display(self.display)
+            self.display = None
+
+    def _convert(self, target_atom):
+        self.x11.XDeleteProperty(self.display, self.window, self.property)
+        self.x11.XConvertSelection(self.display, self.clipboard, target_atom, self.property, self.window,
+                                   CurrentTime)
+        self.x11.XFlush(self.display)
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            event = self._next_event(deadline)
+            if event is None:
+                return None
+            # A late answer to an earlier, timed-out request names a different target
+            if event.type == SelectionNotify and event.xselection.requestor == self.window \
+                    and event.xselection.target == target_atom:
+                break
+        if not event.xselection.property:
+            return None
+        prop_type, data = self._get_property()
+        if prop_type != self.incr_atom:
+            return prop_type, data
+        return self._read_incr()
+
+    def _read_incr(self):
+        """Collect an INCR transfer; each property deletion asks the owner for the next piece"""
+        chunks = []
+        prop_type = AnyPropertyType
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            event = self._next_event(deadline)
+            if event is None:
+                return None
+            if event.type != PropertyNotify or event.xproperty.state != PropertyNewValue \
+                    or event.xproperty.atom != self.property:
+                continue
+            prop_type, data = self._get_property()
+            if not data:
+                return prop_type, b"".join(chunks)
+            chunks.append(data)
+            deadline = time.monotonic() + READ_TIMEOUT
+
+    def _get_property(self):
+        """Read and delete our property; returns (type atom, bytes or list of atoms)"""
+        actual_type, actual_format = ctypes.c_ulong(), ctypes.c_int()
+        nitems, bytes_after = ctypes.c_ulong(), ctypes.c_ulong()
+        ptr = ctypes.c_void_p()
+        self.x11.XGetWindowProperty(self.display, self.window, self.property, 0, 0x1FFFFFFF, 1,
+                                    AnyPropertyType, ctypes.byref(actual_type), ctypes.byref(actual_format),
+                                    ctypes.byref(nitems), ctypes.byref(bytes_after), ctypes.byref(ptr))
+        if not ptr.value:
+            return actual_type.value, b""
+        try:
+            if actual_format.value == 32:
+                # Xlib hands 32-bit items back as C longs
+                return actual_type.value, list((ctypes.c_ulong * nitems.value).from_address(ptr.value))
+            size = nitems.value * (actual_format.value // 8)
+            return actual_type.value, ctypes.string_at(ptr.value, size)
+        finally:
+            self.x11.XFree(ptr)
+
+    def _next_event(self, deadline):
+        while not self.x11.XPending(self.display):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            select.select([self._fd], [], [], remaining)
+        self.x11.XNextEvent(self.display, ctypes.byref(self._event))
+        return self._event
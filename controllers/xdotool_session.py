@@ -0,0 +1,185 @@
+"""
+Xdotool Session - One long-lived `xdotool -` process fed commands over stdin
+"""
+import collections
+import queue
+import subprocess
+import threading
+import time
+
+# A session that dies this many times within RESPAWN_WINDOW seconds is given up on
+MAX_RESPAWNS = 5
+RESPAWN_WINDOW = 10.0
+# The first process must answer a sync() within this long, or xdotool is taken to run scripts only at EOF
+PROBE_TIMEOUT = 2.0
+
+
+class XdotoolSession:
+    """Runs xdotool commands in order through a single `xdotool -` script process.
+
+    xdotool executes a script from stdin line by line as it arrives, so
+    a key event costs a pipe write instead of a fork and exec. send()
+    only queues the lines; a writer thread drains the queue, writing
+    everything pending in one go, and respawns the process if it has
+    exited. After MAX_RESPAWNS deaths in RESPAWN_WINDOW the session is
+    marked failed and send() returns False, so callers can fall back to
+    one process per command. A reader thread per process matches the
+    replies on stdout to sync() markers, so the writer never waits on
+    xdotool's output. The first process is probed with a sync(); an
+    xdotool that holds the script until EOF fails the probe, and the
+    session is given up the same way. Lines still queued when the
+    session fails are run one process each, so none are lost.
+    """
+
+    def __init__(self):
+        self.failed = False
+        self._process = None
+        self._deaths = []
+        self._closed = False
+        self._probed = False
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def send(self, *commands):
+        """Queue commands such as "keydown shift_l"; False if the session is unusable"""
+        if self.failed:
+            return False
+        self._queue.put("".join(command + "\n" for command in commands))
+        return True
+
+    def sync(self, timeout=5.0):
+        """Wait until every queued command has run; True unless the session failed or timed out.
+
+        A getmouselocation marker goes through the queue, and its output
+        line comes back only after xdotool has executed everything before it.
+        The event is queued ahead of the command, so the writer registers
+        it before the reply can arrive; replies are matched oldest first.
+        """
+        if self.failed:
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        self.send("getmouselocation")
+        return done.wait(timeout) and not self.failed
+
+    def _spawn(self):
+        try:
+            self._process = subprocess.Popen(["xdotool", "-"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             bufsize=0)
+        except OSError as e:
+            print(f"[Keyboard] Cannot start xdotool: {e}")
+            self.failed = True
+            self._process = None
+            return None
+        # sync() events whose getmouselocation went to this process, oldest first
+        self._process.markers = collections.deque()
+        threading.Thread(target=self._reader, args=(self._process,), daemon=True).start()
+        if not self._probed:
+            self._probed = True
+            threading.Thread(target=self._probe, daemon=True).start()
+        return self._process
+
+    def _probe(self):
+        if self.sync(PROBE_TIMEOUT) or self.failed:
+            return
+        print("[Keyboard] xdotool does not answer script commands as they arrive; using one process per key")
+        with self._lock:
+            self.failed = True
+            self._close_process()  # At EOF it runs whatever it was holding, in order
+
+    def _reader(self, process):
+        for _ in iter(process.stdout.readline, b""):
+            try:
+                process.markers.popleft().set()
+            except IndexError:
+                pass
+
+    def _died(self):
+        """Forget a dead process; True if it may be respawned"""
+        # sync() calls still waiting on it time out and report False
+        self._close_process()
+        now = time.monotonic()
+        self._deaths = [t for t in self._deaths if now - t < RESPAWN_WINDOW] + [now]
+        if len(self._deaths) >= MAX_RESPAWNS:
+            print("[Keyboard] xdotool session keeps exiting; using one process per key")
+            self.failed = True
+        return not self.failed
+
+    def _write(self, data, markers=()):
+        """Write to the live process, registering sync() markers with it first so no reply is missed"""
+        if self._write_live(data, markers) or self._closed:
+            return
+        for line in data.splitlines():
+            if line != "getmouselocation":
+                subprocess.run(["xdotool", *line.split()], check=False)
+
+    def _write_live(self, data, markers):
+        while not self.failed:
+            with self._lock:
+                process = self._process
+                if process is None or process.poll() is not None:
+                    if process is not None and not self._died():
+                        return False
+                    process = self._spawn()
+                    if process is None:
+                        return False
+                process.markers.extend(markers)
+                try:
+                    if data:
+                        process.stdin.write(data.encode())
+                    return True
+                except (OSError, ValueError):
+                    # Exited between the poll and the write; the lines and markers go to the next process
+                    for _ in markers:
+                        process.markers.pop()
+                    if not self._died():
+                        return False
+        return False
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # Coalesce whatever else is already queued into the same write
+            lines = []
+            markers = []
+            while True:
+                if isinstance(item, threading.Event):
+                    # Lines queued before this marker go out first, with the markers they answer
+                    if lines:
+                        self._write("".join(lines), markers)
+                        lines, markers = [], []
+                    markers.append(item)
+                elif item is None:
+                    self._write("".join(lines), markers)
+                    return
+                else:
+                    lines.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if lines or markers:
+                self._write("".join(lines), markers)
+
+    def _close_process(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def close(self):
+        self._closed = True
+        self.failed = True  # Nothing is queued or respawned from here on
+        self._queue.put(None)
+        with self._lock:
+            self._close_process()
@@ -0,0 +1,181 @@
+"""
+XTest - Injects keyboard and pointer events in-process through libXtst (ctypes, no xdotool or pynput)
+"""
+import contextlib
+import ctypes
+import ctypes.util
+import threading
+
+from controllers import x11_selection
+
+# Scroll buttons: up, down, left, right
+SCROLL_UP, SCROLL_DOWN, SCROLL_LEFT, SCROLL_RIGHT = 4, 5, 6, 7
+
+_xtst = None
+_injector = None
+_injector_lock = threading.Lock()
+
+
+def load_xtst():
+    """Load and prototype libXtst once; returns None when it is not installed"""
+    global _xtst
+    if _xtst is None:
+        path = ctypes.util.find_library("Xtst")
+        if not path:
+            _xtst = False
+            return None
+        xtst = ctypes.CDLL(path)
+        vp, ui, i, ul = ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong
+        xtst.XTestQueryExtension.argtypes = [vp, ctypes.POINTER(i), ctypes.POINTER(i), ctypes.POINTER(i),
+                                             ctypes.POINTER(i)]
+        xtst.XTestFakeKeyEvent.argtypes = [vp, ui, i, ul]
+        xtst.XTestFakeButtonEvent.argtypes = [vp, ui, i, ul]
+        xtst.XTestFakeMotionEvent.argtypes = [vp, i, i, i, ul]
+        _xtst = xtst
+    return _xtst or None
+
+
+def injector():
+    """The shared XTestInjector, or None without an X display, libX11 or libXtst"""
+    global _injector
+    with _injector_lock:
+        if _injector is None:
+            try:
+                _injector = XTestInjector() if x11_selection.available() else False
+            except OSError as e:
+                print(f"[XTest] Unavailable: {e}")
+                _injector = False
+        return _injector or None
+
+
+class XTestInjector:
+    """Fake key, button and motion events on a private display connection.
+
+    Keysym names (or single characters) are resolved to a keycode and
+    shift level once and cached. Every call queues its requests in the
+    Xlib output buffer and flushes once; inside batch() the flush is
+    left to the end of the batch. Keysyms with no keycode in the current
+    layout are reported as unsupported so the caller can fall back.
+    Calls are serialized, so the mouse and keyboard threads can share it.
+    """
+
+    def __init__(self):
+        self._x11 = x11_selection.load_xlib()
+        self._xtst = load_xtst()
+        if self._x11 is None or self._xtst is None:
+            raise OSError("libX11 or libXtst not found")
+        x11 = self._x11
+        self._display = x11_selection.open_display()
+        if not self._display:
+            raise OSError("cannot open display")
+        n = ctypes.c_int()
+        if not self._xtst.XTestQueryExtension(self._display, ctypes.byref(n), ctypes.byref(n), ctypes.byref(n),
+                                              ctypes.byref(n)):
+            x11_selection.close_display(self._display)
+            raise OSError("XTEST extension missing")
+        self._lock = threading.RLock()
+        self._batch = 0
+        self._codes = {}  # keysym name -> (keycode, needs shift) or None
+        self._down = set()  # keycodes we hold down
+        self._auto_shift = set()  # keycodes whose shift we pressed ourselves
+        if self._lookup("Shift_L") is None:
+            x11_selection.close_display(self._display)
+            raise OSError("no keycode for Shift_L")
+        self._shift = self._lookup("Shift_L")[0]
+        self._shift_codes = {self._shift, (self._lookup("Shift_R") or (None,))[0]}
+
+    def _keysym(self, name):
+        if len(name) == 1:
+            # Latin-1 keysyms equal the code point; everything else lives in the Unicode range
+            code = ord(name)
+            return code if 0x20 <= code <= 0x7e or 0xa0 <= code <= 0xff else 0x01000000 + code
+        for variant in (name, name.capitalize(), "_".join(p.capitalize() for p in name.split("_"))):
+            keysym = self._x11.XStringToKeysym(variant.encode())
+            if keysym:
+                return keysym
+        return 0
+
+    def _lookup(self, name):
+        if name in self._codes:
+            return self._codes[name]
+        result = None
+        keysym = self._keysym(name)
+        keycode = self._x11.XKeysymToKeycode(self._display, keysym) if keysym else 0
+        if keycode:
+            if self._x11.XkbKeycodeToKeysym(self._display, keycode, 0, 0) == keysym:
+                result = (keycode, False)
+            elif self._x11.XkbKeycodeToKeysym(self._display, keycode, 0, 1) == keysym:
+                result = (keycode, True)
+        self._codes[name] = result
+        return result
+
+    def supports(self, name):
+        with self._lock:
+            return self._lookup(name) is not None
+
+    def key(self, name, down):
+        """Press or release the key for a keysym name or character; False if the layout has none"""
+        with self._lock:
+            code = self._lookup(name)
+            if code is None:
+                return False
+            keycode, shifted = code
+            fake = self._xtst.XTestFakeKeyEvent
+            if down:
+                if shifted and not self._down & self._shift_codes:
+                    fake(self._display, self._shift, 1, 0)
+                    self._auto_shift.add(keycode)
+                fake(self._display, keycode, 1, 0)
+                self._down.add(keycode)
+            else:
+                fake(self._display, keycode, 0, 0)
+                self._down.discard(keycode)
+                if keycode in self._auto_shift:
+                    self._auto_shift.discard(keycode)
+                    fake(self._display, self._shift, 0, 0)
+            self._flush()
+            return True
+
+    def tap(self, name):
+        with self.batch():
+            return self.key(name, True) and self.key(name, False)
+
+    def move(self, x, y):
+        with self._lock:
+            self._xtst.XTestFakeMotionEvent(self._display, -1, int(x), int(y), 0)
+            self._flush()
+
+    def button(self, number, down):
+        with self._lock:
+            self._xtst.XTestFakeButtonEvent(self._display, number, 1 if down else 0, 0)
+            self._flush()
+
+    def scroll(self, dx, dy):
+        """One button click per scroll step, as X reports wheel motion"""
+        with self.batch():
+            for number, steps in ((SCROLL_UP if dy > 0 else SCROLL_DOWN, abs(int(dy))),
+                                  (SCROLL_RIGHT if dx > 0 else SCROLL_LEFT, abs(int(dx)))):
+                for _ in range(steps):
+                    self.button(number, True)
+                    self.button(number, False)
+
+    def sync(self):
+        """Wait until the X server has processed everything sent so far"""
+        with self._lock:
+            self._x11.XSync(self._display, 0)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Flush once at the end instead of after every event"""
+        with self._lock:
+            self._batch += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch -= 1
+                self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            self._x11.XFlush(self._display)
@@ -5,6 +5,7 @@ import tkinter as tk
 from gui.main_window import MainWindow
 from utils.config import app_config
 import threading
+import multiprocessing
 import subprocess
 import time
 import sys
@@ -123,6 +124,9 @@ class PortalApp:
 
 
 if __name__ == "__main__":
+    # File transfer worker processes start from this executable in frozen builds
+    multiprocessing.freeze_support()
+
     # Configure logging early and consistently for both parent and child roles
     try:
         base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.getcwd()
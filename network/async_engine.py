@@ -0,0 +1,376 @@
+"""
+Async Engine - Runs all ShareManager socket I/O on a single asyncio event loop
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import socket
+import threading
+
+from utils.config import app_config
+from network.protocol import PROTO_JSON, PROTO_BINARY, HELLO_TIMEOUT, FrameDecoder, encode_hello, decode_hello
+from network.stream_decoder import LineDecoder
+
+STREAM_LIMIT = 1 << 30  # clipboard and file lines can be very large
+CHUNK_SIZE = 65536      # bytes per read on the line-based connections
+QUEUE_SIZE = 1024       # pending messages per latency-sensitive connection
+BULK_QUEUE_SIZE = 64    # pending payloads on the tertiary connection
+
+
+class StreamSender:
+    """Socket-like send endpoint backed by a bounded asyncio queue.
+
+    sendall() may be called from any thread. A slot is claimed for every
+    message before it is handed to the loop with call_soon_threadsafe, so
+    while there is room the caller never waits, and when the queue is
+    full the caller blocks until the pump has written something. Nothing
+    is ever dropped: the connection is an ordered byte stream, and a lost
+    key release or payload would leave the peer stuck or out of step. The
+    loop thread itself cannot wait, so if it finds the queue full the
+    connection is closed instead.
+    """
+
+    def __init__(self, engine, writer, name, maxsize=QUEUE_SIZE):
+        self.engine = engine
+        self.writer = writer
+        self.name = name
+        self.queue = asyncio.Queue()  # bounded by _slots
+        self.closed = False
+        self._slots = threading.Semaphore(maxsize)
+        self._timeout = None
+
+    def __repr__(self):
+        return f"<StreamSender {self.name}>"
+
+    def sendall(self, data):
+        if self.closed:
+            raise ConnectionError(f"{self.name} connection closed")
+        data = bytes(data)
+        if self.engine.in_loop():
+            if not self._slots.acquire(blocking=False):
+                logging.error(f"[Async] {self.name} send queue full on the event loop, closing the connection")
+                self.close()
+                raise ConnectionError(f"{self.name} send queue full")
+            self.queue.put_nowait(data)
+            return
+        while not self._slots.acquire(timeout=1.0):
+            if self.closed:
+                raise ConnectionError(f"{self.name} connection closed")
+        self.engine.loop.call_soon_threadsafe(self.queue.put_nowait, data)
+
+    async def pump(self):
+        """Write queued messages, coalescing everything already waiting into one drain"""
+        try:
+            while True:
+                data = await self.queue.get()
+                self.writer.write(data)
+                self._slots.release()
+                while not self.queue.empty():
+                    self.writer.write(self.queue.get_nowait())
+                    self._slots.release()
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f"[Async] {self.name} send failed: {e}")
+        finally:
+            self.closed = True
+
+    # Socket compatibility
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self):
+        return self._timeout
+
+    def setsockopt(self, *args):
+        pass
+
+    def shutdown(self, how):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.engine.loop.call_soon_threadsafe(self.writer.close)
+
+
+class AsyncEngine:
+    """Alternative to the threaded networking in ShareManager.
+
+    Accepting, reading and writing for all three connections happen on
+    one event loop thread. Blocking work (key injection, clipboard
+    writes, file saving) runs on two single-worker executors so the loop
+    stays responsive while each stream is still handled in order. The
+    engine does not multiplex; it declines mux in the handshake and the
+    peer uses the three ports.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.loop = asyncio.new_event_loop()
+        self.inject_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="portal-inject")
+        self.bulk_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="portal-bulk")
+        self._thread = None
+        self._loop_ident = None
+        self._servers = []
+        self._senders = []
+        self._tasks = set()
+
+    # Lifecycle
+    def start(self):
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        self._loop_ident = threading.get_ident()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop(self):
+        return threading.get_ident() == self._loop_ident
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def start_server(self):
+        self.submit(self._serve())
+
+    def start_client(self):
+        self.submit(self._connect())
+
+    def stop(self):
+        """Close every server, connection and task, then stop the loop"""
+        if not self.loop.is_running():
+            return
+        if self.in_loop():
+            self._spawn(self._shutdown())
+            return
+        try:
+            self.submit(self._shutdown()).result(timeout=2.0)
+        except Exception as e:
+            print(f"[Async] Shutdown error: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        self.inject_executor.shutdown(wait=False)
+        self.bulk_executor.shutdown(wait=False)
+
+    async def _shutdown(self):
+        for server in self._servers:
+            server.close()
+        for sender in self._senders:
+            sender.closed = True
+            sender.writer.close()
+        current = asyncio.current_task()
+        tasks = [t for t in self._tasks if t is not current and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _sender(self, writer, name, maxsize=QUEUE_SIZE):
+        sender = StreamSender(self, writer, name, maxsize)
+        self._senders.append(sender)
+        self._spawn(sender.pump())
+        return sender
+
+    @staticmethod
+    def _nodelay(writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    # Readers
+    async def _read_lines(self, reader, handler, executor, batch=contextlib.nullcontext):
+        """Call handler(line, decoder) for every line, in order, on an executor.
+
+        Lines are split on the executor as well, so raw payloads a handler
+        routes elsewhere with decoder.expect_raw() (file chunks) are
+        written out without blocking the loop. The lines of one read are
+        handled inside batch(), so their side effects can be applied together.
+        """
+        decoder = LineDecoder()
+        while True:
+            try:
+                data = await reader.read(CHUNK_SIZE)
+            except ConnectionError as e:
+                print(f"[Async] Read error: {e}")
+                break
+            if not data:
+                break
+            decoder.append(data)
+            await self.loop.run_in_executor(executor, self._dispatch_lines, decoder, handler, batch)
+
+    @staticmethod
+    def _dispatch_lines(decoder, handler, batch):
+        with batch():
+            for line_bytes in decoder.lines():
+                try:
+                    text = line_bytes.decode('utf-8')
+                except UnicodeDecodeError:
+                    continue
+                try:
+                    handler(text, decoder)
+                except Exception as e:
+                    print(f"[Async] Handler error: {e}")
+
+    async def _receive_primary(self, reader):
+        m = self.manager
+        if m.primary_protocol == PROTO_BINARY:
+            decoder = FrameDecoder()
+            while True:
+                try:
+                    data = await reader.read(65536)
+                except ConnectionError:
+                    break
+                if not data:
+                    break
+                for kind, a, b in decoder.feed(data):
+                    try:
+                        m.apply_mouse_event(kind, a, b)
+                    except Exception:
+                        pass # Noise
+        else:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                m.handle_primary_line(line.rstrip(b"\n"))
+
+    # Server
+    async def _serve(self):
+        m = self.manager
+        for port, handler in ((m.primary_port, self._on_primary),
+                              (m.secondary_port, self._on_secondary),
+                              (m.tertiary_port, self._on_tertiary)):
+            server = await asyncio.start_server(handler, "0.0.0.0", port, limit=STREAM_LIMIT, reuse_address=True)
+            self._servers.append(server)
+        print("[Server] Waiting for Client to connect")
+        logging.info("[Server] Waiting for Client to connect (asyncio engine)")
+
+    async def _on_primary(self, reader, writer):
+        m = self.manager
+        addr = writer.get_extra_info("peername")
+        self._nodelay(writer)
+        print(f"[Server] Primary connection from: {addr}")
+        logging.info(f"[Connection] Primary connection from: {addr}")
+        writer.write(b"CONNECTED\n")
+        await writer.drain()
+
+        try:
+            line = await asyncio.wait_for(reader.readline(), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            line = b""
+        hello = decode_hello(line.rstrip(b"\n"))
+        m.primary_protocol = PROTO_JSON
+        if hello is not None:
+            m.primary_protocol, options = m.server_hello_options(hello, allow_mux=False)
+            writer.write(encode_hello(**options))
+            await writer.drain()
+        logging.info(f"[Connection] Primary protocol: {m.primary_protocol}")
+
+        sender = self._sender(writer, "primary")
+        m.start_edge_detection()
+        m.send_mouse_events(sender)
+
+        # The client never sends on primary after the hello; wait for it to go away
+        try:
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        print("[Server] Primary connection closed")
+
+    async def _on_secondary(self, reader, writer):
+        m = self.manager
+        addr = writer.get_extra_info("peername")
+        self._nodelay(writer)
+        print(f"[Server] Secondary connection from: {addr}")
+        logging.info(f"[Connection] Secondary connection from: {addr}")
+        sender = self._sender(writer, "secondary")
+        m.secondary_server = sender
+        m.send_keyboard_events(sender)
+        await self._read_lines(reader, lambda line, decoder: m.handle_incoming_large_event(line, sender, decoder), self.bulk_executor)
+
+    async def _on_tertiary(self, reader, writer):
+        m = self.manager
+        addr = writer.get_extra_info("peername")
+        self._nodelay(writer)
+        print(f"[Server] Tertiary connection from: {addr}")
+        sender = self._sender(writer, "tertiary", maxsize=BULK_QUEUE_SIZE)
+        m.tertiary_server = sender
+        m.tertiary_connected = True
+        await self._read_lines(reader, lambda line, decoder: m.handle_incoming_large_event(line, sender, decoder), self.bulk_executor)
+
+    # Client
+    async def _open(self, port, name, handshake=False):
+        """Connect with the same retry policy as the threaded client"""
+        for i in range(10, -1, -1):
+            try:
+                reader, writer = await asyncio.open_connection(app_config.server_ip, port, limit=STREAM_LIMIT)
+                if handshake and await reader.readline() != b"CONNECTED\n":
+                    writer.close()
+                    raise ConnectionError("Handshake failed")
+                self._nodelay(writer)
+                return reader, writer
+            except OSError as e:
+                print(f"Retrying connection ({name}) Attempt: {i}")
+                if i == 0:
+                    print(f"[Client] Connection failed: {e}")
+                    return None, None
+                await asyncio.sleep(1)
+
+    async def _connect(self):
+        m = self.manager
+        reader, writer = await self._open(m.primary_port, "primary", handshake=True)
+        if reader is None:
+            # monitor_stop notices and runs cleanup
+            app_config.is_running = False
+            return
+        print("[Client] Primary Connected")
+        logging.info("[Connection] Primary Connected")
+
+        writer.write(encode_hello(**m.client_hello_options(allow_mux=False)))
+        await writer.drain()
+        try:
+            line = await asyncio.wait_for(reader.readline(), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            line = b""
+        hello = decode_hello(line.rstrip(b"\n"))
+        m.primary_protocol = PROTO_JSON if hello is None else m.apply_server_hello(hello)
+        logging.info(f"[Connection] Primary protocol: {m.primary_protocol}")
+        m.reset_pointer()
+        if hello is None and line:
+            # An old server already started sending JSON mouse data
+            m.handle_primary_line(line.rstrip(b"\n"))
+        m.client_socket = self._sender(writer, "primary")
+
+        sec_reader, sec_writer = await self._open(m.secondary_port, "secondary")
+        if sec_reader is None:
+            app_config.is_running = False
+            return
+        print("[Client] Secondary Connected")
+        logging.info("[Connection] Secondary Connected")
+        m.secondary_client_socket = self._sender(sec_writer, "secondary")
+
+        ter_reader, ter_writer = await self._open(m.tertiary_port, "tertiary")
+        if ter_reader is not None:
+            print("[Client] Tertiary Connected")
+            m.tertiary_client_socket = self._sender(ter_writer, "tertiary", maxsize=BULK_QUEUE_SIZE)
+            m.tertiary_connected = True
+
+        self._spawn(self._receive_primary(reader))
+        self._spawn(self._read_lines(sec_reader, m.handle_secondary_event, self.inject_executor,
+                                     m.keyboard_controller.batch))
+        if ter_reader is not None:
+            ter_sender = m.tertiary_client_socket
+            self._spawn(self._read_lines(ter_reader, lambda line, decoder: m.handle_incoming_large_event(line, ter_sender, decoder),
+                                         self.bulk_executor))
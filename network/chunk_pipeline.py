@@ -0,0 +1,122 @@
+"""
+Chunk Pipeline - Compresses and hashes file chunks on a process pool and hands them back in order
+"""
+import collections
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from network import compression
+from network.chunk_store import chunk_digest
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _executor(workers):
+    """Shared process pool, created on first use and resized when the worker count changes"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn behaves the same on every OS and does not fork the listener threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _read(source):
+    if not isinstance(source, tuple):
+        return source
+    path, offset, size = source
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def digest_chunk(source):
+    return chunk_digest(_read(source)).hexdigest()
+
+
+def digest_chunks(sources, workers):
+    """Digests of chunk sources, spread over the pool when there is more than one worker"""
+    if workers > 1 and len(sources) > 1:
+        return list(_executor(workers).map(digest_chunk, sources, chunksize=8))
+    return [digest_chunk(source) for source in sources]
+
+
+def pack_chunk(source, codec):
+    """Read (or take) one chunk, hash it and compress it if that pays.
+
+    source is a (path, offset, size) tuple, so file data never crosses
+    the process boundary on the way in, or the bytes themselves.
+    Returns (raw size, digest, codec used, payload, seconds compressing).
+    """
+    data = _read(source)
+    digest = chunk_digest(data).hexdigest()
+    used, payload, seconds = compression.compress(data, codec)
+    return len(data), digest, used, payload, seconds
+
+
+class ChunkPipeline:
+    """Ordered, bounded fan-out of chunk work to worker processes.
+
+    submit() queues a chunk; once 2 x workers chunks are in flight the
+    oldest is waited for and emitted, so chunks leave in submission
+    order and memory stays bounded whatever the transfer size. With one
+    worker everything runs inline on the calling thread.
+    """
+
+    def __init__(self, codec, workers, emit, stats):
+        self.codec = codec
+        self.emit = emit
+        self.stats = stats  # [raw bytes, wire bytes, seconds compressing]
+        self._pool = _executor(workers) if workers > 1 else None
+        self._limit = workers * 2
+        self._window = collections.deque()
+
+    def submit(self, header, source):
+        """header is the file_chunk frame without size/hash; "raw" is the expected chunk size"""
+        if self._pool is None:
+            self._finish(header, pack_chunk(source, self.codec))
+            return
+        self._window.append((header, self._pool.submit(pack_chunk, source, self.codec)))
+        if len(self._window) >= self._limit:
+            self._emit_oldest()
+
+    def flush(self):
+        while self._window:
+            self._emit_oldest()
+
+    def cancel(self):
+        while self._window:
+            self._window.popleft()[1].cancel()
+
+    def _emit_oldest(self):
+        header, future = self._window.popleft()
+        self._finish(header, future.result())
+
+    def _finish(self, header, result):
+        raw, digest, used, payload, seconds = result
+        if raw != header["raw"]:
+            # The header promises a size; a short read means the file changed under us
+            raise IOError(f"file changed during transfer (chunk at {header['offset']})")
+        header = dict(header, size=len(payload), hash=digest)
+        if used == "none":
+            del header["raw"]
+        else:
+            header["codec"] = used
+        self.stats[0] += raw
+        self.stats[1] += len(payload)
+        self.stats[2] += seconds
+        self.emit(header, payload)
@@ -0,0 +1,174 @@
+"""
+Chunk Store - Content-addressed cache of received file chunks with an LRU size cap
+"""
+import collections
+import hashlib
+import os
+import threading
+
+# Block size for copying a file range into the store when the kernel cannot do it
+COPY_BLOCK = 1024 * 1024
+
+
+def chunk_digest(data=b""):
+    """Hash object used for per-chunk checksums and store keys"""
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def store_dir():
+    return os.path.join(os.path.expanduser("~"), "Portal", ".chunks")
+
+
+def _copy_range(src, dst, offset, size):
+    """Copy size bytes at offset in src to dst; in the kernel (a reflink on btrfs or XFS) where possible"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            while size:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), size, offset)
+                if not n:
+                    break
+                offset += n
+                size -= n
+        except OSError:
+            pass # Cross-device on older kernels, or a file system without support; copy the rest below
+    src.seek(offset)
+    while size:
+        block = src.read(min(size, COPY_BLOCK))
+        if not block:
+            raise OSError("file shorter than the chunk being stored")
+        dst.write(block)
+        size -= len(block)
+
+
+class ChunkStore:
+    """Chunks kept as <root>/<first two hex digits>/<digest>, least recently used evicted first.
+
+    The index is built from the directory on first use (oldest mtime
+    first) and kept in memory afterwards; using a chunk moves it to the
+    back and touches its file so the order survives restarts. Every
+    add() evicts down to the cap, except for chunks pinned by have()
+    because a sender was told it may reference them; unpin() releases
+    them once that transfer is over.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index = None  # digest -> size, least recently used first
+        self._size = 0
+        self._pinned = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load(self):
+        if self._index is not None:
+            return
+        entries = []
+        try:
+            for prefix in os.listdir(self.root):
+                folder = os.path.join(self.root, prefix)
+                for name in os.listdir(folder):
+                    st = os.stat(os.path.join(folder, name))
+                    entries.append((st.st_mtime, name, st.st_size))
+        except OSError:
+            pass
+        entries.sort()
+        self._index = collections.OrderedDict((name, size) for _, name, size in entries)
+        self._size = sum(self._index.values())
+
+    def _touch(self, digest):
+        self._index.move_to_end(digest)
+        try:
+            os.utime(self._path(digest))
+        except OSError:
+            pass
+
+    def have(self, digests):
+        """The given digests that are stored; they become most recently used and are pinned"""
+        with self._lock:
+            self._load()
+            found = [d for d in dict.fromkeys(digests) if d in self._index]
+            for digest in found:
+                self._touch(digest)
+            self._pinned.update(found)
+            return found
+
+    def unpin(self, digests):
+        with self._lock:
+            self._pinned.subtract(digests)
+            self._pinned += collections.Counter()  # drop the entries that reached zero
+
+    def read(self, digest):
+        """Stored bytes, or None if missing or damaged"""
+        with self._lock:
+            self._load()
+            if digest not in self._index:
+                return None
+            try:
+                with open(self._path(digest), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is None or chunk_digest(data).hexdigest() != digest:
+                self._remove(digest)
+                return None
+            self._touch(digest)
+            return data
+
+    def add(self, digest, data):
+        self._insert(digest, len(data), lambda f: f.write(data))
+
+    def add_range(self, digest, path, offset, size):
+        """Store a verified range of a file on disk without passing the bytes through Python"""
+        def write(f):
+            with open(path, "rb") as src:
+                _copy_range(src, f, offset, size)
+        self._insert(digest, size, write)
+
+    def _insert(self, digest, size, write):
+        if not self.max_bytes or size > self.max_bytes:
+            return
+        with self._lock:
+            self._load()
+            if digest in self._index:
+                self._touch(digest)
+                return
+            path = self._path(digest)
+            temp = path + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(temp, "wb") as f:
+                    write(f)
+                os.replace(temp, path)
+            except OSError as e:
+                print(f"[Files] Chunk store write failed: {e}")
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+                return
+            self._index[digest] = size
+            self._size += size
+            self._evict()
+
+    def trim(self):
+        """Evict least recently used chunks until the store fits its cap"""
+        with self._lock:
+            self._load()
+            self._evict()
+
+    def _evict(self):
+        for digest in list(self._index):
+            if self._size <= self.max_bytes:
+                break
+            if digest not in self._pinned:
+                self._remove(digest)
+
+    def _remove(self, digest):
+        self._size -= self._index.pop(digest, 0)
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            pass
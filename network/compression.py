@@ -0,0 +1,207 @@
+"""
+Compression - Negotiated per-frame compression for clipboard data and file chunks on the bulk channels
+"""
+import base64
+import json
+import logging
+import math
+import time
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Payloads below this go out as they are
+MIN_SIZE = 4096
+# Bytes read from each of three places in a payload to estimate its entropy
+SAMPLE_SIZE = 4096
+# Samples above this many bits per byte are treated as already compressed
+MAX_ENTROPY = 7.5
+
+# Leading bytes of formats that are compressed already (archives, images, media)
+COMPRESSED_MAGIC = (
+    b"PK\x03\x04", b"\x1f\x8b", b"\x28\xb5\x2f\xfd", b"\xfd7zXZ\x00", b"BZh", b"7z\xbc\xaf\x27\x1c",
+    b"Rar!", b"\x04\x22\x4d\x18", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"OggS", b"fLaC", b"ID3",
+)
+
+
+class _Zlib:
+    name = "zlib"
+
+    @staticmethod
+    def compress(data):
+        return zlib.compress(data, 1)  # LAN links are fast; favour speed over ratio
+
+    @staticmethod
+    def decompressor():
+        return zlib.decompressobj()
+
+
+class _Zstd:
+    name = "zstd"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    @staticmethod
+    def decompressor():
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class _Lz4:
+    name = "lz4"
+
+    @staticmethod
+    def compress(data):
+        return lz4.frame.compress(data)
+
+    @staticmethod
+    def decompressor():
+        return lz4.frame.LZ4FrameDecompressor()
+
+
+class _Stored:
+    """Raw bytes; still spares already-compressed data the base64 overhead"""
+    name = "none"
+
+    @staticmethod
+    def compress(data):
+        return data
+
+    @staticmethod
+    def decompressor():
+        return _Copy()
+
+
+class _Copy:
+    @staticmethod
+    def decompress(data):
+        return bytes(data)
+
+
+CODECS = {"zlib": _Zlib(), "none": _Stored()}
+if zstandard is not None:
+    CODECS["zstd"] = _Zstd()
+if lz4 is not None:
+    CODECS["lz4"] = _Lz4()
+
+# Best first; zlib is always there
+PREFERENCE = ("zstd", "lz4", "zlib")
+
+
+def available():
+    """Hello value for "comp=": the codecs this side can use, best first"""
+    return ",".join(name for name in PREFERENCE if name in CODECS)
+
+
+def negotiate(offered):
+    """Pick the best codec from a peer's "comp=" list, or None"""
+    names = (offered or "").split(",")
+    for name in PREFERENCE:
+        if name in CODECS and name in names:
+            return name
+    return None
+
+
+def _entropy(sample):
+    """Shannon entropy in bits per byte"""
+    total = len(sample)
+    return -sum(c / total * math.log2(c / total) for c in Counter(sample).values())
+
+
+def worth_compressing(data):
+    """False for small payloads, known compressed formats and random-looking samples"""
+    if len(data) < MIN_SIZE:
+        return False
+    head = bytes(data[:8])
+    if head.startswith(COMPRESSED_MAGIC) or head[4:8] == b"ftyp" or (head.startswith(b"RIFF") and b"WEBP" in bytes(data[8:12])):
+        return False
+    middle = len(data) // 2
+    sample = bytes(data[:SAMPLE_SIZE]) + bytes(data[middle:middle + SAMPLE_SIZE]) + bytes(data[-SAMPLE_SIZE:])
+    return _entropy(sample) < MAX_ENTROPY
+
+
+def compress(data, codec):
+    """Compress data with codec if it pays; returns (codec name used, payload, seconds)"""
+    if codec is None or not worth_compressing(data):
+        return "none", data, 0.0
+    start = time.perf_counter()
+    packed = CODECS[codec].compress(data)
+    elapsed = time.perf_counter() - start
+    if len(packed) >= len(data):
+        return "none", data, elapsed
+    return codec, packed, elapsed
+
+
+def log_ratio(what, codec, raw, packed, seconds):
+    ratio = packed / raw if raw else 1.0
+    logging.info(f"[Compression] {what}: {raw} -> {packed} bytes ({ratio:.0%}, {codec}) in {seconds * 1000:.1f} ms")
+
+
+def pack_clipboard(msg, codec):
+    """Frames for a clipboard or clipboard_data message.
+
+    The "content" field travels as raw (possibly compressed) bytes after a
+    "packed" header instead of base64 inside the JSON line. Returns a list
+    of byte strings to send in order.
+    """
+    prefix, payload = msg["content"].split(":", 1)
+    raw = base64.b64decode(payload)
+    used, packed, seconds = compress(raw, codec)
+    log_ratio(msg["type"], used, len(raw), len(packed), seconds)
+    header = {key: value for key, value in msg.items() if key != "content"}
+    header = {"type": "packed", "codec": used, "size": len(packed), "format": prefix, "msg": header}
+    return [(json.dumps(header) + "\n").encode(), packed]
+
+
+class Unpacker:
+    """expect_raw sink for a "packed" frame; calls on_message with the rebuilt message"""
+
+    def __init__(self, evt, on_message):
+        self.evt = evt
+        self.on_message = on_message
+        self._decompressor = CODECS[evt["codec"]].decompressor()
+        self._parts = []
+        self._left = int(evt["size"])
+
+    def feed(self, data):
+        self._parts.append(self._decompressor.decompress(data))
+        self._left -= len(data)
+        if not self._left:
+            raw = b"".join(self._parts)
+            self._parts = []
+            msg = dict(self.evt["msg"])
+            msg["content"] = f"{self.evt['format']}:{base64.b64encode(raw).decode('utf-8')}"
+            self.on_message(msg)
+
+
+class ChunkDecompressor:
+    """expect_raw sink for a compressed file_chunk; forwards the decompressed bytes"""
+
+    def __init__(self, codec, sink):
+        self._decompressor = CODECS[codec].decompressor()
+        self._sink = sink
+
+    def feed(self, data):
+        if self._decompressor is None:
+            return
+        try:
+            out = self._decompressor.decompress(data)
+        except Exception as e:
+            # Drop the rest of the chunk; it is not journaled and gets resent on resume
+            print(f"[Files] Chunk decompression failed: {e}")
+            self._decompressor = None
+            return
+        if out:
+            self._sink(out)
@@ -12,9 +12,11 @@ from pynput.mouse import Button
 
 from utils.config import app_config
 from controllers.clipboard_controller import ClipboardController
+from controllers.clipboard_watcher import ClipboardDedup
 from controllers.mouse_controller import MouseController
 from controllers.keyboard_controller import KeyboardController
 from network.input_handler import InputHandler
+from network.edge_detector import EdgeDetector
 
 
 class ConnectionHandler:
@@ -30,7 +32,8 @@ class ConnectionHandler:
         self.secondary_client_socket: Optional[socket.socket] = None
         
         self.edge_transition_cooldown = False
-        self.last_send = None
+        self.edge_detector = None
+        self.clipboard_dedup = ClipboardDedup()
         
         # Controllers
         self.clipboard_controller = ClipboardController()
@@ -142,6 +145,15 @@ class ConnectionHandler:
     
     def monitor_mouse_edges(self, client_socket):
         """Monitor mouse edges for transitions"""
+        if app_config.edge_detection != "polling":
+            try:
+                self.edge_detector = EdgeDetector(self, warp_buffer=0, grace_period=0)
+                self.edge_detector.start()
+                return
+            except Exception as e:
+                print(f"[Edges] Event backend unavailable, falling back to polling: {e}")
+                self.edge_detector = None
+        
         margin = 2
         
         while app_config.is_running:
@@ -213,8 +225,7 @@ class ConnectionHandler:
         
         if to_active:
             current_clip = self.clipboard_controller.get_clipboard()
-            if self.last_send != current_clip:
-                self.last_send = current_clip
+            if self.clipboard_dedup.should_send(current_clip):
                 if hasattr(self, 'secondary_server') and self.secondary_server:
                     self.clipboard_sender(self.secondary_server, current_clip)
         
@@ -0,0 +1,174 @@
+"""
+Edge Detector - Event-driven screen edge detection driven by pointer move callbacks
+"""
+import threading
+import time
+from pynput import mouse
+
+from utils.config import app_config
+
+_FAR = 1 << 30  # effectively unbounded rectangle side
+
+
+class EdgeDetector:
+    """Trigger device transitions from pynput move events instead of polling.
+
+    The edge rectangles and warp targets are computed once per
+    configure() call, so each move event costs a couple of comparisons.
+    Transitions run on a worker thread because they block for a while and
+    must not stall the pynput listener. A wider band along the activating
+    edge arms the keyboard capture, so its hook is already installed when
+    the transition switches it on.
+    """
+
+    def __init__(self, handler, margin=2, warp_buffer=50, grace_period=0.2):
+        self.handler = handler
+        self.margin = margin
+        self.warp_buffer = warp_buffer
+        self.grace_period = grace_period
+
+        self.listener = None
+        self.enabled = True
+        self._activate_rect = None
+        self._arm_rect = None
+        self._deactivate_rect = None
+        self._activate_target = (None, None)
+        self._deactivate_target = (None, None)
+        self._reset_band = None
+
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._recheck_timer = None
+        self.configure()
+
+    def configure(self):
+        """Recompute edge rectangles from the current direction and screen size"""
+        w = self.handler.screen_width
+        h = self.handler.screen_height
+        m = self.margin
+        near = m + self.warp_buffer
+        far_x = w - m - self.warp_buffer
+        far_y = h - m - self.warp_buffer
+        left = (-_FAR, -_FAR, m, _FAR)
+        right = (w - m, -_FAR, _FAR, _FAR)
+        top = (-_FAR, -_FAR, _FAR, m)
+        bottom = (-_FAR, h - m, _FAR, _FAR)
+
+        direction = app_config.server_direction
+        if direction == "Left":
+            self._activate_rect, self._activate_target = left, (far_x, None)
+            self._deactivate_rect, self._deactivate_target = right, (near, None)
+        elif direction == "Top":
+            self._activate_rect, self._activate_target = top, (None, far_y)
+            self._deactivate_rect, self._deactivate_target = bottom, (None, near)
+        elif direction == "Bottom":
+            self._activate_rect, self._activate_target = bottom, (None, near)
+            self._deactivate_rect, self._deactivate_target = top, (None, far_y)
+        else:  # Right
+            self._activate_rect, self._activate_target = right, (near, None)
+            self._deactivate_rect, self._deactivate_target = left, (far_x, None)
+
+        arm = m + int(getattr(app_config, 'keyboard_arm_distance', 200))
+        self._arm_rect = {
+            "Left": (-_FAR, -_FAR, arm, _FAR),
+            "Top": (-_FAR, -_FAR, _FAR, arm),
+            "Bottom": (-_FAR, h - arm, _FAR, _FAR),
+        }.get(direction, (w - arm, -_FAR, _FAR, _FAR))
+
+        # Cooldown clears once the cursor leaves the trigger axis
+        if direction in ("Top", "Bottom"):
+            self._reset_band = (-_FAR, m + 5, _FAR, h - m - 5)
+        else:
+            self._reset_band = (m + 5, -_FAR, w - m - 5, _FAR)
+
+        self.enabled = bool(getattr(app_config, 'input_sharing_enabled', True))
+
+    def start(self):
+        """Start the worker and the pynput move listener"""
+        threading.Thread(target=self._worker, daemon=True).start()
+        self.listener = mouse.Listener(on_move=self.on_move)
+        self.listener.daemon = True
+        self.listener.start()
+
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+        self._wakeup.set()
+
+    def on_move(self, x, y):
+        active = app_config.active_device
+        if not self.enabled:
+            if active:
+                self._request(False, (x, y))
+            return
+
+        capture = getattr(self.handler, 'keyboard_capture', None)
+        if capture is not None and not active and self._hit(self._arm_rect, x, y):
+            capture.arm()
+
+        since = time.time() - getattr(self.handler, 'last_transition_time', 0)
+        if since < self.grace_period:
+            # A cursor pinned at the edge sends no further events, so look again later
+            if self._hit(self._deactivate_rect if active else self._activate_rect, x, y):
+                self._schedule_recheck(self.grace_period - since)
+            return
+
+        if not self.handler.edge_transition_cooldown:
+            if active:
+                if self._hit(self._deactivate_rect, x, y):
+                    self._request(False, self._target(self._deactivate_target, x, y))
+                    return
+            elif self._hit(self._activate_rect, x, y):
+                self._request(True, self._target(self._activate_target, x, y))
+                return
+
+        lock = getattr(self.handler, '_transition_lock', None)
+        if (lock is None or not lock.locked()) and self._hit(self._reset_band, x, y):
+            self.handler.edge_transition_cooldown = False
+
+    @staticmethod
+    def _hit(rect, x, y):
+        return rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]
+
+    @staticmethod
+    def _target(target, x, y):
+        tx, ty = target
+        return (x if tx is None else tx, y if ty is None else ty)
+
+    def _schedule_recheck(self, delay):
+        if self._recheck_timer and self._recheck_timer.is_alive():
+            return
+
+        def recheck():
+            x, y = self.handler.mouse_controller.position
+            self.on_move(x, y)
+
+        self._recheck_timer = threading.Timer(delay + 0.001, recheck)
+        self._recheck_timer.daemon = True
+        self._recheck_timer.start()
+
+    def _request(self, to_active, new_position):
+        """Hand a transition to the worker thread (at most one outstanding)"""
+        with self._pending_lock:
+            if self._pending is not None:
+                return
+            self._pending = (to_active, new_position)
+            self.handler.edge_transition_cooldown = True
+        self._wakeup.set()
+
+    def _worker(self):
+        while app_config.is_running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._pending_lock:
+                pending = self._pending
+            if pending:
+                try:
+                    self.handler.transition(*pending)
+                except Exception as e:
+                    print(f"[Edges] Transition failed: {e}")
+                finally:
+                    with self._pending_lock:
+                        self._pending = None
@@ -0,0 +1,745 @@
+"""
+File Transfer - Streams copied files as a manifest followed by raw chunks written straight to disk
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import tarfile
+import threading
+import time
+
+from network import chunk_pipeline, compression
+from network.chunk_pipeline import ChunkPipeline
+from network.chunk_store import chunk_digest
+
+# Hello value for "files=" when both peers can stream files
+FILE_STREAM = "stream"
+
+# Raw bytes per file_chunk frame; bounds sender and receiver memory use
+CHUNK_SIZE = 256 * 1024
+# With sendfile the bytes never enter Python, so chunks can be larger
+SENDFILE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# How long a sender waits for the receiver's file_resume reply
+RESUME_TIMEOUT = 5.0
+# Unfinished transfers older than this are removed from the partial directory
+PARTIAL_MAX_AGE = 7 * 24 * 3600
+
+# Manifest "archive" value for a copied directory streamed as an uncompressed tar
+ARCHIVE_TAR = "tar"
+
+# Sender-side chunk digests kept between transfers, keyed by file range, size and mtime
+DIGEST_CACHE_ENTRIES = 65536
+_digest_cache = {}
+
+
+def download_dir():
+    return os.path.join(os.path.expanduser("~"), "Portal", "Downloads")
+
+
+def partial_dir():
+    return os.path.join(os.path.expanduser("~"), "Portal", ".partial")
+
+
+def clear_downloads(download_path):
+    """Remove everything from the downloads folder before a new transfer"""
+    if not os.path.exists(download_path):
+        return
+    try:
+        for filename in os.listdir(download_path):
+            file_path = os.path.join(download_path, filename)
+            try:
+                if os.path.isfile(file_path) or os.path.islink(file_path):
+                    os.unlink(file_path)
+                elif os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+            except Exception as e:
+                print(f"[Cleanup] Failed to delete {file_path}: {e}")
+    except Exception as e:
+        print(f"[Cleanup] Error clearing directory: {e}")
+
+
+def unique_path(target):
+    """Append _1, _2, ... to target until it does not exist"""
+    base, ext = os.path.splitext(target)
+    counter = 1
+    while os.path.exists(target):
+        target = f"{base}_{counter}{ext}"
+        counter += 1
+    return target
+
+
+def frame(data):
+    return (json.dumps(data) + "\n").encode()
+
+
+def collect_files(paths):
+    """Resolve copied paths to manifest entries; directories are archived while they are sent"""
+    files = []
+    for p in paths:
+        p = p.strip().rstrip(os.sep) or p.strip()
+        try:
+            if os.path.isfile(p):
+                files.append({"name": os.path.basename(p), "size": os.path.getsize(p), "path": p,
+                              "source": p, "mtime": os.stat(p).st_mtime_ns})
+            elif os.path.isdir(p):
+                # send_files adds up the archive size from its pieces
+                files.append({"name": os.path.basename(p) or "folder", "size": None, "archive": ARCHIVE_TAR,
+                              "path": p, "source": p, "mtime": os.stat(p).st_mtime_ns})
+        except OSError as e:
+            print(f"[Clipboard] Failed to read file {p}: {e}")
+    return files
+
+
+def transfer_id_for(files):
+    """Stable ID for a set of files, so copying the same files again can resume.
+
+    A stale match is harmless: the receiver only keeps chunks whose hashes
+    the sender confirms against the current file contents.
+    """
+    ident = [[f["name"], f["size"], f["source"], f["mtime"]] for f in files]
+    return hashlib.sha1(json.dumps(ident).encode()).hexdigest()
+
+
+def archive_pieces(root, piece_size):
+    """A directory's tar stream as a list of pieces: header and padding bytes, and (path, offset, size) file ranges.
+
+    Every file's data starts a new piece, so its ranges hash the same as
+    the chunks of that file sent on its own, wherever it sits in the tree.
+    """
+    pieces, pending = [], bytearray()
+
+    def flush():
+        if pending:
+            pieces.append(bytes(pending))
+            pending.clear()
+
+    with tarfile.open(fileobj=io.BytesIO(), mode="w", format=tarfile.PAX_FORMAT) as tar:
+        def add(path, arcname):
+            info = tar.gettarinfo(path, arcname)
+            if info is None:
+                return  # Sockets and other entries tar cannot store
+            pending.extend(info.tobuf(tar.format, tar.encoding, tar.errors))
+            if info.isreg() and info.size:
+                flush()
+                for offset in range(0, info.size, piece_size):
+                    pieces.append((path, offset, min(piece_size, info.size - offset)))
+                pending.extend(bytes(-info.size % tarfile.BLOCKSIZE))
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            rel = os.path.relpath(dirpath, root)
+            if rel != ".":
+                add(dirpath, rel)
+            links = [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+            for name in sorted(filenames + links):
+                add(os.path.join(dirpath, name), os.path.normpath(os.path.join(rel, name)))
+    pending.extend(bytes(2 * tarfile.BLOCKSIZE))  # End-of-archive marker
+    flush()
+    return pieces
+
+
+def piece_size(piece):
+    return piece[2] if isinstance(piece, tuple) else len(piece)
+
+
+def piece_digests(pieces, workers):
+    """Chunk digests for pieces; file ranges hashed before at the same size and mtime are not read again"""
+    stats, keys, todo = {}, [], []
+    for piece in pieces:
+        key = None
+        if isinstance(piece, tuple):
+            if piece[0] not in stats:
+                st = os.stat(piece[0])
+                stats[piece[0]] = (st.st_size, st.st_mtime_ns)
+            key = piece + stats[piece[0]]
+            if key not in _digest_cache:
+                todo.append(piece)
+        keys.append(key)
+    computed = iter(chunk_pipeline.digest_chunks(todo, workers))
+    digests = []
+    for piece, key in zip(pieces, keys):
+        if key is None:
+            digests.append(chunk_digest(piece).hexdigest())
+            continue
+        if key not in _digest_cache:
+            _digest_cache[key] = next(computed)
+        digests.append(_digest_cache[key])
+    for key in list(_digest_cache)[:max(0, len(_digest_cache) - DIGEST_CACHE_ENTRIES)]:
+        del _digest_cache[key]
+    return digests
+
+
+def verified_offset(path, chunks):
+    """Length of the prefix of path that matches the receiver's chunk hashes"""
+    end = 0
+    try:
+        with open(path, "rb") as src:
+            for offset, size, digest in chunks:
+                if offset != end:
+                    break
+                data = src.read(size)
+                if len(data) != size or chunk_digest(data).hexdigest() != digest:
+                    break
+                end += size
+    except (OSError, TypeError, ValueError):
+        pass
+    return end
+
+
+def can_sendfile(sock):
+    """True for real sockets; MuxChannel and StreamSender need the buffered path"""
+    return isinstance(sock, socket.socket) and hasattr(os, "sendfile")
+
+
+def send_files(sock, paths, status, use_sendfile=None, resume=None, codec=None, workers=1, dedup=False):
+    """Stream files as file_manifest, file_chunk + raw bytes, ..., file_end.
+
+    On a plain socket the chunk payloads go out with socket.sendfile, so
+    the kernel copies file pages straight to the socket. Otherwise only
+    one CHUNK_SIZE buffer is held at a time. With a ReplyWaiter the
+    receiver's file_resume reply is awaited after the manifest and every
+    file starts after its verified prefix. With a codec, files whose
+    first chunk looks compressible, and folder archives, are compressed
+    and hashed by a ChunkPipeline of `workers` processes instead. With
+    dedup the manifest lists every chunk's hash, and chunks the receiver
+    already has in its chunk store go out as references without data.
+    Returns the number of files sent.
+    """
+    if use_sendfile is None:
+        use_sendfile = can_sendfile(sock)
+    chunk_size = SENDFILE_CHUNK_SIZE if use_sendfile else CHUNK_SIZE
+    files = collect_files(paths)
+    if not files:
+        return 0
+
+    transfer_id = transfer_id_for(files)
+    manifest = []
+    for f in files:
+        if f.get("archive"):
+            # Folder data is compressed along with the tar headers whenever there is a codec
+            f["compress"] = bool(codec)
+            f["pieces"] = archive_pieces(f["path"], CHUNK_SIZE if codec else chunk_size)
+            f["size"] = sum(piece_size(piece) for piece in f["pieces"])
+        else:
+            with open(f["path"], "rb") as src:
+                f["compress"] = bool(codec) and compression.worth_compressing(src.read(CHUNK_SIZE))
+            size = CHUNK_SIZE if f["compress"] else chunk_size
+            f["pieces"] = [(f["path"], offset, min(size, f["size"] - offset)) for offset in range(0, f["size"], size)]
+        entry = {"name": f["name"], "size": f["size"]}
+        if f.get("archive"):
+            entry["archive"] = f["archive"]
+        if dedup:
+            f["digests"] = entry["chunks"] = piece_digests(f["pieces"], workers)
+        manifest.append(entry)
+    total = sum(f["size"] for f in files)
+    if resume:
+        resume.expect(transfer_id)
+    sock.sendall(frame({"type": "file_manifest", "id": transfer_id, "files": manifest}))
+
+    offsets = [0] * len(files)
+    have = set()
+    reply = resume.wait(transfer_id, RESUME_TIMEOUT) if resume else None
+    if reply:
+        for index, chunks in enumerate(reply.get("files", [])[:len(files)]):
+            if not files[index].get("archive"):
+                offsets[index] = verified_offset(files[index]["path"], chunks)
+        have = set(reply.get("have") or ())
+        done = sum(offsets)
+        if done:
+            print(f"[Files] Resuming transfer at {done} of {total} bytes")
+            status(f"Resuming file transfer ({done * 100 // total}% already received)...")
+
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    stats = [0, 0, 0.0]  # raw bytes, wire bytes, seconds spent compressing
+    stored = 0
+    pipeline = None
+    if codec:
+        def emit(header, payload):
+            sock.sendall(frame(header))
+            sock.sendall(payload)
+        pipeline = ChunkPipeline(codec, workers, emit, stats)
+    source = _OpenFile()
+    try:
+        for index, f in enumerate(files):
+            if f.get("archive"):
+                status(f"Sending folder {f['name']}...")
+            end = 0
+            for piece, digest in zip(f["pieces"], f.get("digests") or [None] * len(f["pieces"])):
+                offset, end = end, end + piece_size(piece)
+                if end <= offsets[index]:
+                    continue
+                if offset < offsets[index]:
+                    # The verified prefix ends inside this piece (the last attempt used another chunk size)
+                    piece = (piece[0], piece[1] + offsets[index] - offset, end - offsets[index])
+                    offset, digest = offsets[index], None
+                n = piece_size(piece)
+                header = {"type": "file_chunk", "id": transfer_id, "file": index, "offset": offset}
+                if digest in have:
+                    if pipeline:
+                        pipeline.flush()
+                    sock.sendall(frame(dict(header, size=0, raw=n, hash=digest, stored=True)))
+                    stored += n
+                    continue
+                if pipeline and f["compress"]:
+                    pipeline.submit(dict(header, raw=n), piece)
+                    continue
+                if pipeline:
+                    pipeline.flush()  # chunks go out in order, after everything queued before them
+                header["size"] = n
+                if digest:
+                    header["hash"] = digest
+                sock.sendall(frame(header))
+                if not isinstance(piece, tuple):
+                    sock.sendall(piece)
+                    continue
+                src = source.open(piece[0])
+                if use_sendfile:
+                    sent = sock.sendfile(src, piece[1], n)
+                else:
+                    src.seek(piece[1])
+                    sent = _send_buffered(sock, src, view, n)
+                if sent != n:
+                    # The file shrank while sending; the chunk header already promised
+                    # more bytes, so the stream is unusable and must not continue
+                    raise IOError(f"{piece[0]} changed during transfer")
+        if pipeline:
+            pipeline.flush()
+    except BaseException:
+        if pipeline:
+            pipeline.cancel()
+        raise
+    finally:
+        source.close()
+    sock.sendall(frame({"type": "file_end", "id": transfer_id}))
+    logging.info(f"[Files] Streamed {len(files)} files ({total - sum(offsets) - stored} of {total} bytes sent)")
+    if stored:
+        logging.info(f"[Files] {stored} bytes taken from the receiver's chunk store")
+    if stats[0]:
+        compression.log_ratio(f"{len(files)} files", codec, stats[0], stats[1], stats[2])
+    return len(files)
+
+
+class _OpenFile:
+    """Keeps the file behind consecutive pieces open"""
+
+    def __init__(self):
+        self.path = None
+        self.file = None
+
+    def open(self, path):
+        if path != self.path:
+            self.close()
+            self.file = open(path, "rb")
+            self.path = path
+        return self.file
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.file = self.path = None
+
+
+def _send_buffered(sock, src, view, count):
+    """Copy count bytes from src to sock through view; returns the bytes sent"""
+    sent = 0
+    while sent < count:
+        n = src.readinto(view[:min(len(view), count - sent)])
+        if not n:
+            break
+        sock.sendall(view[:n])
+        sent += n
+    return sent
+
+
+def _safe_member(member):
+    """Only plain files and directories inside the target (used when tarfile has no data filter)"""
+    name = member.name
+    return (member.isfile() or member.isdir()) and not os.path.isabs(name) and ".." not in name.split("/")
+
+
+class _ArchiveExtractor:
+    """Unpacks a streamed tar into a directory on its own thread, entry by entry as the bytes arrive.
+
+    The receive loop feeds chunks into a pipe; a full pipe holds the
+    sender back while the disk catches up.
+    """
+
+    def __init__(self, target):
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+        self.target = target
+        self.error = None
+        read_fd, self._write_fd = os.pipe()
+        self._thread = threading.Thread(target=self._extract, args=(read_fd,), daemon=True)
+        self._thread.start()
+
+    def _extract(self, read_fd):
+        with os.fdopen(read_fd, "rb") as stream:
+            try:
+                with tarfile.open(fileobj=stream, mode="r|") as tar:
+                    for member in tar:
+                        if hasattr(tarfile, "data_filter"):
+                            try:
+                                tar.extract(member, self.target, filter="data")
+                            except tarfile.FilterError as e:
+                                print(f"[Files] Skipped archive entry {member.name}: {e}")
+                        elif _safe_member(member):
+                            tar.extract(member, self.target)
+            except Exception as e:
+                self.error = e
+            # Consume the end padding (or the rest after an error) so the writer never blocks
+            while stream.read(CHUNK_SIZE):
+                pass
+
+    def feed(self, data):
+        if self._write_fd is None:
+            return
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(self._write_fd, view):]
+        except OSError as e:
+            self.error = self.error or e
+            self.close()
+
+    def close(self):
+        """Signal the end of the stream and wait for extraction; returns the error, if any"""
+        if self._write_fd is not None:
+            os.close(self._write_fd)
+            self._write_fd = None
+        self._thread.join()
+        return self.error
+
+
+class _Transfer:
+    """Receiver-side state of one streamed transfer.
+
+    Data is written to <partial>/<id>/<n>.part and every completed chunk
+    is appended to a journal with its offset, size and hash. Reopening
+    the same transfer ID after a disconnect or restart rereads the
+    journal, rechecks the hashes against the part files and keeps the
+    verified prefix of each file. Directories arrive as tar streams that
+    are extracted into <n>.dir as they come in; they are not resumable.
+    Chunks that arrive with a hash are also added to the chunk store,
+    copied from the part file once verified; archive chunks only exist
+    in the tar stream, so those are kept in memory until then.
+    """
+
+    def __init__(self, transfer_id, files, root, store=None):
+        if not transfer_id.isalnum():
+            raise ValueError(f"invalid transfer id {transfer_id!r}")
+        self.id = transfer_id
+        self.names = [os.path.basename(f["name"]) or "file" for f in files]
+        self.archives = {i for i, f in enumerate(files) if f.get("archive") == ARCHIVE_TAR}
+        self.sizes = [None if i in self.archives else int(f["size"]) for i, f in enumerate(files)]
+        self.dir = os.path.join(root, transfer_id)
+        self.parts = [os.path.join(self.dir, f"{i}.dir" if i in self.archives else f"{i}.part")
+                      for i in range(len(files))]
+        self.extractors = {}
+        self.store = store
+        self.pinned = []  # store digests promised to the sender, released when the transfer ends
+        self.chunks = [[] for _ in files]  # verified (offset, size, digest) prefix per file
+        self.current = None
+        self.handle = None
+        self.error = None
+        self._chunk = None
+        self._expected = None
+        self._hasher = None
+        self._store_chunk = False
+        self._cached = None
+        self._left = 0
+
+        manifest = {"names": self.names, "sizes": self.sizes}
+        manifest_path = os.path.join(self.dir, "manifest.json")
+        try:
+            with open(manifest_path) as f:
+                resumable = json.load(f) == manifest
+        except (OSError, ValueError):
+            resumable = False
+        if resumable:
+            self._load_journal()
+        else:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir)
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f)
+        # Rewrite the journal with just the verified chunks
+        self.journal = open(os.path.join(self.dir, "journal"), "w")
+        for index, chunks in enumerate(self.chunks):
+            for chunk in chunks:
+                self._journal(index, *chunk)
+        os.utime(self.dir)  # keeps an active transfer out of stale cleanup
+
+    def _load_journal(self):
+        try:
+            with open(os.path.join(self.dir, "journal")) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._record(entry["file"], entry["offset"], entry["size"], entry["hash"])
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        break # Torn final line
+        except OSError:
+            return
+        # Only trust chunks whose bytes really made it to disk
+        for index, chunks in enumerate(self.chunks):
+            keep = 0
+            try:
+                with open(self.parts[index], "rb") as part:
+                    for offset, size, digest in chunks:
+                        if chunk_digest(part.read(size)).hexdigest() != digest:
+                            break
+                        keep += 1
+            except OSError:
+                pass
+            del chunks[keep:]
+
+    def _record(self, index, offset, size, digest):
+        chunks = self.chunks[index]
+        if offset < self.verified(index):
+            # Rewritten from an earlier point; later chunks are no longer known good
+            while chunks and chunks[-1][0] + chunks[-1][1] > offset:
+                chunks.pop()
+        if offset == self.verified(index):
+            chunks.append((offset, size, digest))
+
+    def _journal(self, index, offset, size, digest):
+        self.journal.write(json.dumps({"file": index, "offset": offset, "size": size, "hash": digest}) + "\n")
+        self.journal.flush()
+
+    def verified(self, index):
+        chunks = self.chunks[index]
+        return chunks[-1][0] + chunks[-1][1] if chunks else 0
+
+    def received(self):
+        return sum(self.verified(i) for i in range(len(self.sizes)))
+
+    def resume_info(self):
+        """file_resume reply listing the verified chunks of every file"""
+        return {"type": "file_resume", "id": self.id, "files": [[list(c) for c in chunks] for chunks in self.chunks]}
+
+    def begin_chunk(self, index, offset, size, expected=None, cache=True):
+        """Start a chunk; with cache it goes into the chunk store once its hash checks out"""
+        self._chunk = None
+        if self.error:
+            return
+        if index in self.archives:
+            if offset == 0:
+                if index in self.extractors:
+                    self.extractors[index].close()
+                self.extractors[index] = _ArchiveExtractor(self.parts[index])
+            elif index not in self.extractors:
+                self.error = IOError(f"archive {self.names[index]} resumed mid-stream")
+                return
+        else:
+            try:
+                if index != self.current:
+                    self.close()
+                    path = self.parts[index]
+                    self.handle = open(path, "r+b" if os.path.exists(path) else "w+b")
+                    self.current = index
+                self.handle.seek(offset)
+            except (OSError, IndexError) as e:
+                self.error = e
+                return
+        self._chunk = (index, offset, size)
+        self._expected = expected
+        self._hasher = chunk_digest()
+        self._store_chunk = bool(cache and expected and self.store)
+        self._cached = bytearray() if self._store_chunk and index in self.archives else None
+        self._left = size
+
+    def write(self, data):
+        if self._chunk is None:
+            return # Keep consuming the stream but drop the bytes
+        index, offset, size = self._chunk
+        if index in self.archives:
+            self.extractors[index].feed(data)
+        else:
+            try:
+                self.handle.write(data)
+            except OSError as e:
+                self.error = e
+                self._chunk = None
+                self.close()
+                return
+        self._hasher.update(data)
+        if self._cached is not None:
+            self._cached += data
+        self._left -= len(data)
+        if self._left:
+            return
+        self._chunk = None
+        digest = self._hasher.hexdigest()
+        if self._expected and digest != self._expected:
+            # Not journaled, so a resume sends this chunk again
+            self.error = IOError(f"{self.names[index]}: chunk at {offset} failed its hash check")
+            return
+        if index not in self.archives:
+            self.handle.flush()
+            self._record(index, offset, size, digest)
+            self._journal(index, offset, size, digest)
+            if self._store_chunk:
+                self.store.add_range(digest, self.parts[index], offset, size)
+        elif self._cached is not None:
+            self.store.add(digest, self._cached)
+            self._cached = None
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+        self.current = None
+
+    def suspend(self):
+        """Stop writing but keep the journal so the transfer can resume"""
+        self.close()
+        self.journal.close()
+        for extractor in self.extractors.values():
+            extractor.close()
+
+    def finish(self, download_path):
+        """Move completed files into download_path; returns the saved paths"""
+        self.suspend()
+        if self.error:
+            raise self.error
+        if any(size is not None and self.verified(i) != size for i, size in enumerate(self.sizes)):
+            total = sum(size or 0 for size in self.sizes)
+            raise IOError(f"incomplete transfer ({self.received()} of {total} bytes), kept for resume")
+        for index in self.archives:
+            if index not in self.extractors:
+                raise IOError(f"folder {self.names[index]} never arrived")
+            if self.extractors[index].error:
+                raise IOError(f"folder {self.names[index]}: {self.extractors[index].error}")
+        # Only replace the previous downloads once the new ones are complete
+        clear_downloads(download_path)
+        os.makedirs(download_path, exist_ok=True)
+        saved = []
+        for name, part, size in zip(self.names, self.parts, self.sizes):
+            target = unique_path(os.path.join(download_path, name))
+            if size == 0 and not os.path.exists(part):
+                open(part, "wb").close()
+            os.replace(part, target)
+            saved.append(target)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        return saved
+
+
+def remove_stale_partials(root, keep=None):
+    """Delete unfinished transfers that have not been touched for PARTIAL_MAX_AGE"""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    cutoff = time.time() - PARTIAL_MAX_AGE
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            if name != keep and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class FileReceiver:
+    """Writes streamed files to disk as their chunks arrive.
+
+    Chunk payloads are handed over by the connection's LineDecoder, so a
+    transfer costs one receive buffer of memory whatever the file sizes.
+    Unfinished transfers stay in the partial directory and resume when
+    the sender offers the same transfer ID again. With a ChunkStore the
+    file_resume reply also lists the manifest's chunk hashes found in
+    the store, and those chunks are copied from it instead of the wire.
+    """
+
+    def __init__(self, handler, store=None):
+        self.handler = handler
+        self.store = store
+        self.transfers = {}
+
+    def handle(self, evt, decoder, reply):
+        kind = evt["type"]
+        if kind == "file_manifest":
+            self.begin(evt, reply)
+        elif kind == "file_chunk":
+            self.chunk(evt, decoder)
+        elif kind == "file_end":
+            self.finish(evt["id"])
+
+    def begin(self, evt, reply):
+        transfer_id = evt["id"]
+        previous = self.transfers.pop(transfer_id, None)
+        if previous:
+            self._end(previous)
+        root = partial_dir()
+        remove_stale_partials(root, keep=transfer_id)
+        try:
+            transfer = _Transfer(transfer_id, evt["files"], root, self.store)
+        except (OSError, ValueError) as e:
+            print(f"[Files] Cannot receive transfer: {e}")
+            return
+        self.transfers[transfer_id] = transfer
+        info = transfer.resume_info()
+        digests = [d for f in evt["files"] for d in f.get("chunks") or () if isinstance(d, str)]
+        if self.store and digests:
+            info["have"] = transfer.pinned = self.store.have(digests)
+        reply(info)
+        total = sum(size or 0 for size in transfer.sizes)
+        received = transfer.received()
+        if received:
+            print(f"[Files] Resuming {len(transfer.sizes)} files at {received} of {total} bytes")
+        else:
+            print(f"[Files] Receiving {len(transfer.sizes)} files ({total} bytes)")
+
+    def chunk(self, evt, decoder):
+        size = int(evt["size"])
+        transfer = self.transfers.get(evt["id"])
+        if transfer is None:
+            decoder.expect_raw(size, lambda data: None)
+            return
+        offset, raw = int(evt.get("offset", 0)), int(evt.get("raw", size))
+        if evt.get("stored"):
+            data = self.store.read(evt.get("hash", "")) if self.store else None
+            transfer.begin_chunk(evt["file"], offset, raw, evt.get("hash"), cache=False)
+            if data is None:
+                transfer.error = transfer.error or IOError(f"chunk {evt.get('hash')} is no longer in the chunk store")
+            else:
+                transfer.write(data)
+            return
+        codec = evt.get("codec", "none")
+        transfer.begin_chunk(evt["file"], offset, raw, evt.get("hash"))
+        if codec == "none":
+            decoder.expect_raw(size, transfer.write)
+        else:
+            decoder.expect_raw(size, compression.ChunkDecompressor(codec, transfer.write).feed)
+
+    def finish(self, transfer_id):
+        transfer = self.transfers.pop(transfer_id, None)
+        if transfer is None:
+            return
+        try:
+            saved = transfer.finish(download_dir())
+        except Exception as e:
+            print(f"[Files] Receipt failed: {e}")
+            return
+        finally:
+            if self.store:
+                self.store.unpin(transfer.pinned)
+        self.handler.files_received(saved)
+
+    def _end(self, transfer):
+        transfer.suspend()
+        if self.store:
+            self.store.unpin(transfer.pinned)
+
+    def suspend(self):
+        """Close every unfinished transfer, keeping its journal (connection lost)"""
+        for transfer in self.transfers.values():
+            self._end(transfer)
+        self.transfers.clear()
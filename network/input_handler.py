@@ -157,16 +157,14 @@ class InputHandler:
             app_config.save()
             if not app_config.active_device:
                 current_clip = clipboard_controller.get_clipboard()
-                if self.connection_handler.last_send != current_clip:
-                    self.connection_handler.last_send = current_clip
+                if self.connection_handler.clipboard_dedup.should_send(current_clip):
                     self.connection_handler.clipboard_sender(secondary_socket, current_clip)
         
         elif event_type == "clipboard":
             current_clip = clipboard_controller.get_clipboard()
-            if current_clip != event["content"]:
+            if self.connection_handler.clipboard_dedup.record_received(event["content"], current_clip):
                 app_config.clipboard = event["content"]
                 clipboard_controller.set_clipboard(event["content"])
-                self.connection_handler.last_send = event["content"]
                 app_config.save()
                 print("[Clipboard] Updated clipboard content")
     
@@ -0,0 +1,155 @@
+"""
+Keyboard Capture - One keyboard hook, switched between forwarding (suppressed) and local typing
+"""
+import platform
+import threading
+import time
+from pynput import keyboard
+
+from controllers import x11_selection
+
+# XGrabKeyboard arguments and result
+_GRAB_MODE_ASYNC = 1
+_CURRENT_TIME = 0
+_GRAB_SUCCESS = 0
+# A grab held by another client (an open menu, say) is retried this many times, GRAB_RETRY_DELAY apart
+GRAB_RETRIES = 10
+GRAB_RETRY_DELAY = 0.005
+
+
+class KeyboardCapture:
+    """Forwards and suppresses keyboard input while capturing, passes it through otherwise.
+
+    The pynput listener is started once, by arm() as the pointer nears
+    the active edge or at the latest by the first capture(), and then
+    stays installed; capture() only flips how its events are treated:
+
+    - X11: the listener never suppresses. Capturing holds an active
+      keyboard grab on a private display connection, so other clients
+      get no keys while XRecord still reports them to the listener.
+    - Windows: the low-level hook reads the listener's suppress flag for
+      every event, so the flag is flipped in place.
+    - macOS: an event tap intercept drops events while capturing.
+
+    Without any of these (no libX11, say) it falls back to starting a
+    suppressing listener on every capture, as transitions used to.
+    """
+
+    def __init__(self, on_press, on_release):
+        self.on_press = on_press
+        self.on_release = on_release
+        self.capturing = False
+        self._listener = None
+        self._lock = threading.Lock()
+        self._x11 = None
+        self._display = None
+        self._root = None
+        self._grabbed = False
+
+        os_type = platform.system().lower()
+        self._win32 = os_type == "windows"
+        if os_type == "linux" and x11_selection.available():
+            self._mode = "grab"
+        elif os_type in ("windows", "darwin"):
+            self._mode = "flag"
+        else:
+            self._mode = "restart"
+
+    def arm(self):
+        """Install the hook ahead of the first capture; a flag check once armed"""
+        if self._listener is not None or self._mode == "restart":
+            return
+        with self._lock:
+            if self._listener is None:
+                self._start()
+
+    def capture(self, active):
+        """Forward and suppress keys (True) or leave them to the local desktop (False)"""
+        with self._lock:
+            self.capturing = active
+            if self._mode == "restart":
+                self._restart(active)
+                return
+            if self._listener is None:
+                self._start()
+            if self._mode == "grab":
+                self._grab() if active else self._ungrab()
+            elif self._win32:
+                self._listener._suppress = active  # pynput's hook checks it on every event
+
+    def stop(self):
+        with self._lock:
+            self.capturing = False
+            self._ungrab()
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener = None
+            if self._display:
+                x11_selection.close_display(self._display)
+                self._display = None
+
+    # Listener
+    def _start(self):
+        if self._mode == "grab" and not self._open_display():
+            self._mode = "restart"
+            return
+        self._listener = keyboard.Listener(on_press=self._press, on_release=self._release,
+                                           darwin_intercept=self._intercept)
+        self._listener.daemon = True
+        self._listener.start()
+
+    def _restart(self, active):
+        if self._listener is not None:
+            try: self._listener.stop()
+            except: pass
+            self._listener = None
+            time.sleep(0.05) # Give X11 a moment to release the grab
+        if active:
+            self._listener = keyboard.Listener(on_press=self._press, on_release=self._release, suppress=True)
+            self._listener.start()
+
+    def _press(self, key):
+        if self.capturing:
+            self._drain()
+            self.on_press(key)
+
+    def _release(self, key):
+        if self.capturing:
+            self._drain()
+            self.on_release(key)
+
+    def _intercept(self, event_type, event):
+        return None if self.capturing else event
+
+    # X11 grab
+    def _open_display(self):
+        x11 = x11_selection.load_xlib()
+        display = x11_selection.open_display()
+        if not display:
+            print("[Keyboard] Cannot open display for the keyboard grab; restarting the listener per transition")
+            return False
+        self._x11, self._display = x11, display
+        self._root = x11.XDefaultRootWindow(display)
+        return True
+
+    def _grab(self):
+        for _ in range(GRAB_RETRIES):
+            if self._x11.XGrabKeyboard(self._display, self._root, 1, _GRAB_MODE_ASYNC, _GRAB_MODE_ASYNC,
+                                       _CURRENT_TIME) == _GRAB_SUCCESS:
+                self._grabbed = True
+                return
+            time.sleep(GRAB_RETRY_DELAY)
+        print("[Keyboard] Keyboard is grabbed by another client; keys also reach the local desktop")
+
+    def _ungrab(self):
+        if self._grabbed:
+            self._x11.XUngrabKeyboard(self._display, _CURRENT_TIME)
+            self._x11.XSync(self._display, 1)  # Drop the key events the grab delivered to us
+            self._grabbed = False
+
+    def _drain(self):
+        """Discard the key events queued on the grab connection so it never backs up"""
+        if self._grabbed:
+            with self._lock:
+                if self._grabbed:
+                    self._x11.XSync(self._display, 1)
@@ -0,0 +1,142 @@
+"""
+Lazy Clipboard - Announces clipboard changes with a small descriptor and pulls the payload on paste
+"""
+import base64
+import threading
+
+from controllers import image_codec, x11_selection
+from controllers.x11_selection import X11SelectionOwner, TEXT_TARGETS
+from network.protocol import ReplyWaiter
+
+# Hello value for "clip=" when both peers support offers
+CLIP_LAZY = "lazy"
+
+# Formats that can be offered; files already stream on demand through file_transfer
+LAZY_FORMATS = ("text", "image")
+# Clipboards smaller than this are cheaper to push than to announce
+LAZY_MIN_SIZE = 4096
+# How long a paste may wait for the payload to arrive
+PULL_TIMEOUT = 30.0
+
+
+class LazyClipboard:
+    """Announce-then-pull clipboard transfer.
+
+    The copying side sends a clipboard_offer with the format, size and
+    digest, and keeps the payload until the next change. The other side
+    becomes the X11 CLIPBOARD owner and only sends a clipboard_request
+    when an application pastes. Without an in-process X11 owner
+    (Wayland, Windows, macOS) the payload is pulled right after the
+    offer, which still keeps the transition itself instant. Offers of
+    a clipboard already in the local history are never pulled at all.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.replies = ReplyWaiter()
+        self._offered = (None, None)  # (digest, encoded clipboard) we announced last
+        self._pulled = (None, None, None)  # (digest, format, raw bytes) of the last offer pasted here
+        self._owner = None
+        self._owner_failed = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def wants(data):
+        fmt = data.split(":", 1)[0] if ":" in data else "text"
+        if image_codec.is_image(fmt):
+            fmt = "image"
+        return fmt in LAZY_FORMATS and len(data) >= LAZY_MIN_SIZE
+
+    # Copying side
+    def announce(self, data, digest):
+        """Remember the payload and return the descriptor to send in its place"""
+        fmt, payload = data.split(":", 1)
+        self._offered = (digest, data)
+        size = len(payload) * 3 // 4 - payload.endswith("=") - payload.endswith("==")
+        offer = {"type": "clipboard_offer", "id": digest, "format": fmt, "size": size}
+        if image_codec.is_image(fmt):
+            offer["format"], offer["mime"] = "image", image_codec.mime_of(fmt)
+        return offer
+
+    def serve(self, evt, sock):
+        """Answer a clipboard_request; content is None once the clipboard has changed"""
+        digest, data = self._offered
+        content = data if evt.get("id") == digest else self.handler.clipboard_controller.history.get(evt.get("id"))
+        self.handler.send_bulk_message(sock, {"type": "clipboard_data", "id": evt.get("id"), "content": content})
+
+    # Pasting side
+    def receive_offer(self, evt, sock):
+        known = self.handler.clipboard_controller.history.get(evt["id"])
+        owner = self._selection_owner()
+        if known is not None and owner is None:
+            self.handler.apply_clipboard(known)
+            return
+        if known is not None:
+            self.handler.clipboard_dedup.record_received(known)
+            fmt, payload = known.split(":", 1)
+            self._pulled = (evt["id"], fmt, base64.b64decode(payload))
+        if owner is None:
+            threading.Thread(target=self._pull_now, args=(evt, sock), daemon=True).start()
+            return
+        if evt["format"] == "text":
+            targets = TEXT_TARGETS
+        else:
+            targets = image_codec.targets_for(evt.get("mime", image_codec.PNG))
+        # Our own ownership change must not make the watcher read (and pull) the offer
+        self.handler.clipboard_watcher.hold(evt["id"])
+        owner.offer(targets, lambda target: self._fetch(evt, sock, target))
+        if known is not None:
+            print(f"[Clipboard] Offered {evt['format']} ({evt.get('size', 0)} bytes), taken from history")
+        else:
+            print(f"[Clipboard] Offered {evt['format']} ({evt.get('size', 0)} bytes), fetched on paste")
+
+    def _fetch(self, evt, sock, target):
+        # Each target of an offer is fetched separately; pull the payload only once
+        if self._pulled[0] != evt["id"]:
+            content = self.pull(evt, sock)
+            if content is None:
+                return None
+            self.handler.clipboard_dedup.record_received(content)
+            self.handler.clipboard_controller.history.add(content, evt["id"])
+            fmt, payload = content.split(":", 1)
+            self._pulled = (evt["id"], fmt, base64.b64decode(payload))
+        _, fmt, data = self._pulled
+        if image_codec.is_image(fmt):
+            # Only an application asking for another type than the one sent pays for a conversion
+            data = self.handler.clipboard_controller.image_transcoder.convert(data, image_codec.mime_of(fmt), target)
+        return data
+
+    def _pull_now(self, evt, sock):
+        content = self.pull(evt, sock)
+        if content is not None:
+            self.handler.apply_clipboard(content)
+
+    def pull(self, evt, sock):
+        """Request the payload for an offer and wait for it"""
+        self.replies.expect(evt["id"])
+        self.handler.send_bulk_message(sock, {"type": "clipboard_request", "id": evt["id"]})
+        reply = self.replies.wait(evt["id"], PULL_TIMEOUT)
+        if reply is None or reply.get("content") is None:
+            print("[Clipboard] Offered clipboard is no longer available")
+            return None
+        return reply["content"]
+
+    def deliver(self, evt):
+        self.replies.deliver(evt)
+
+    def _selection_owner(self):
+        with self._lock:
+            if self._owner is None and not self._owner_failed:
+                if self.handler.clipboard_controller.os_type == "linux" and x11_selection.available() \
+                        and getattr(self.handler.clipboard_controller, 'linux_tool', None) != 'wl-clipboard':
+                    try:
+                        self._owner = X11SelectionOwner(on_lost=self.handler.clipboard_watcher.release)
+                    except OSError as e:
+                        print(f"[Clipboard] X11 selection owner unavailable: {e}")
+                if self._owner is None:
+                    self._owner_failed = True
+            return self._owner
+
+    def close(self):
+        if self._owner:
+            self._owner.close()
@@ -0,0 +1,89 @@
+"""
+Motion Coalescer - Merges pointer samples and sends only the latest position at a fixed rate
+"""
+import threading
+import time
+
+DEFAULT_SEND_RATE = 125  # Hz, used when the client refresh rate is unknown
+
+
+class MotionCoalescer:
+    """Keep only the most recent pointer position and flush it at rate_hz.
+
+    Clicks and scrolls go through barrier(), which sends any pending move
+    first so the peer sees events in the order they happened. A rate of 0
+    disables coalescing and every sample is sent immediately.
+    """
+
+    def __init__(self, send, encode_move, rate_hz=DEFAULT_SEND_RATE):
+        self._send = send
+        self._encode_move = encode_move
+        self._interval = 1.0 / rate_hz if rate_hz and rate_hz > 0 else 0.0
+        self._lock = threading.Lock()
+        self._pending = None
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+        # Counters
+        self.samples = 0   # move samples received from the listener
+        self.merged = 0    # samples replaced by a newer one before being sent
+        self.sent = 0      # move frames actually sent
+
+    def start(self):
+        if self._interval and not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def move(self, x, y):
+        """Record a new pointer sample"""
+        with self._lock:
+            self.samples += 1
+            if self._pending is not None:
+                self.merged += 1
+            self._pending = (x, y)
+            if not self._interval:
+                self._flush_locked()
+                return
+        self._wakeup.set()
+
+    def barrier(self, payload):
+        """Send payload after flushing any pending move"""
+        with self._lock:
+            self._flush_locked()
+            self._send(payload)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def discard(self):
+        """Drop the pending move without sending it (e.g. after deactivation)"""
+        with self._lock:
+            self._pending = None
+
+    def stats(self):
+        return {"samples": self.samples, "merged": self.merged, "sent": self.sent}
+
+    def _flush_locked(self):
+        if self._pending is None:
+            return
+        x, y = self._pending
+        self._pending = None
+        self.sent += 1
+        self._send(self._encode_move(x, y))
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._running:
+                break
+            self.flush()
+            # Pace flushes; samples arriving meanwhile are merged
+            time.sleep(self._interval)
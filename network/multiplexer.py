@@ -0,0 +1,226 @@
+"""
+Multiplexer - Carries the input, control and bulk channels over a single TCP connection
+"""
+import socket
+import struct
+import threading
+from collections import deque
+
+from network.stream_decoder import StreamDecoder
+
+# Logical channels; a lower number is sent first when several are waiting
+CHANNEL_INPUT = 0    # mouse
+CHANNEL_CONTROL = 1  # keyboard, active-device state, small clipboard
+CHANNEL_BULK = 2     # large clipboard payloads and files
+CHANNELS = (CHANNEL_INPUT, CHANNEL_CONTROL, CHANNEL_BULK)
+CHANNEL_NAMES = {CHANNEL_INPUT: "input", CHANNEL_CONTROL: "control", CHANNEL_BULK: "bulk"}
+
+# Bulk data is cut into chunks this size so a keystroke never waits
+# behind more than one chunk in our own queue.
+CHUNK_SIZE = 16384
+MAX_BULK_CHUNKS = 64
+# Keep the kernel send buffer modest for the same reason
+SEND_BUFFER = 128 * 1024
+
+_HEADER = struct.Struct("!BI")  # channel, payload length
+
+
+class MuxDecoder(StreamDecoder):
+    """Splits the multiplexed stream into (channel, payload) frames"""
+
+    def frames(self):
+        """Yield every complete frame currently buffered"""
+        buf = self._buffer
+        pos = self._start
+        while len(buf) - pos >= _HEADER.size:
+            channel_id, length = _HEADER.unpack_from(buf, pos)
+            end = pos + _HEADER.size + length
+            if end > len(buf):
+                break
+            payload = bytes(buf[pos + _HEADER.size:end])
+            self._start = pos = end
+            yield channel_id, payload
+        self._compact()
+
+
+class MuxChannel:
+    """Socket-like endpoint for one logical channel.
+
+    Implements the subset of the socket API used by ShareManager so the
+    existing send/receive code works unchanged on top of a multiplexer.
+    """
+
+    def __init__(self, mux, channel_id):
+        self._mux = mux
+        self.channel_id = channel_id
+        self._incoming = deque()
+        self._ready = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._timeout = None
+        self._eof = False
+
+    def __repr__(self):
+        return f"<MuxChannel {CHANNEL_NAMES.get(self.channel_id, self.channel_id)}>"
+
+    # Sending
+    def sendall(self, data):
+        with self._send_lock:
+            self._mux.send(self.channel_id, data)
+
+    # Receiving
+    def recv(self, bufsize):
+        with self._ready:
+            if not self._incoming and not self._eof:
+                if not self._ready.wait_for(lambda: self._incoming or self._eof, self._timeout):
+                    raise socket.timeout("timed out")
+            if not self._incoming:
+                return b""
+            data = self._incoming.popleft()
+            if len(data) > bufsize:
+                self._incoming.appendleft(data[bufsize:])
+                data = data[:bufsize]
+            return data
+
+    def recv_into(self, buffer, nbytes=0):
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _deliver(self, data):
+        with self._ready:
+            self._incoming.append(data)
+            self._ready.notify()
+
+    def _close_incoming(self):
+        with self._ready:
+            self._eof = True
+            self._ready.notify_all()
+
+    # Socket compatibility
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def gettimeout(self):
+        return self._timeout
+
+    def setsockopt(self, *args):
+        pass
+
+    def shutdown(self, how):
+        self._mux.close()
+
+    def close(self):
+        self._mux.close()
+
+
+class Multiplexer:
+    """Frames channel data as [channel:u8][length:u32][payload] on one socket.
+
+    A writer thread always drains higher-priority channels first; bulk
+    sends are split into CHUNK_SIZE pieces with bounded queueing so a
+    large transfer applies backpressure instead of buffering in memory.
+    """
+
+    def __init__(self, sock, initial=b""):
+        self.sock = sock
+        self.channels = {cid: MuxChannel(self, cid) for cid in CHANNELS}
+        self._queues = {cid: deque() for cid in CHANNELS}
+        self._cond = threading.Condition()
+        self._bulk_slots = threading.Semaphore(MAX_BULK_CHUNKS)
+        self._initial = initial
+        self._running = False
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        except OSError:
+            pass
+
+    def channel(self, channel_id):
+        return self.channels[channel_id]
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._writer, daemon=True).start()
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def close(self):
+        if not self._running:
+            return
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        for channel in self.channels.values():
+            channel._close_incoming()
+
+    def send(self, channel_id, data):
+        """Queue data for a channel; blocks only when the bulk queue is full"""
+        if not self._running:
+            raise ConnectionError("Multiplexer is closed")
+        view = memoryview(data)
+        if channel_id == CHANNEL_BULK:
+            for start in range(0, len(view), CHUNK_SIZE):
+                chunk = view[start:start + CHUNK_SIZE]
+                self._bulk_slots.acquire()
+                if not self._running:
+                    raise ConnectionError("Multiplexer is closed")
+                self._enqueue(channel_id, _HEADER.pack(channel_id, len(chunk)) + chunk)
+        else:
+            self._enqueue(channel_id, _HEADER.pack(channel_id, len(view)) + view)
+
+    def _enqueue(self, channel_id, frame):
+        with self._cond:
+            self._queues[channel_id].append(frame)
+            self._cond.notify()
+
+    def _next_batch(self):
+        """Collect all waiting input/control frames plus at most one bulk chunk"""
+        with self._cond:
+            while self._running and not any(self._queues.values()):
+                self._cond.wait()
+            batch = []
+            for cid in (CHANNEL_INPUT, CHANNEL_CONTROL):
+                queue = self._queues[cid]
+                while queue:
+                    batch.append(queue.popleft())
+            bulk = False
+            if not batch and self._queues[CHANNEL_BULK]:
+                batch.append(self._queues[CHANNEL_BULK].popleft())
+                bulk = True
+            return batch, bulk
+
+    def _writer(self):
+        while self._running:
+            batch, bulk = self._next_batch()
+            if bulk:
+                self._bulk_slots.release()
+            if not batch:
+                continue
+            try:
+                self.sock.sendall(b"".join(batch))
+            except Exception as e:
+                print(f"[Mux] Send failed: {e}")
+                self.close()
+                break
+        # Unblock any bulk sender waiting for queue space
+        for _ in range(MAX_BULK_CHUNKS):
+            self._bulk_slots.release()
+
+    def _reader(self):
+        decoder = MuxDecoder(initial=self._initial)
+        self._initial = b""
+        while self._running:
+            for channel_id, payload in decoder.frames():
+                channel = self.channels.get(channel_id)
+                if channel:
+                    channel._deliver(payload)
+
+            try:
+                if not decoder.fill_from(self.sock):
+                    break
+            except Exception:
+                break
+        self.close()
@@ -0,0 +1,268 @@
+"""
+Protocol - Handshake negotiation and compact binary framing for the primary (mouse) channel
+"""
+import socket
+import struct
+import threading
+import time
+
+from network.stream_decoder import StreamDecoder
+
+# Wire protocols for the primary channel
+PROTO_JSON = "json"
+PROTO_BINARY = "bin1"
+
+# Pointer motion modes (binary protocol only)
+MOTION_ABSOLUTE = "abs"
+MOTION_RELATIVE = "rel"
+RESYNC_INTERVAL = 1.0  # seconds between absolute resyncs in relative mode
+
+HELLO_PREFIX = b"HELLO"
+HELLO_TIMEOUT = 1.0
+
+# Binary frames are [length:u8][tag:u8][payload], length counting tag + payload,
+# so a peer can skip record types it does not understand.
+MSG_MOVE = 1
+MSG_CLICK = 2
+MSG_SCROLL = 3
+MSG_MOVE_REL = 4
+
+_MOVE = struct.Struct("!BBff")
+_CLICK = struct.Struct("!BBBB")
+_SCROLL = struct.Struct("!BBhh")
+
+_MOVE_BODY = struct.Struct("!ff")
+_CLICK_BODY = struct.Struct("!BB")
+_SCROLL_BODY = struct.Struct("!hh")
+
+# Button names as reported by pynput on Windows and Linux
+BUTTON_NAMES = ("unknown", "left", "middle", "right", "x1", "x2") + tuple(f"button{i}" for i in range(8, 31))
+_BUTTON_CODES = {name: code for code, name in enumerate(BUTTON_NAMES)}
+
+
+def encode_hello(**options):
+    """Build a handshake line such as b"HELLO proto=bin1\\n" """
+    parts = [HELLO_PREFIX.decode()]
+    parts.extend(f"{key}={value}" for key, value in options.items())
+    return (" ".join(parts) + "\n").encode()
+
+
+def decode_hello(line):
+    """Parse a handshake line into a dict, or None if it is not a hello"""
+    if not line or not line.startswith(HELLO_PREFIX):
+        return None
+    options = {}
+    for part in line[len(HELLO_PREFIX):].decode("utf-8", errors="ignore").split():
+        if "=" in part:
+            key, value = part.split("=", 1)
+            options[key] = value
+    return options
+
+
+def read_line(sock, timeout=HELLO_TIMEOUT, limit=1024):
+    """Read one newline-terminated line with a timeout.
+
+    Returns (line, rest) where rest holds any bytes received after the
+    newline. line is None if nothing complete arrived in time.
+    """
+    previous_timeout = sock.gettimeout()
+    sock.settimeout(timeout)
+    buffer = b""
+    try:
+        while b"\n" not in buffer and len(buffer) < limit:
+            data = sock.recv(limit)
+            if not data:
+                break
+            buffer += data
+    except socket.timeout:
+        pass
+    finally:
+        sock.settimeout(previous_timeout)
+
+    if b"\n" not in buffer:
+        return None, buffer
+    line, rest = buffer.split(b"\n", 1)
+    return line, rest
+
+
+def encode_move(x, y):
+    """Encode a normalized (0..1) pointer position"""
+    return _MOVE.pack(9, MSG_MOVE, x, y)
+
+
+def _zigzag_varint(n, out):
+    """Append n as a zigzag-encoded LEB128 varint"""
+    n = (n << 1) if n >= 0 else ((-n) << 1) - 1
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_zigzag_varint(buf, pos):
+    """Return (value, next_pos) for a zigzag varint starting at pos"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), pos
+
+
+def encode_move_rel(dx, dy):
+    """Encode an integer pixel delta in the sender's screen space"""
+    out = bytearray((0, MSG_MOVE_REL))
+    _zigzag_varint(dx, out)
+    _zigzag_varint(dy, out)
+    out[0] = len(out) - 1
+    return bytes(out)
+
+
+def encode_click(button_name, pressed):
+    return _CLICK.pack(3, MSG_CLICK, _BUTTON_CODES.get(button_name, 0), 1 if pressed else 0)
+
+
+def encode_scroll(dx, dy):
+    dx = max(-32768, min(32767, int(dx)))
+    dy = max(-32768, min(32767, int(dy)))
+    return _SCROLL.pack(5, MSG_SCROLL, dx, dy)
+
+
+class ReplyWaiter:
+    """Hands a reply read by a receive loop to the thread waiting for it, matched by "id" """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def expect(self, request_id):
+        """Register interest before sending the request, so a fast reply is not lost"""
+        with self._lock:
+            self._pending[request_id] = [threading.Event(), None]
+
+    def deliver(self, evt):
+        with self._lock:
+            slot = self._pending.get(evt.get("id"))
+        if slot:
+            slot[1] = evt
+            slot[0].set()
+
+    def wait(self, request_id, timeout):
+        """Return the reply for request_id, or None if none arrives in time"""
+        with self._lock:
+            slot = self._pending.get(request_id)
+        if slot is None:
+            return None
+        slot[0].wait(timeout)
+        with self._lock:
+            self._pending.pop(request_id, None)
+        return slot[1]
+
+
+class RelativeMotionEncoder:
+    """Turn absolute pointer positions into small integer deltas.
+
+    The first move, the first move after reset() and one move every
+    resync_interval seconds are sent as absolute positions so the peer
+    can correct any drift.
+    """
+
+    def __init__(self, width, height, resync_interval=RESYNC_INTERVAL):
+        self.width = width
+        self.height = height
+        self.resync_interval = resync_interval
+        self._last = None
+        self._last_sync = 0.0
+
+    def reset(self):
+        """Force the next move to be absolute (e.g. after a transition)"""
+        self._last = None
+
+    def encode(self, x, y):
+        x = int(round(x))
+        y = int(round(y))
+        now = time.monotonic()
+        last = self._last
+        self._last = (x, y)
+        if last is None or now - self._last_sync >= self.resync_interval:
+            self._last_sync = now
+            return encode_move(x / self.width, y / self.height)
+        return encode_move_rel(x - last[0], y - last[1])
+
+
+class PointerAccumulator:
+    """Client-side pointer position with sub-pixel precision.
+
+    Deltas arrive in the peer's pixel space and are scaled to the local
+    screen; the fractional part is kept so repeated small moves do not
+    drift the way truncating every sample does.
+    """
+
+    def __init__(self, width, height, peer_width=None, peer_height=None):
+        self.width = width
+        self.height = height
+        self.scale_x = width / peer_width if peer_width else 1.0
+        self.scale_y = height / peer_height if peer_height else 1.0
+        self.x = None
+        self.y = None
+
+    def absolute(self, norm_x, norm_y):
+        self.x = norm_x * self.width
+        self.y = norm_y * self.height
+        return int(self.x), int(self.y)
+
+    def relative(self, dx, dy):
+        if self.x is None:
+            self.x, self.y = 0.0, 0.0
+        self.x = min(max(self.x + dx * self.scale_x, 0), self.width - 1)
+        self.y = min(max(self.y + dy * self.scale_y, 0), self.height - 1)
+        return int(round(self.x)), int(round(self.y))
+
+
+class FrameDecoder(StreamDecoder):
+    """Incremental decoder for binary primary-channel frames.
+
+    feed() and events() return a list of event tuples:
+        ("move", x, y), ("move_rel", dx, dy), ("click", button_name, pressed),
+        ("scroll", dx, dy)
+    """
+
+    def feed(self, data):
+        self.append(data)
+        return self.events()
+
+    def events(self):
+        """Decode every complete frame currently buffered"""
+        buf = self._buffer
+        events = []
+        pos = self._start
+        end = len(buf)
+        while pos < end:
+            length = buf[pos]
+            if pos + 1 + length > end:
+                break
+            if length:
+                tag = buf[pos + 1]
+                if tag == MSG_MOVE:
+                    x, y = _MOVE_BODY.unpack_from(buf, pos + 2)
+                    events.append(("move", x, y))
+                elif tag == MSG_MOVE_REL:
+                    dx, next_pos = _read_zigzag_varint(buf, pos + 2)
+                    dy, _ = _read_zigzag_varint(buf, next_pos)
+                    events.append(("move_rel", dx, dy))
+                elif tag == MSG_CLICK:
+                    code, pressed = _CLICK_BODY.unpack_from(buf, pos + 2)
+                    name = BUTTON_NAMES[code] if code < len(BUTTON_NAMES) else "unknown"
+                    events.append(("click", name, bool(pressed)))
+                elif tag == MSG_SCROLL:
+                    dx, dy = _SCROLL_BODY.unpack_from(buf, pos + 2)
+                    events.append(("scroll", dx, dy))
+                # Unknown tags are skipped using the length prefix
+            pos += 1 + length
+        self._start = pos
+        self._compact()
+        return events
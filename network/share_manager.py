@@ -19,6 +19,27 @@ from utils.config import app_config
 from controllers.mouse_controller import MouseController
 from controllers.keyboard_controller import KeyboardController
 from controllers.clipboard_controller import ClipboardController
+from controllers.clipboard_watcher import ClipboardWatcher, ClipboardDedup, digest
+from controllers.clipboard_history import ClipboardHistory, REF_MIN_SIZE, history_dir
+from controllers import image_codec, keymap
+from controllers.keymap import KEYS_NUMERIC
+from network.async_engine import AsyncEngine
+from network.edge_detector import EdgeDetector
+from network.file_transfer import (
+    FileReceiver, FILE_STREAM, send_files, download_dir, clear_downloads, unique_path,
+)
+from network.keyboard_capture import KeyboardCapture
+from network.lazy_clipboard import LazyClipboard, CLIP_LAZY
+from network import chunk_pipeline, compression
+from network.chunk_store import ChunkStore, store_dir
+from network.motion_coalescer import MotionCoalescer, DEFAULT_SEND_RATE
+from network.multiplexer import Multiplexer, CHANNEL_INPUT, CHANNEL_CONTROL, CHANNEL_BULK
+from network.stream_decoder import LineDecoder
+from network.protocol import (
+    PROTO_JSON, PROTO_BINARY, MOTION_ABSOLUTE, MOTION_RELATIVE,
+    FrameDecoder, RelativeMotionEncoder, PointerAccumulator, ReplyWaiter,
+    encode_hello, decode_hello, read_line, encode_move, encode_click, encode_scroll,
+)
 
 
 class ShareManager:
@@ -26,6 +47,7 @@ class ShareManager:
         self.edge_transition_cooldown = False
         self.last_transition_time = 0
         self._transition_lock = threading.Lock()
+        self.edge_detector = None
         self.primary_port = app_config.server_primary_port
         self.secondary_port = app_config.server_secondary_port
         self.tertiary_port = app_config.server_tertiary_port
@@ -33,7 +55,11 @@ class ShareManager:
         # Controllers
         self.mouse_controller = MouseController()
         self.keyboard_controller = KeyboardController()
-        self.clipboard_controller = ClipboardController()
+        self.clipboard_controller = ClipboardController(history=ClipboardHistory(
+            app_config.clipboard_history, app_config.clipboard_history_mb * 1024 * 1024,
+            history_dir(), app_config.clipboard_history_disk_mb * 1024 * 1024))
+        self.clipboard_watcher = ClipboardWatcher(self.clipboard_controller)
+        self.clipboard_dedup = ClipboardDedup()
         
         # Network sockets
         self.server_socket = None
@@ -45,17 +71,49 @@ class ShareManager:
         self.secondary_server = None
         self.tertiary_server = None
         self.tertiary_connected = False
+        self.multiplexer = None
+        self.engine = None  # AsyncEngine when network_engine is "asyncio"
+        
+        # Primary channel wire protocol (negotiated at handshake)
+        self.primary_protocol = PROTO_JSON
+        self._primary_pending = b""
+        self.motion_mode = MOTION_ABSOLUTE
+        self.peer_refresh_rate = None
+        self.peer_screen = None
+        self.motion_coalescer = None
+        self.motion_encoder = None
+        self.pointer = None
+        
+        # Streamed file transfers (negotiated at handshake)
+        self.file_streaming = False
+        # Chunk hashes in manifests, for the receiver's chunk store (negotiated at handshake)
+        self.file_dedup = False
+        self.file_receiver = FileReceiver(self, self.chunk_store())
+        self.file_resumes = ReplyWaiter()
+        self.bulk_send_lock = threading.Lock()  # one clipboard/file send at a time
+        
+        # Announce-then-pull clipboard (negotiated at handshake)
+        self.clipboard_lazy = False
+        # Clipboards in both histories go out as clipboard_ref (negotiated at handshake)
+        self.clipboard_refs = False
+        # Key events carry keymap codes instead of key strings (negotiated at handshake)
+        self.key_codes = False
+        self.lazy_clipboard = LazyClipboard(self)
+        # Image types the peer takes as they are (negotiated at handshake); PNG is always understood
+        self.peer_image_types = {image_codec.PNG}
+        # Codec for clipboard payloads and file chunks (negotiated at handshake); None sends JSON lines as before
+        self.compression = None
         
         # Overlay
         self.overlay = None
         self.screen_width = None
         self.screen_height = None
+        self.refresh_rate = None
         self.gui_app = None
-        self.last_send = None
         
         # Listeners
-        self.keyboard_listener = None
-        self.keyboard_listener_lock = threading.Lock()
+        # Installed once (armed near the active edge), then only switched on each transition
+        self.keyboard_capture = KeyboardCapture(self._on_press, self._on_release)
         self.gtk_overlay_thread = None
         self.keyboard_socket = None
         
@@ -84,6 +142,12 @@ class ShareManager:
             self.gui_app.withdraw()
             self.screen_width = self.gui_app.winfo_screenwidth()
             self.screen_height = self.gui_app.winfo_screenheight()
+            try:
+                import win32api, win32con
+                settings = win32api.EnumDisplaySettings(None, win32con.ENUM_CURRENT_SETTINGS)
+                self.refresh_rate = settings.DisplayFrequency or None
+            except Exception:
+                pass
         elif self.os_type == "linux":
             from PyQt5.QtWidgets import QApplication, QWidget
             from PyQt5.QtCore import Qt
@@ -95,11 +159,23 @@ class ShareManager:
             geom = desktop.geometry()
             self.screen_width = geom.width()
             self.screen_height = geom.height()
+            screen = self.gui_app.primaryScreen()
+            if screen:
+                self.refresh_rate = screen.refreshRate() or None
     
     def cleanup(self):
         """Clean up all resources"""
         print("[System] Cleaning up sockets and resources...")
         
+        if self.edge_detector:
+            self.edge_detector.stop()
+        self.keyboard_capture.stop()
+        self.clipboard_watcher.stop()
+        self.lazy_clipboard.close()
+        if self.motion_coalescer:
+            self.motion_coalescer.stop()
+            logging.info(f"[Mouse] Coalescer stats: {self.motion_coalescer.stats()}")
+        
         try:
             if self.client_socket:
                 self.client_socket.shutdown(socket.SHUT_RDWR)
@@ -113,6 +189,13 @@ class ShareManager:
         except Exception as e:
             print(f"[Client] Error closing socket: {e}")
         
+        if self.multiplexer:
+            self.multiplexer.close()
+        if self.engine:
+            self.engine.stop()
+        self.file_receiver.suspend()
+        chunk_pipeline.shutdown()
+        
         try:
             if self.server_socket:
                 self.server_socket.close()
@@ -236,8 +319,23 @@ class ShareManager:
                 self.overlay = None
         except: pass
     
+    def start_edge_detection(self):
+        """Start edge detection with the configured backend ("events" or "polling")"""
+        if app_config.edge_detection != "polling":
+            try:
+                self.edge_detector = EdgeDetector(self)
+                self.edge_detector.start()
+                logging.info("[Edges] Event-driven edge detection started")
+                return
+            except Exception as e:
+                print(f"[Edges] Event backend unavailable, falling back to polling: {e}")
+                self.edge_detector = None
+        # Polling has no per-move hook to arm the keyboard capture from, so arm it now
+        self.keyboard_capture.arm()
+        threading.Thread(target=self.monitor_mouse_edges, daemon=True).start()
+    
     def monitor_mouse_edges(self):
-        """Monitor mouse edges for transitions"""
+        """Monitor mouse edges for transitions (polling fallback)"""
         margin = 2
         
         while app_config.is_running:
@@ -325,21 +423,7 @@ class ShareManager:
                 return
 
             # PRIORITY 1: Instant Keyboard Suppression (Before anything else)
-            with self.keyboard_listener_lock:
-                if self.keyboard_listener:
-                    try: self.keyboard_listener.stop()
-                    except: pass
-                    self.keyboard_listener = None
-                    time.sleep(0.05) # Give X11 a moment to release the grab
-                
-                if to_active:
-                    from pynput import keyboard
-                    self.keyboard_listener = keyboard.Listener(
-                        on_press=self._on_press,
-                        on_release=self._on_release,
-                        suppress=True
-                    )
-                    self.keyboard_listener.start()
+            self.keyboard_capture.capture(to_active)
 
             # Deduplicate
             if app_config.active_device == to_active:
@@ -347,6 +431,10 @@ class ShareManager:
 
             app_config.active_device = to_active
             app_config.save()
+            if not to_active and self.motion_coalescer:
+                self.motion_coalescer.discard()
+            if self.motion_encoder:
+                self.motion_encoder.reset()
 
             self._schedule_overlay(to_active)
             self.mouse_controller.position = new_position
@@ -359,8 +447,12 @@ class ShareManager:
                     except Exception as e:
                         print(f"[Transition] Failed to send active_device state: {e}")
             
-            # Run network send in background so the local mouse warp is instant and non-blocking
-            threading.Thread(target=send_active_state, daemon=True).start()
+            # Run network send in background so the local mouse warp is instant and non-blocking.
+            # The asyncio engine's sendall only queues, so no thread is needed there.
+            if self.engine:
+                send_active_state()
+            else:
+                threading.Thread(target=send_active_state, daemon=True).start()
 
             clip_socket = None
             if hasattr(self, 'tertiary_connected') and self.tertiary_connected:
@@ -378,14 +470,13 @@ class ShareManager:
             logging.info(f"[Clipboard] Using socket: {'Tertiary' if 'tertiary' in str(clip_socket) else 'Secondary'}")
 
             if clip_socket:
-                current_clip = self.clipboard_controller.get_clipboard()
-                if self.last_send != current_clip:
-                    self.last_send = current_clip
-                    self.clipboard_sender(clip_socket, current_clip)
+                # Cached by the watcher; reading the clipboard here would stall the transition
+                current_clip, clip_digest = self.clipboard_watcher.snapshot()
+                if self.clipboard_dedup.should_send(current_clip, clip_digest):
+                    self.clipboard_sender(clip_socket, current_clip, clip_digest)
 
             logging.info(f"[System] Device {'Activated' if to_active else 'Deactivated'} at {new_position}")
             app_config.save()
-            time.sleep(0.2)
         finally:
             self._transition_lock.release()
 
@@ -440,6 +531,8 @@ class ShareManager:
 
             # Reset cooldown and edge detection so it works instantly when toggled back on
             self.edge_transition_cooldown = False
+            if self.edge_detector:
+                self.edge_detector.configure()
 
             print(f"[Hotkey] Input sharing toggled → {app_config.input_sharing_enabled}")
             logging.info(f"[Hotkey] Input sharing toggled : {app_config.input_sharing_enabled}")
@@ -502,21 +595,40 @@ class ShareManager:
         listener.daemon = True
         listener.start()
 
-    def clipboard_sender(self, socket, clip_data=None):
+    def clipboard_sender(self, socket, clip_data=None, clip_digest=None, by_ref=True):
         """Send clipboard data, handling large files and status notifications"""
-        current_clip = clip_data if clip_data else self.clipboard_controller.get_clipboard()
+        if not clip_data:
+            clip_data, clip_digest = self.clipboard_watcher.snapshot()
+        current_clip = clip_data
         if not current_clip:
             return
             
         def perform_send():
+            with self.bulk_send_lock:
+                send_clipboard()
+
+        def send_clipboard():
+            nonlocal current_clip, clip_digest
             try:
                 # Check for files
                 if current_clip.startswith("files:"):
                     # Notify start
                     socket.sendall((json.dumps({"type": "status", "msg": "File transfer starting..."}) + "\n").encode())
                     
-                    import shutil
                     paths = base64.b64decode(current_clip.split(":", 1)[1]).decode('utf-8').splitlines()
+                    if self.file_streaming:
+                        def status(msg):
+                            socket.sendall((json.dumps({"type": "status", "msg": msg}) + "\n").encode())
+                        try:
+                            if send_files(socket, paths, status, resume=self.file_resumes, codec=self.compression,
+                                          workers=self.transfer_workers(), dedup=self.file_dedup):
+                                status("Files synced!")
+                        except Exception:
+                            self.clipboard_dedup.forget_sent() # Retry, and resume, on the next transition
+                            raise
+                        return
+                    
+                    import shutil
                     all_files_data = []
                     for p in paths:
                         p = p.strip()
@@ -563,6 +675,33 @@ class ShareManager:
                     return
 
                 # Regular clipboard
+                fmt = current_clip.split(":", 1)[0]
+                if image_codec.is_image(fmt) and image_codec.mime_of(fmt) not in self.peer_image_types:
+                    # Older peers only know PNG
+                    raw = base64.b64decode(current_clip.split(":", 1)[1])
+                    current_clip = image_codec.encode(
+                        self.clipboard_controller.image_transcoder.convert(raw, image_codec.mime_of(fmt), image_codec.PNG),
+                        image_codec.PNG)
+                    clip_digest = None
+
+                clip_digest = clip_digest or digest(current_clip)
+                history = self.clipboard_controller.history
+                known = history.has(clip_digest)
+                history.add(current_clip, clip_digest)
+
+                if self.clipboard_lazy and LazyClipboard.wants(current_clip):
+                    # Only a descriptor; the peer asks for the data when something is pasted
+                    offer = self.lazy_clipboard.announce(current_clip, clip_digest)
+                    socket.sendall((json.dumps(offer) + "\n").encode())
+                    logging.info(f"[Clipboard] Offered {offer['format']} ({offer['size']} bytes)")
+                    return
+
+                if by_ref and known and self.clipboard_refs and len(current_clip) >= REF_MIN_SIZE:
+                    # Sent or received before, so the peer can take it from its own history
+                    socket.sendall((json.dumps({"type": "clipboard_ref", "id": clip_digest}) + "\n").encode())
+                    logging.info(f"[Clipboard] Sent reference to a history entry ({len(current_clip)} bytes)")
+                    return
+                
                 is_large = len(current_clip) > 100000 # 100KB+
                 if is_large:
                     try:
@@ -571,7 +710,8 @@ class ShareManager:
 
                 data = {"type": "clipboard", "content": current_clip}
                 try:
-                    socket.sendall((json.dumps(data) + "\n").encode())
+                    for part in self.clipboard_frames(data):
+                        socket.sendall(part)
                     if is_large:
                         socket.sendall((json.dumps({"type": "status", "msg": "Clipboard synced!"}) + "\n").encode())
                     logging.info("[Clipboard] Sent clipboard data successfully")
@@ -583,33 +723,93 @@ class ShareManager:
         # Always run in a separate thread to prevent blocking transition thread/GUI
         threading.Thread(target=perform_send, daemon=True).start()
     
+    def chunk_store_bytes(self):
+        try:
+            return max(0, int(app_config.chunk_store_mb)) * 1024 * 1024
+        except (TypeError, ValueError):
+            return 0
+
+    def chunk_store(self):
+        """Store for received file chunks, or None when chunk_store_mb is 0"""
+        size = self.chunk_store_bytes()
+        return ChunkStore(store_dir(), size) if size else None
+
+    def transfer_workers(self):
+        """Resolve the configured chunk worker process count"""
+        workers = app_config.transfer_workers
+        if workers in (None, "auto"):
+            return os.cpu_count() or 1
+        try:
+            return max(1, int(workers))
+        except (TypeError, ValueError):
+            return 1
+
+    def mouse_send_rate(self):
+        """Resolve the configured move send rate in Hz (0 disables coalescing)"""
+        rate = app_config.mouse_send_rate
+        if rate in (None, "auto"):
+            return self.peer_refresh_rate or DEFAULT_SEND_RATE
+        try:
+            return max(0.0, float(rate))
+        except (TypeError, ValueError):
+            return DEFAULT_SEND_RATE
+    
     def send_mouse_events(self, socket):
         """Send mouse events from server"""
-        def send_json(data):
+        binary = self.primary_protocol == PROTO_BINARY
+        
+        def send_raw(payload):
             try:
-                socket.sendall((json.dumps(data) + "\n").encode())
+                socket.sendall(payload)
             except Exception as e:
                 app_config.is_running = False
                 app_config.save()
                 print(f"[Server] Send failed: {e}")
         
+        def json_frame(data):
+            return (json.dumps(data) + "\n").encode()
+        
+        def encode_json_move(x, y):
+            return json_frame({"type": "move", "x": x / self.screen_width, "y": y / self.screen_height})
+        
+        def encode_abs_move(x, y):
+            return encode_move(x / self.screen_width, y / self.screen_height)
+        
+        if not binary:
+            encode_pointer = encode_json_move
+        elif self.motion_mode == MOTION_RELATIVE:
+            self.motion_encoder = RelativeMotionEncoder(self.screen_width, self.screen_height)
+            encode_pointer = self.motion_encoder.encode
+        else:
+            encode_pointer = encode_abs_move
+        
+        rate = self.mouse_send_rate()
+        self.motion_coalescer = MotionCoalescer(send_raw, encode_pointer, rate)
+        self.motion_coalescer.start()
+        logging.info(f"[Mouse] Move send rate: {rate or 'unlimited'} Hz")
+        coalescer = self.motion_coalescer
+        
         def on_move(x, y):
             if not app_config.active_device:
                 return
-            norm_x = x / self.screen_width
-            norm_y = y / self.screen_height
-            send_json({"type": "move", "x": norm_x, "y": norm_y})
+            coalescer.move(x, y)
         
         def on_click(x, y, button, pressed):
             if not app_config.active_device:
                 return
             btn_name = button.name if hasattr(button, 'name') else str(button)
-            send_json({"type": "click", "button": btn_name, "pressed": pressed})
+            if binary:
+                coalescer.barrier(encode_click(btn_name, pressed))
+            else:
+                coalescer.barrier(json_frame({"type": "click", "button": btn_name, "pressed": pressed}))
         
         def on_scroll(x, y, dx, dy):
             if not app_config.active_device:
                 return
-            send_json({"type": "scroll", "dx": dx, "dy": dy})
+            if binary:
+                coalescer.barrier(encode_scroll(dx, dy))
+            else:
+                coalescer.barrier(json_frame({"type": "scroll", "dx": dx, "dy": dy}))
         
         mouse.Listener(on_move=on_move, on_click=on_click, on_scroll=on_scroll).start()
     
@@ -617,11 +817,15 @@ class ShareManager:
         if not app_config.active_device or not self.keyboard_socket:
             return
         try:
-            if hasattr(key, 'char') and key.char is not None:
-                val = key.char
+            code = keymap.encode(key) if self.key_codes else None
+            if code is not None:
+                msg = f'{{"type": "key_press", "code": {code}}}\n'
             else:
-                val = str(key)
-            msg = json.dumps({"type": "key_press", "key": val}) + "\n"
+                if hasattr(key, 'char') and key.char is not None:
+                    val = key.char
+                else:
+                    val = str(key)
+                msg = json.dumps({"type": "key_press", "key": val}) + "\n"
             self.keyboard_socket.sendall(msg.encode())
         except: pass
 
@@ -629,8 +833,12 @@ class ShareManager:
         if not app_config.active_device or not self.keyboard_socket:
             return
         try:
-            val = key.char if hasattr(key, 'char') and key.char else str(key)
-            msg = json.dumps({"type": "key_release", "key": val}) + "\n"
+            code = keymap.encode(key) if self.key_codes else None
+            if code is not None:
+                msg = f'{{"type": "key_release", "code": {code}}}\n'
+            else:
+                val = key.char if hasattr(key, 'char') and key.char else str(key)
+                msg = json.dumps({"type": "key_release", "key": val}) + "\n"
             self.keyboard_socket.sendall(msg.encode())
         except: pass
 
@@ -672,12 +880,81 @@ class ShareManager:
         client.sendall(b'CONNECTED\n')
         print("[Server] Primary handshake sent")
         logging.info("[Connection] Primary handshake sent")
-        threading.Thread(target=self.monitor_mouse_edges, daemon=True).start()
+        self.primary_protocol = self.negotiate_primary_server(client)
+        logging.info(f"[Connection] Primary protocol: {self.primary_protocol}")
+        
+        if self.multiplexer:
+            # One connection carries all three channels; the other ports stay idle
+            print("[Server] Multiplexed connection established")
+            logging.info("[Connection] Multiplexed connection established")
+            self.multiplexer.start()
+            client = self.multiplexer.channel(CHANNEL_INPUT)
+            self.setup_secondary(self.multiplexer.channel(CHANNEL_CONTROL), addr)
+            self.setup_tertiary(self.multiplexer.channel(CHANNEL_BULK), addr)
+        
+        self.start_edge_detection()
         threading.Thread(target=lambda: self.send_mouse_events(client), daemon=True).start()
     
+    def negotiate_primary_server(self, client):
+        """Wait briefly for the client hello. Old clients never send one and get JSON."""
+        line, _ = read_line(client)
+        hello = decode_hello(line)
+        if hello is None:
+            return PROTO_JSON
+        proto, options = self.server_hello_options(hello)
+        client.sendall(encode_hello(**options))
+        if "mux" in options:
+            self.multiplexer = Multiplexer(client)
+        return proto
+    
+    def server_hello_options(self, hello, allow_mux=True):
+        """Pick the session options for a client hello; returns (proto, reply options)"""
+        try:
+            self.peer_refresh_rate = float(hello["refresh"]) or None
+        except (KeyError, ValueError):
+            self.peer_refresh_rate = None
+        proto = PROTO_JSON
+        if hello.get("proto") == PROTO_BINARY and app_config.mouse_protocol != PROTO_JSON:
+            proto = PROTO_BINARY
+        
+        options = {"proto": proto}
+        if proto == PROTO_BINARY:
+            self.motion_mode = MOTION_ABSOLUTE
+            if app_config.mouse_motion_mode == "relative" and MOTION_RELATIVE in hello.get("motion", "").split(","):
+                self.motion_mode = MOTION_RELATIVE
+            options["motion"] = self.motion_mode
+            options["screen"] = f"{self.screen_width}x{self.screen_height}"
+        if allow_mux and hello.get("mux") == "1" and app_config.connection_mode != "multi_port":
+            options["mux"] = "1"
+        self.file_streaming = hello.get("files") == FILE_STREAM
+        if self.file_streaming:
+            options["files"] = FILE_STREAM
+        self.file_dedup = self.file_streaming and hello.get("dedup") == "1" and bool(self.chunk_store_bytes())
+        if self.file_dedup:
+            options["dedup"] = "1"
+        self.clipboard_lazy = hello.get("clip") == CLIP_LAZY and app_config.clipboard_transfer != "push"
+        if self.clipboard_lazy:
+            options["clip"] = CLIP_LAZY
+        self.clipboard_refs = hello.get("hist") == "1" and bool(app_config.clipboard_history)
+        if self.clipboard_refs:
+            options["hist"] = "1"
+        self.key_codes = hello.get("keys") == KEYS_NUMERIC
+        if self.key_codes:
+            options["keys"] = KEYS_NUMERIC
+        self.peer_image_types = image_codec.hello_types(hello.get("img"))
+        options["img"] = image_codec.HELLO_IMAGE_TYPES
+        self.compression = compression.negotiate(hello.get("comp")) if app_config.compression != "off" else None
+        if self.compression:
+            options["comp"] = self.compression
+        return proto, options
+    
     def accept_secondary(self):
         """Accept secondary connection (keyboard, clipboard)"""
         sec_socket, sec_addr = self.secondary_server_socket.accept()
+        self.setup_secondary(sec_socket, sec_addr)
+    
+    def setup_secondary(self, sec_socket, sec_addr):
+        """Start keyboard/clipboard handling on a secondary socket or channel"""
         sec_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         sec_socket.settimeout(1.0) # Prevent transition hangs
         print(f"[Server] Secondary connection from: {sec_addr}")
@@ -689,19 +966,16 @@ class ShareManager:
         
         # Read clipboard from client
         def read_clipboard():
-            buffer = b""
+            decoder = LineDecoder()
             while app_config.is_running:
                 try:
-                    data = self.secondary_server.recv(4096)
-                    if not data:
+                    if not decoder.fill_from(self.secondary_server):
                         break
                     
-                    buffer += data
-                    while b"\n" in buffer:
-                        line_bytes, buffer = buffer.split(b"\n", 1)
+                    for line_bytes in decoder.lines():
                         try:
                             line = line_bytes.decode('utf-8')
-                            self.handle_incoming_large_event(line, self.secondary_server)
+                            self.handle_incoming_large_event(line, self.secondary_server, decoder)
                         except (json.JSONDecodeError, UnicodeDecodeError):
                             pass
                 except socket.timeout:
@@ -715,6 +989,10 @@ class ShareManager:
     def accept_tertiary(self):
         """Accept tertiary connection (large data)"""
         ter_socket, ter_addr = self.tertiary_server_socket.accept()
+        self.setup_tertiary(ter_socket, ter_addr)
+    
+    def setup_tertiary(self, ter_socket, ter_addr):
+        """Start large data handling on a tertiary socket or channel"""
         ter_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         ter_socket.settimeout(1.0) # Prevent transition hangs
         print(f"[Server] Tertiary connection from: {ter_addr}")
@@ -722,32 +1000,63 @@ class ShareManager:
         self.tertiary_connected = True
         
         def read_large_data():
-            buffer = b""
+            decoder = LineDecoder()
             while app_config.is_running:
                 try:
-                    data = self.tertiary_server.recv(16384)
-                    if not data: break
-                    buffer += data
-                    while b"\n" in buffer:
-                        line_bytes, buffer = buffer.split(b"\n", 1)
+                    if not decoder.fill_from(self.tertiary_server): break
+                    for line_bytes in decoder.lines():
                         try:
                             line = line_bytes.decode('utf-8')
-                            self.handle_incoming_large_event(line, self.tertiary_server)
+                            self.handle_incoming_large_event(line, self.tertiary_server, decoder)
                         except UnicodeDecodeError:
                             pass
+                except socket.timeout:
+                    continue # Idle; the 1s timeout only exists to keep sends from hanging
                 except Exception as e:
                     print(f"[Tertiary] Error: {e}")
                     break
         threading.Thread(target=read_large_data, daemon=True).start()
 
-    def handle_incoming_large_event(self, line, socket_to_reply):
+    def handle_incoming_large_event(self, line, socket_to_reply, decoder=None):
         try:
             evt = json.loads(line)
-            if evt["type"] == "clipboard":
-                local_clip = self.clipboard_controller.get_clipboard()
-                if evt["content"] != local_clip:
-                    self.clipboard_controller.set_clipboard(evt["content"])
-                    self.last_send = evt["content"]
+        except ValueError as e:
+            print(f"[Event Handler] Error: {e}")
+            return
+        self.handle_incoming_message(evt, socket_to_reply, decoder)
+
+    def handle_incoming_message(self, evt, socket_to_reply, decoder=None):
+        try:
+            if evt["type"] in ("file_chunk", "packed") and decoder is None:
+                print(f"[Event Handler] {evt['type']} received on a connection that cannot carry raw payloads")
+            elif evt["type"] == "packed":
+                # Raw clipboard payload follows; handled as the original message once complete
+                unpacker = compression.Unpacker(evt, lambda msg: self.handle_incoming_message(msg, socket_to_reply))
+                decoder.expect_raw(int(evt["size"]), unpacker.feed)
+            elif evt["type"] in ("file_manifest", "file_chunk", "file_end"):
+                self.file_receiver.handle(evt, decoder, lambda data: self.send_bulk_message(socket_to_reply, data))
+            elif evt["type"] == "file_resume":
+                self.file_resumes.deliver(evt)
+            elif evt["type"] == "clipboard":
+                self.apply_clipboard(evt["content"])
+            elif evt["type"] == "clipboard_ref":
+                content = self.clipboard_controller.history.get(evt["id"])
+                if content is None:
+                    # Dropped from our history; the sender follows up with the data
+                    self.send_bulk_message(socket_to_reply, {"type": "clipboard_miss", "id": evt["id"]})
+                else:
+                    self.apply_clipboard(content)
+            elif evt["type"] == "clipboard_miss":
+                content = self.clipboard_controller.history.get(evt["id"])
+                if content is not None:
+                    self.clipboard_sender(socket_to_reply, content, evt["id"], by_ref=False)
+            elif evt["type"] == "clipboard_offer":
+                if evt["id"] != self.clipboard_watcher.snapshot()[1]:
+                    self.lazy_clipboard.receive_offer(evt, socket_to_reply)
+            elif evt["type"] == "clipboard_request":
+                self.lazy_clipboard.serve(evt, socket_to_reply)
+            elif evt["type"] == "clipboard_data":
+                self.lazy_clipboard.deliver(evt)
             elif evt["type"] == "file_transfer":
                 self.handle_file_transfer(evt["files"])
             elif evt["type"] == "status":
@@ -757,67 +1066,76 @@ class ShareManager:
         except Exception as e:
             print(f"[Event Handler] Error: {e}")
 
+    def apply_clipboard(self, content):
+        """Set clipboard content received from the peer"""
+        local_clip, local_digest = self.clipboard_watcher.snapshot()
+        self.clipboard_controller.history.add(content)
+        if self.clipboard_dedup.record_received(content, local_clip, local_digest):
+            self.clipboard_controller.set_clipboard(content)
+            self.clipboard_watcher.update(content)
+    
     def handle_file_transfer(self, files_list):
-        """Handle incoming files from a transfer"""
+        """Handle incoming files from a legacy (single JSON line) transfer"""
         try:
-            download_path = os.path.join(os.path.expanduser("~"), "Portal", "Downloads")
+            download_path = download_dir()
             
             # Clear existing files in Downloads folder before each new transfer
-            if os.path.exists(download_path):
-                import shutil
-                try:
-                    for filename in os.listdir(download_path):
-                        file_path = os.path.join(download_path, filename)
-                        try:
-                            if os.path.isfile(file_path) or os.path.islink(file_path):
-                                os.unlink(file_path)
-                            elif os.path.isdir(file_path):
-                                shutil.rmtree(file_path)
-                        except Exception as e:
-                            print(f"[Cleanup] Failed to delete {file_path}: {e}")
-                except Exception as e:
-                    print(f"[Cleanup] Error clearing directory: {e}")
-
+            clear_downloads(download_path)
             os.makedirs(download_path, exist_ok=True)
             
             saved_paths = []
             for f in files_list:
                 name = f["name"]
                 content = base64.b64decode(f["data"])
-                target = os.path.join(download_path, name)
-                
-                # Handle duplicates
-                base, ext = os.path.splitext(target)
-                counter = 1
-                while os.path.exists(target):
-                    target = f"{base}_{counter}{ext}"
-                    counter += 1
+                target = unique_path(os.path.join(download_path, name))
                 
                 with open(target, "wb") as out:
                     out.write(content)
                 saved_paths.append(target)
             
-            if saved_paths:
-                # Set clipboard to the newly saved local paths
-                encoded = base64.b64encode("\n".join(saved_paths).encode('utf-8')).decode('utf-8')
-                self.clipboard_controller.set_clipboard(f"files:{encoded}")
-                self.last_send = f"files:{encoded}"
-                msg = f"Received {len(saved_paths)} files to Portal/Downloads"
-                print(f"[Files] {msg}")
-                logging.info(f"[Remote Status] {msg}")
-                
-                # Notify the sender that we got the files
-                socket_to_notify = self.tertiary_server if app_config.mode == "server" else self.tertiary_client_socket
-                if not socket_to_notify:
-                    socket_to_notify = self.secondary_server if app_config.mode == "server" else self.secondary_client_socket
-                
-                if socket_to_notify:
-                    try:
-                        socket_to_notify.sendall((json.dumps({"type": "status", "msg": f"Success: Target got {len(saved_paths)} files!"}) + "\n").encode())
-                    except: pass
+            self.files_received(saved_paths)
         except Exception as e:
             print(f"[Files] Receipt failed: {e}")
     
+    def files_received(self, saved_paths):
+        """Point the clipboard at newly saved files and tell the sender"""
+        if not saved_paths:
+            return
+        # Set clipboard to the newly saved local paths
+        encoded = base64.b64encode("\n".join(saved_paths).encode('utf-8')).decode('utf-8')
+        self.clipboard_controller.set_clipboard(f"files:{encoded}")
+        self.clipboard_watcher.update(f"files:{encoded}")
+        self.clipboard_dedup.record_received(f"files:{encoded}")
+        msg = f"Received {len(saved_paths)} files to Portal/Downloads"
+        print(f"[Files] {msg}")
+        logging.info(f"[Remote Status] {msg}")
+        
+        # Notify the sender that we got the files
+        socket_to_notify = self.tertiary_server if app_config.mode == "server" else self.tertiary_client_socket
+        if not socket_to_notify:
+            socket_to_notify = self.secondary_server if app_config.mode == "server" else self.secondary_client_socket
+        
+        if socket_to_notify:
+            self.send_bulk_message(socket_to_notify, {"type": "status", "msg": f"Success: Target got {len(saved_paths)} files!"})
+    
+    def send_bulk_message(self, sock, data):
+        """Send one message from a receive loop without blocking it"""
+        def send():
+            # Never interleave with a transfer of our own on the same connection
+            with self.bulk_send_lock:
+                try:
+                    for part in self.clipboard_frames(data):
+                        sock.sendall(part)
+                except: pass
+        threading.Thread(target=send, daemon=True).start()
+
+    def clipboard_frames(self, data):
+        """Wire frames for a message; large clipboard content goes out packed when negotiated"""
+        content = data.get("content")
+        if self.compression and isinstance(content, str) and len(content) >= compression.MIN_SIZE and ":" in content:
+            return compression.pack_clipboard(data, self.compression)
+        return [(json.dumps(data) + "\n").encode()]
+    
     # Client functions
     def start_client(self):
         """Start client mode"""
@@ -848,6 +1166,24 @@ class ShareManager:
         
         print("[Client] Primary Connected")
         logging.info("[Connection] Primary Connected")
+        self.primary_protocol = self.negotiate_primary_client()
+        logging.info(f"[Connection] Primary protocol: {self.primary_protocol}")
+        
+        if self.multiplexer:
+            # Server accepted a single multiplexed connection; skip the other ports
+            self.secondary_client_socket.close()
+            self.tertiary_client_socket.close()
+            self.multiplexer.start()
+            self.client_socket = self.multiplexer.channel(CHANNEL_INPUT)
+            self.secondary_client_socket = self.multiplexer.channel(CHANNEL_CONTROL)
+            self.tertiary_client_socket = self.multiplexer.channel(CHANNEL_BULK)
+            self.tertiary_connected = True
+            print("[Client] Multiplexed connection established")
+            logging.info("[Connection] Multiplexed connection established")
+            threading.Thread(target=self.receive_primary, daemon=True).start()
+            threading.Thread(target=self.receive_secondary, daemon=True).start()
+            threading.Thread(target=self.receive_tertiary, daemon=True).start()
+            return
         
         # Connect secondary
         for i in range(10, -1, -1):
@@ -882,132 +1218,238 @@ class ShareManager:
         threading.Thread(target=self.receive_secondary, daemon=True).start()
         threading.Thread(target=self.receive_tertiary, daemon=True).start()
     
+    def negotiate_primary_client(self):
+        """Offer our preferred primary protocol. Old servers never answer and keep JSON."""
+        self.client_socket.sendall(encode_hello(**self.client_hello_options()))
+        line, rest = read_line(self.client_socket)
+        hello = decode_hello(line)
+        if hello is None:
+            # Anything an old server already sent is JSON mouse data
+            self._primary_pending = rest if line is None else line + b"\n" + rest
+            return PROTO_JSON
+        self._primary_pending = rest
+        if hello.get("mux") == "1":
+            # Bytes after the hello are already multiplexed frames
+            self.multiplexer = Multiplexer(self.client_socket, initial=rest)
+            self._primary_pending = b""
+        return self.apply_server_hello(hello)
+    
+    def client_hello_options(self, allow_mux=True):
+        """Options the client offers in its hello"""
+        wanted = PROTO_JSON if app_config.mouse_protocol == PROTO_JSON else PROTO_BINARY
+        options = {"proto": wanted, "motion": f"{MOTION_ABSOLUTE},{MOTION_RELATIVE}"}
+        if self.refresh_rate:
+            options["refresh"] = f"{self.refresh_rate:g}"
+        if allow_mux and app_config.connection_mode != "multi_port":
+            options["mux"] = "1"
+        options["files"] = FILE_STREAM
+        if self.chunk_store_bytes():
+            options["dedup"] = "1"
+        if app_config.clipboard_transfer != "push":
+            options["clip"] = CLIP_LAZY
+        if app_config.clipboard_history:
+            options["hist"] = "1"
+        options["keys"] = KEYS_NUMERIC
+        options["img"] = image_codec.HELLO_IMAGE_TYPES
+        if app_config.compression != "off":
+            options["comp"] = compression.available()
+        return options
+    
+    def apply_server_hello(self, hello):
+        """Adopt the options chosen by the server; returns the primary protocol"""
+        self.motion_mode = hello.get("motion", MOTION_ABSOLUTE)
+        try:
+            width, height = hello["screen"].split("x", 1)
+            self.peer_screen = (int(width), int(height))
+        except (KeyError, ValueError):
+            self.peer_screen = None
+        self.file_streaming = hello.get("files") == FILE_STREAM
+        self.file_dedup = self.file_streaming and hello.get("dedup") == "1"
+        self.clipboard_lazy = hello.get("clip") == CLIP_LAZY
+        self.clipboard_refs = hello.get("hist") == "1"
+        self.key_codes = hello.get("keys") == KEYS_NUMERIC
+        self.peer_image_types = image_codec.hello_types(hello.get("img"))
+        self.compression = compression.negotiate(hello.get("comp"))
+        return hello.get("proto", PROTO_JSON)
+    
+    def apply_mouse_event(self, kind, a, b):
+        """Inject one decoded mouse event"""
+        if kind == "move_rel":
+            if self.pointer.x is None:
+                self.pointer.x, self.pointer.y = self.mouse_controller.position
+            self.mouse_controller.position = self.pointer.relative(a, b)
+        elif kind == "move":
+            self.mouse_controller.position = self.pointer.absolute(a, b)
+        elif kind == "click":
+            btn = getattr(Button, a)
+            if b:
+                self.mouse_controller.press(btn)
+            else:
+                self.mouse_controller.release(btn)
+        elif kind == "scroll":
+            self.mouse_controller.scroll(a, b)
+    
+    def handle_primary_line(self, line_bytes):
+        """Inject one JSON mouse event line"""
+        try:
+            evt = json.loads(line_bytes.decode('utf-8'))
+            if evt["type"] == "move":
+                self.apply_mouse_event("move", evt["x"], evt["y"])
+            elif evt["type"] == "click":
+                self.apply_mouse_event("click", evt["button"], evt["pressed"])
+            elif evt["type"] == "scroll":
+                self.apply_mouse_event("scroll", evt["dx"], evt["dy"])
+        except Exception as e:
+            pass # Noise
+    
+    def reset_pointer(self):
+        """Create the client pointer accumulator for the negotiated session"""
+        peer_width, peer_height = self.peer_screen or (None, None)
+        self.pointer = PointerAccumulator(self.screen_width, self.screen_height, peer_width, peer_height)
+    
     def receive_primary(self):
         """Receive mouse events"""
-        buffer = b""
+        self.reset_pointer()
+        if self.primary_protocol == PROTO_BINARY:
+            self.receive_primary_binary()
+            return
+        
+        decoder = LineDecoder(4096, self._primary_pending)
         while app_config.is_running:
+            with self.mouse_controller.batch():
+                for line_bytes in decoder.lines():
+                    self.handle_primary_line(line_bytes)
+            
             try:
-                data = self.client_socket.recv(4096)
+                if not decoder.fill_from(self.client_socket):
+                    break
             except Exception:
                 break
+    
+    def receive_primary_binary(self):
+        """Receive mouse events as binary frames"""
+        decoder = FrameDecoder(4096, self._primary_pending)
+        while app_config.is_running:
+            # Everything decoded from one receive reaches the X server in one flush
+            with self.mouse_controller.batch():
+                for kind, a, b in decoder.events():
+                    try:
+                        self.apply_mouse_event(kind, a, b)
+                    except Exception:
+                        pass # Noise
             
-            if not data:
+            try:
+                if not decoder.fill_from(self.client_socket):
+                    break
+            except Exception:
                 break
-            
-            buffer += data
-            while b"\n" in buffer:
-                line_bytes, buffer = buffer.split(b"\n", 1)
-                try:
-                    line = line_bytes.decode('utf-8')
-                    evt = json.loads(line)
-                    if evt["type"] == "move":
-                        x = int(evt["x"] * self.screen_width)
-                        y = int(evt["y"] * self.screen_height)
-                        self.mouse_controller.position = (x, y)
-                    elif evt["type"] == "click":
-                        btn = getattr(Button, evt['button'])
-                        if evt['pressed']:
-                            self.mouse_controller.press(btn)
-                        else:
-                            self.mouse_controller.release(btn)
-                    elif evt["type"] == "scroll":
-                        self.mouse_controller.scroll(evt['dx'], evt['dy'])
-                except Exception as e:
-                    pass # Noise
+    
+    def _parse_key(self, key_str):
+        if key_str.startswith("Key."):
+            from pynput.keyboard import Key
+            try:
+                # Extract key name and convert to lowercase (pynput Key attributes are lowercase)
+                key_name = key_str.split(".", 1)[1].lower()
+                return getattr(Key, key_name)
+            except AttributeError:
+                # If direct lookup fails, return the normalized string and let KeyboardController handle it
+                return key_str.split(".", 1)[1].lower()
+        # For regular characters, preserve case (single char) or normalize special strings
+        if isinstance(key_str, str):
+            if len(key_str) == 1:
+                return key_str  # Preserve case for single characters
+            return key_str.lower()  # Normalize multi-character strings to lowercase
+        return key_str
+    
+    def handle_secondary_event(self, line, decoder=None):
+        """Handle one keyboard/control/clipboard line received by the client"""
+        try:
+            evt = json.loads(line)
+            if evt["type"] in ("key_press", "key_release") and "code" in evt:
+                code = int(evt["code"])
+                if keymap.is_special(code):
+                    if evt["type"] == "key_press":
+                        self.keyboard_controller.press(code)
+                    else:
+                        self.keyboard_controller.release(code)
+                elif evt["type"] == "key_press":
+                    # Regular character - use tap for better compatibility in secure contexts
+                    self.keyboard_controller.tap(code)
+            elif evt["type"] == "key_press":
+                key_str = evt["key"]
+                if isinstance(key_str, str):
+                    if key_str.startswith("Key."):
+                        # Special key like Key.enter, Key.shift, etc.
+                        key = self._parse_key(key_str)
+                        if key:
+                            self.keyboard_controller.press(key)
+                    else:
+                        # Regular character - use tap for better compatibility in secure contexts
+                        self.keyboard_controller.tap(key_str)
+                else:
+                    self.keyboard_controller.press(key_str)
+            elif evt["type"] == "key_release":
+                key_str = evt["key"]
+                if isinstance(key_str, str):
+                    if key_str.startswith("Key."):
+                        # Special key
+                        key = self._parse_key(key_str)
+                        if key:
+                            self.keyboard_controller.release(key)
+                    # Regular characters don't need explicit release when using tap
+                else:
+                    self.keyboard_controller.release(key_str)
+            elif evt["type"] == "active_device":
+                print(f"[Client] Active device state sync: {evt['value']}")
+                app_config.active_device = evt["value"]
+                app_config.save()
+                if not app_config.active_device:
+                    current_clip, clip_digest = self.clipboard_watcher.snapshot()
+                    if self.clipboard_dedup.should_send(current_clip, clip_digest):
+                        # Send large stuff over tertiary if available
+                        target = self.tertiary_client_socket if self.tertiary_client_socket else self.secondary_client_socket
+                        self.clipboard_sender(target, current_clip, clip_digest)
+            elif evt["type"] in ("clipboard", "clipboard_ref", "clipboard_miss", "clipboard_offer", "clipboard_request",
+                                 "clipboard_data", "packed", "file_manifest", "file_chunk", "file_end", "file_resume"):
+                self.handle_incoming_large_event(line, self.secondary_client_socket, decoder)
+            elif evt["type"] == "status":
+                print(f"[Status] {evt['msg']}")
+                logging.info(f"[Remote Status] {evt['msg']}")
+            elif evt["type"] == "file_transfer":
+                self.handle_file_transfer(evt["files"])
+        except Exception as e:
+            print(f"[Client] Parse error: {e}")
     
     def receive_secondary(self):
         """Receive keyboard events and clipboard"""
-        def parse_key(key_str):
-            if key_str.startswith("Key."):
-                from pynput.keyboard import Key
-                try:
-                    # Extract key name and convert to lowercase (pynput Key attributes are lowercase)
-                    key_name = key_str.split(".", 1)[1].lower()
-                    return getattr(Key, key_name)
-                except AttributeError:
-                    # If direct lookup fails, return the normalized string and let KeyboardController handle it
-                    return key_str.split(".", 1)[1].lower()
-            # For regular characters, preserve case (single char) or normalize special strings
-            if isinstance(key_str, str):
-                if len(key_str) == 1:
-                    return key_str  # Preserve case for single characters
-                return key_str.lower()  # Normalize multi-character strings to lowercase
-            return key_str
-        
-        buffer = b""
+        decoder = LineDecoder()
         while app_config.is_running:
             try:
-                data = self.secondary_client_socket.recv(4096)
+                if not decoder.fill_from(self.secondary_client_socket):
+                    break
             except Exception:
                 break
             
-            if not data:
-                break
-            
-            buffer += data
-            while b"\n" in buffer:
-                line_bytes, buffer = buffer.split(b"\n", 1)
-                try:
-                    line = line_bytes.decode('utf-8')
-                    evt = json.loads(line)
-                    if evt["type"] == "key_press":
-                        key_str = evt["key"]
-                        if isinstance(key_str, str):
-                            if key_str.startswith("Key."):
-                                # Special key like Key.enter, Key.shift, etc.
-                                key = parse_key(key_str)
-                                if key:
-                                    self.keyboard_controller.press(key)
-                            else:
-                                # Regular character - use tap for better compatibility in secure contexts
-                                self.keyboard_controller.tap(key_str)
-                        else:
-                            self.keyboard_controller.press(key_str)
-                    elif evt["type"] == "key_release":
-                        key_str = evt["key"]
-                        if isinstance(key_str, str):
-                            if key_str.startswith("Key."):
-                                # Special key
-                                key = parse_key(key_str)
-                                if key:
-                                    self.keyboard_controller.release(key)
-                            # Regular characters don't need explicit release when using tap
-                        else:
-                            self.keyboard_controller.release(key_str)
-                    elif evt["type"] == "active_device":
-                        print(f"[Client] Active device state sync: {evt['value']}")
-                        app_config.active_device = evt["value"]
-                        app_config.save()
-                        if not app_config.active_device:
-                            current_clip = self.clipboard_controller.get_clipboard()
-                            if self.last_send != current_clip:
-                                self.last_send = current_clip
-                                # Send large stuff over tertiary if available
-                                target = self.tertiary_client_socket if self.tertiary_client_socket else self.secondary_client_socket
-                                self.clipboard_sender(target, current_clip)
-                    elif evt["type"] == "clipboard":
-                        self.handle_incoming_large_event(line, self.secondary_client_socket)
-                    elif evt["type"] == "status":
-                        print(f"[Status] {evt['msg']}")
-                        logging.info(f"[Remote Status] {evt['msg']}")
-                    elif evt["type"] == "file_transfer":
-                        self.handle_file_transfer(evt["files"])
-                except Exception as e:
-                    print(f"[Client] Parse error: {e}")
+            # Keys typed in a burst (or committed by an IME) go out to the injector together
+            with self.keyboard_controller.batch():
+                for line_bytes in decoder.lines():
+                    try:
+                        line = line_bytes.decode('utf-8')
+                    except UnicodeDecodeError as e:
+                        print(f"[Client] Parse error: {e}")
+                        continue
+                    self.handle_secondary_event(line, decoder)
 
     def receive_tertiary(self):
         """Receive large data events (images, files)"""
-        buffer = b""
+        decoder = LineDecoder()
         while app_config.is_running:
             try:
-                data = self.tertiary_client_socket.recv(16384)
-                if not data: break
-                buffer += data
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
+                if not decoder.fill_from(self.tertiary_client_socket): break
+                for line_bytes in decoder.lines():
                     try:
                         line = line_bytes.decode('utf-8')
-                        self.handle_incoming_large_event(line, self.tertiary_client_socket)
+                        self.handle_incoming_large_event(line, self.tertiary_client_socket, decoder)
                     except UnicodeDecodeError:
                         pass
             except Exception:
@@ -1016,8 +1458,16 @@ class ShareManager:
     def run(self):
         """Run the share manager"""
         app_config.is_running = True
+        self.clipboard_watcher.start()
         
-        if app_config.mode == "server":
+        if app_config.network_engine == "asyncio":
+            self.engine = AsyncEngine(self)
+            self.engine.start()
+            if app_config.mode == "server":
+                self.engine.start_server()
+            else:
+                self.engine.start_client()
+        elif app_config.mode == "server":
             self.start_server()
         else:
             self.start_client()
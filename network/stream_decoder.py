@@ -0,0 +1,107 @@
+"""
+Stream Decoder - Incremental buffering shared by all socket receive loops
+"""
+
+DEFAULT_RECV_SIZE = 65536
+
+
+class StreamDecoder:
+    """Growable receive buffer with a consumed-prefix offset.
+
+    Data is received with recv_into() into one preallocated chunk and
+    appended to a bytearray. Consumed bytes are only dropped when the
+    decoder runs out of complete records, so the remaining partial
+    record is moved at most once per fill instead of on every split.
+    """
+
+    def __init__(self, recv_size=DEFAULT_RECV_SIZE, initial=b""):
+        self._buffer = bytearray(initial)
+        self._start = 0
+        self._chunk = bytearray(recv_size)
+        self._chunk_view = memoryview(self._chunk)
+
+    def fill_from(self, sock):
+        """Receive once from sock; returns the byte count (0 means EOF)"""
+        n = sock.recv_into(self._chunk)
+        if n:
+            self._buffer += self._chunk_view[:n]
+        return n
+
+    def append(self, data):
+        self._buffer += data
+
+    def buffered(self):
+        """Number of received bytes not yet consumed"""
+        return len(self._buffer) - self._start
+
+    def _compact(self):
+        if self._start:
+            del self._buffer[:self._start]
+            self._start = 0
+
+
+class LineDecoder(StreamDecoder):
+    """Splits a stream into newline-terminated lines.
+
+    The newline search resumes where the previous one stopped, so a
+    multi-megabyte line arriving in small pieces is scanned only once.
+    A line handler may call expect_raw() to have the bytes that follow
+    its line routed to a sink instead, for binary payloads such as file
+    chunks.
+    """
+
+    def __init__(self, recv_size=DEFAULT_RECV_SIZE, initial=b""):
+        super().__init__(recv_size, initial)
+        self._scan = 0
+        self._raw_left = 0
+        self._raw_sink = None
+
+    def expect_raw(self, size, sink):
+        """Pass the next size bytes to sink(memoryview) before splitting lines again.
+
+        The view is only valid during the call; sink must copy or write it out.
+        """
+        self._raw_left = size
+        self._raw_sink = sink if size else None
+
+    def _drain_raw(self):
+        """Feed buffered raw bytes to the sink; returns True once all have arrived"""
+        available = min(self._raw_left, len(self._buffer) - self._start)
+        if available:
+            end = self._start + available
+            with memoryview(self._buffer) as view, view[self._start:end] as part:
+                self._raw_sink(part)
+            self._start = self._scan = end
+            self._raw_left -= available
+        if self._raw_left:
+            self._compact()
+            return False
+        self._raw_sink = None
+        return True
+
+    def next_line(self):
+        """Return the next complete line without its newline, or None"""
+        if self._raw_sink is not None and not self._drain_raw():
+            return None
+        idx = self._buffer.find(b"\n", self._scan)
+        if idx < 0:
+            self._compact()
+            self._scan = len(self._buffer)
+            return None
+        with memoryview(self._buffer) as view:
+            line = bytes(view[self._start:idx])
+        self._start = self._scan = idx + 1
+        return line
+
+    def lines(self):
+        """Yield every complete line currently buffered"""
+        while True:
+            line = self.next_line()
+            if line is None:
+                return
+            yield line
+
+    def _compact(self):
+        if self._start:
+            self._scan -= self._start
+            super()._compact()
@@ -38,9 +38,37 @@ class AppConfig:
             "server_secondary_port": 50008,
             "server_tertiary_port": 50010,
             "audio_port": 50009, 
+            # Networking engine: "threaded" or "asyncio" (single event loop, no multiplexing)
+            "network_engine": "threaded",
+            # "multiplexed" carries everything over the primary port, "multi_port" uses all three
+            "connection_mode": "multiplexed",
+
+            # Primary (mouse) channel wire protocol: "binary" or "json"
+            "mouse_protocol": "binary",
+            # Pointer move send rate in Hz; "auto" matches the client display refresh, 0 sends every sample
+            "mouse_send_rate": "auto",
+            # Edge detection backend: "events" (pointer listener) or "polling"
+            "edge_detection": "events",
+            # Distance in pixels from the active edge at which the keyboard hook is installed ahead of a transition
+            "keyboard_arm_distance": 200,
+            # Pointer motion on the binary protocol: "absolute" or "relative" (integer deltas)
+            "mouse_motion_mode": "absolute",
 
             #clipboard
-            "clipboard" : "" 
+            "clipboard" : "" ,
+            # "lazy" announces clipboard changes and sends the data on paste, "push" sends it on every transition
+            "clipboard_transfer": "lazy",
+            # Clipboard and file compression: "auto" (zstd, lz4 or zlib, as both sides support) or "off"
+            "compression": "auto",
+            # Recent clipboards kept for re-sending by reference (entries, MB in memory, MB spilled to ~/Portal/.clipboard)
+            "clipboard_history": 20,
+            "clipboard_history_mb": 64,
+            "clipboard_history_disk_mb": 0,
+            # Processes compressing and hashing file chunks; "auto" uses every core
+            "transfer_workers": "auto",
+            # Cache of received file chunks, so copying the same files again only sends what changed; MB, 0 turns it off.
+            # Off by default: the sender hashes every file in full before anything is sent.
+            "chunk_store_mb": 0,
         }
 
     def load(self):